@@ -1,25 +1,34 @@
 #https://chatgpt.com/share/680e8d2b-a27c-800c-bc2a-70a527424c5f
 # agent_pipeline.py
 import asyncio
+import os
+import time
+from autogen_agentchat.base import TaskResult
 from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
+from cancellation import RunCancelledError, current_run, run_registry
 from save_report import save_pipeline_report
+from metrics import STAGE_SECONDS
+from budget import PipelineBudget, best_partial_output, is_budget_stop, is_deadline_exceeded, pipeline_budget
+from checkpoints import get_checkpoint_store, new_run_id
+from rate_limiter import rate_limit_caller
+from cassette import CASSETTE_RECORD, Cassette, current_cassette, use_cassette
+from handoff import build_handoff, handoff_savings, handoff_text
+from stage_cache import STAGE_CACHES, normalize_pair, stage_cache_key, stage_lock
 
-# Import the agents
-import researchAgent 
-import marketingAgent 
-import productAgent
+# Agent modules load lazily through the registry
+from agent_registry import get_agent
 
 
 # agent runner 
-async def run_agent_team(team, task, cancellation_token: CancellationToken):
-    
-    await team.reset()
+async def run_agent_team(team_pool, task, cancellation_token: CancellationToken):
 
-    chat_result = await team.run(
-        task=task,
-        cancellation_token=cancellation_token,
-    )
+    # Borrow a team from the pool so concurrent runs don't share a conversation
+    async with team_pool.acquire() as team:
+        chat_result = await team.run(
+            task=task,
+            cancellation_token=cancellation_token,
+        )
 
     # 🖨️ Print conversation
     for message in chat_result.messages:
@@ -27,53 +36,275 @@ async def run_agent_team(team, task, cancellation_token: CancellationToken):
 
     return chat_result
 
-async def run_full_pipeline(company1=None, company2=None, user_input=None):
-    
-    cancellation_token = CancellationToken()
+# Notify job/status listeners about stage progress
+def report_progress(on_progress, stage, status):
+    if on_progress:
+        on_progress(stage, status)
 
-    results = {}
-    previous_message = None
-    # Generate initial task
-    if company1 and company2 and user_input:
-        initial_task = (
-            f"Think and make a collaborative product between {company1} and {company2}."
-            f"\n\nUser Instruction: {user_input.strip()}"
-        )
+# Token counters reported per stage and per run
+def new_usage():
+    return {"prompt_tokens": 0, "completion_tokens": 0}
+
+def add_usage(usage, more):
+    # `more` is a models_usage RequestUsage or another usage dict
+    if not more:
+        return
+    if isinstance(more, dict):
+        usage["prompt_tokens"] += more["prompt_tokens"]
+        usage["completion_tokens"] += more["completion_tokens"]
     else:
-        # Default task
-        initial_task = "Think and make a collaborative product between Microsoft and Samsung in XR field."
-
-    # Step 1: Run Research Agent
-    # Research Agent
-    research_result = await researchAgent.run_agent(
-        task=[TextMessage(content=initial_task, source="user")],
-        cancellation_token=cancellation_token
-    )
-    research_message = research_result.messages[-1]
-    results['research_output'] = research_message.content
-    
-    # Product Agent
-    product_result = await productAgent.run_agent(
-        task=[TextMessage(content=research_message.content, source=research_message.source)],
-        cancellation_token=cancellation_token
-    )
-    product_message = product_result.messages[-1]
-    results['product_output'] = product_message.content
-
-    # Marketing Agent
-    marketing_result = await marketingAgent.run_agent(
-        task=[TextMessage(content=product_message.content, source=product_message.source)],
-        cancellation_token=cancellation_token
-    )
-    marketing_message = marketing_result.messages[-1]
-    results['marketing_output'] = marketing_message.content
-    
+        usage["prompt_tokens"] += more.prompt_tokens
+        usage["completion_tokens"] += more.completion_tokens
+
+# Pipeline stages in execution order; each stage's last message is the next stage's task
+PIPELINE_STAGES = ["research", "product", "marketing"]
+
+# A failing stage is retried in place (earlier stages are kept), then the run can be resumed by run_id
+STAGE_RETRIES = int(os.getenv("PIPELINE_STAGE_RETRIES", "1"))
+# Also checkpoint each team's save_state() (full conversation); off by default, it is large
+CHECKPOINT_TEAM_STATE = os.getenv("CHECKPOINT_TEAM_STATE", "0") == "1"
+
+def build_initial_task(company1=None, company2=None):
+    # The research question depends only on the companies, so it can be reused across instructions.
+    # Deliberately without the user's instruction: that enters at the product stage (build_stage_task)
+    if company1 and company2:
+        return f"Think and make a collaborative product between {company1} and {company2}."
+    # Default task
+    return "Think and make a collaborative product between Microsoft and Samsung in XR field."
+
+def build_stage_task(stage, company1=None, company2=None, user_input=None, previous=None):
+    if stage == "research":
+        return TextMessage(content=build_initial_task(company1, company2), source="user")
+
+    # The compact handoff when one was built (HANDOFF_MODE), else the previous stage's last message
+    content = handoff_text(previous)
+    # The user's instruction shapes the product, and through it the marketing plan
+    if stage == "product" and user_input and user_input.strip():
+        content += f"\n\nUser Instruction: {user_input.strip()}"
+    return TextMessage(content=content, source=previous["source"])
+
+def resolve_companies(company1=None, company2=None):
+    # The normalized, sorted pair is only the cache key; prompts and the report keep the user's order
+    return normalize_pair(company1 or "Microsoft", company2 or "Samsung"), company1, company2
+
+# Runs one stage, or serves it from the stage cache. The final "stage" event carries the output.
+async def stream_stage(stage, task_message, cache_key, cancellation_token=None, on_progress=None, force_refresh=False, on_team_state=None):
+    cache = STAGE_CACHES[stage]
+    run = current_run()
+    cassette = current_cassette()
+    replaying = cassette and cassette.replaying
+    use_cache = not force_refresh and not replaying
+
+    # Held until the output is cached, so a request (on any worker) asking for the same stage meanwhile
+    # waits and reuses it instead of running the team a second time
+    async with stage_lock(stage, cache_key, enabled=use_cache):
+        if replaying:
+            # A replay takes stage outputs from the recording, never from today's cache
+            cached = cassette.stages.get(stage)
+        else:
+            cached = await cache.get(cache_key) if use_cache else None
+            if cached and cassette:
+                cassette.record_stage(stage, cached)
+
+        if cached:
+            STAGE_SECONDS.labels(stage, "true").observe(0)
+            print(f"♻️ Reusing cached {stage} output")
+            report_progress(on_progress, stage, "cached")
+            if run:
+                run.leave(stage)
+            yield {"event": "message", "stage": stage, "agent": cached["source"], "content": cached["content"], "cached": True}
+            yield {"event": "stage", "stage": stage, "status": "completed", "stop_reason": cached["stop_reason"], "usage": new_usage(), "turns": 0, "cached": True, "output": cached}
+            return
+
+        report_progress(on_progress, stage, "running")
+        if run:
+            run.enter(stage)
+        yield {"event": "stage", "stage": stage, "status": "running"}
+
+        start = time.perf_counter()
+        stage_result = None
+        usage = new_usage()
+        turns = 0
+        messages = [task_message]
+        try:
+            async for message in get_agent(stage).run_agent_stream(
+                task=[task_message],
+                cancellation_token=cancellation_token,
+                on_team_state=on_team_state
+            ):
+                if isinstance(message, TaskResult):
+                    stage_result = message
+                    continue
+                messages.append(message)
+                add_usage(usage, message.models_usage)
+                turns += message.models_usage is not None
+                print(f"[{message.source}] {message.content}\n")
+                yield {"event": "message", "stage": stage, "agent": message.source, "content": message.content}
+        except Exception as e:
+            # A model call cut off at the deadline ends the stage like a budget stop, with the turns so far
+            if not is_deadline_exceeded(e):
+                raise
+            stage_result = TaskResult(messages=messages, stop_reason=str(e).splitlines()[0].split(": ", 1)[-1])
+
+        last_message = stage_result.messages[-1]
+        budget_stop = is_budget_stop(stage_result.stop_reason)
+        if budget_stop:
+            print(f"⏱️ {stage} stopped early: {stage_result.stop_reason}")
+            last_message = best_partial_output(stage_result.messages)
+        output = {"source": last_message.source, "content": last_message.content, "stop_reason": stage_result.stop_reason}
+        if stage != PIPELINE_STAGES[-1]:
+            # Cached and checkpointed with the output, so a reused stage doesn't pay for extraction again
+            handoff = await build_handoff(stage, stage_result.messages, str(last_message.content))
+            if handoff:
+                output["handoff"] = handoff
+        # A truncated discussion is good enough to hand on, not to reuse for a day; nor is a replayed one
+        if not budget_stop and not replaying:
+            await cache.set(cache_key, output)
+    STAGE_SECONDS.labels(stage, "false").observe(time.perf_counter() - start)
+    if run:
+        run_registry.observe_stage(run, stage)
+    report_progress(on_progress, stage, "completed")
+    yield {"event": "stage", "stage": stage, "status": "completed", "stop_reason": stage_result.stop_reason, "usage": usage, "turns": turns, "output": output}
+
+# Non-streaming single stage; `previous` is the upstream stage's output
+async def run_stage(stage, company1=None, company2=None, user_input=None, previous=None,
+                    cancellation_token=None, on_progress=None, force_refresh=False):
+    pair, company1, company2 = resolve_companies(company1, company2)
+    task_message = build_stage_task(stage, company1, company2, user_input, previous)
+    key = stage_cache_key(stage, pair, user_input, previous and handoff_text(previous))
+
+    output = None
+    async for event in stream_stage(stage, task_message, key, cancellation_token, on_progress, force_refresh):
+        if event["event"] == "stage" and event["status"] == "completed":
+            output = event["output"]
+    return output
+
+# Yields every agent message as it is produced, tagged with its stage, then a final "done" event.
+# Stage outputs are memoized, so a repeated or edited request resumes at the first stage whose input changed.
+# `budget` (default: PIPELINE_MAX_* env vars) caps time, tokens and spend across all stages.
+# Each finished stage is checkpointed under `run_id`; running again with the same run_id resumes
+# at the first stage without a checkpoint.
+# With CASSETTE_RECORD=1 every model exchange is recorded under run_id; pass `cassette=Cassette.player(id)`
+# to re-run a recorded run offline from its cassette.
+async def stream_full_pipeline(company1=None, company2=None, user_input=None, on_progress=None, save=True, force_refresh=False, budget=None, run_id=None, cassette=None):
+
+    budget = budget or PipelineBudget.from_env()
+    run_id = run_id or new_run_id()
+    checkpoints = get_checkpoint_store()
+    params = {"company1": company1, "company2": company2, "user_input": user_input}
+    completed = await checkpoints.start_run(run_id, params)
+    if cassette is None and CASSETTE_RECORD:
+        cassette = Cassette.recorder(run_id, params)
+
+    results = {}
+    stop_reasons = {}
+    usage = new_usage()
+    # Per handed-off stage: full vs compact task tokens and estimated prompt tokens saved downstream
+    handoffs = {}
+    pair, company1, company2 = resolve_companies(company1, company2)
+    previous = None
+    upstream_stage = None
+
+    # First event, so a client whose stream breaks knows which run to resume
+    yield {"event": "run", "run_id": run_id, "restored_stages": list(completed)}
+
+    try:
+        # Every team run below charges its turns to this budget, and queues for model calls as one caller.
+        # run_registry.cancel(run_id) (client gone, or POST /runs/<run_id>/cancel) fires the run's token.
+        with run_registry.track(run_id, PIPELINE_STAGES) as run, pipeline_budget(budget), rate_limit_caller(run_id), use_cassette(cassette):
+            cancellation_token = run.token
+            for stage in PIPELINE_STAGES:
+                run.check()
+                if stage in completed:
+                    # Finished by an earlier attempt of this run: don't pay for it twice
+                    previous = completed[stage]
+                    report_progress(on_progress, stage, "restored")
+                    yield {"event": "stage", "stage": stage, "status": "restored", "run_id": run_id, "stop_reason": previous["stop_reason"], "output": previous}
+                    results[f"{stage}_output"] = previous["content"]
+                    stop_reasons[stage] = previous["stop_reason"]
+                    upstream_stage = stage
+                    run.leave(stage)
+                    continue
+
+                exhausted = previous and budget.exhausted()
+                if exhausted:
+                    # Nothing left to spend: skip the stage, the last partial output stands
+                    stop_reasons[stage] = f"Pipeline budget exhausted: {exhausted}"
+                    report_progress(on_progress, stage, "skipped")
+                    yield {"event": "stage", "stage": stage, "status": "skipped", "stop_reason": stop_reasons[stage]}
+                    continue
+
+                task_message = build_stage_task(stage, company1, company2, user_input, previous)
+                key = stage_cache_key(stage, pair, user_input, previous and handoff_text(previous))
+                upstream = previous
+                team_state = []
+
+                for attempt in range(STAGE_RETRIES + 1):
+                    try:
+                        async for event in stream_stage(
+                            stage, task_message, key, cancellation_token, on_progress, force_refresh,
+                            on_team_state=team_state.append if CHECKPOINT_TEAM_STATE else None,
+                        ):
+                            if event["event"] == "stage" and event["status"] == "completed":
+                                previous = event["output"]
+                                add_usage(usage, event["usage"])
+                                if upstream and upstream.get("handoff"):
+                                    handoffs[upstream_stage] = handoff_savings(upstream["handoff"], stage, event["turns"])
+                                    print(f"✂️ {upstream_stage} handoff: {handoffs[upstream_stage]}")
+                            yield event
+                        break
+                    except Exception as e:
+                        if attempt == STAGE_RETRIES or run.cancelled:
+                            raise
+                        print(f"🔁 {stage} failed ({e}), retrying ({attempt + 1}/{STAGE_RETRIES})")
+                        report_progress(on_progress, stage, "retrying")
+                        yield {"event": "stage", "stage": stage, "status": "retrying", "attempt": attempt + 1, "detail": str(e)}
+
+                await checkpoints.save_stage(run_id, stage, previous, team_state[0] if team_state else None)
+                results[f"{stage}_output"] = previous["content"]
+                stop_reasons[stage] = previous["stop_reason"]
+                upstream_stage = stage
+
+            if cassette and not cassette.replaying:
+                cassette.record_done(results)
+    except RunCancelledError as e:
+        # Finished stages stay checkpointed; the run can still be resumed
+        await checkpoints.finish_run(run_id, "cancelled", str(e))
+        raise
+    except Exception as e:
+        await checkpoints.finish_run(run_id, "failed", str(e))
+        raise
+    await checkpoints.finish_run(run_id, "completed")
+
     # Save report
-    report_path = save_pipeline_report(results)
-    print(f"✅ Report saved at: {report_path}")
+    companies = [company1 or "Microsoft", company2 or "Samsung"]
+    markdown_report = save_pipeline_report(results, company1=companies[0], company2=companies[1], stop_reasons=stop_reasons) if save else None
+    yield {
+        "event": "done",
+        "run_id": run_id,
+        "companies": companies,
+        "results": results,
+        "markdown_report": markdown_report,
+        "usage": usage,
+        "stop_reasons": stop_reasons,
+        "budget": budget.summary(),
+        "handoff": handoffs,
+    }
+
+# Returns the final "done" event: run_id, companies, results, markdown_report, usage, stop_reasons, budget and handoff
+async def run_full_pipeline(company1=None, company2=None, user_input=None, on_progress=None, save=True, force_refresh=False, budget=None, run_id=None, cassette=None):
+    done = None
+    async for event in stream_full_pipeline(
+        company1, company2, user_input,
+        on_progress=on_progress, save=save, force_refresh=force_refresh, budget=budget, run_id=run_id, cassette=cassette
+    ):
+        if event["event"] == "done":
+            done = event
+            if event["markdown_report"]:
+                print(f"✅ Report saved at: {event['markdown_report']}")
 
-    return results
+    return done
 
 if __name__ == "__main__":
-    results = asyncio.run(research_to_marketing_flow())
-    print("Research Output:", results['research_output'])
\ No newline at end of file
+    done = asyncio.run(run_full_pipeline())
+    print("Research Output:", done["results"]["research_output"])
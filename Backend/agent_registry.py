@@ -0,0 +1,37 @@
+# agent_registry.py
+import asyncio
+import importlib
+import os
+import time
+
+# Agent modules (and, through model_registry, the OpenAI SDK) are imported on first use, so startup doesn't
+# pay for them. autogen_agentchat itself still loads at startup: agent_pipeline, metrics and budget import it.
+AGENT_MODULES = {
+    "research": "researchAgent",
+    "product": "productAgent",
+    "marketing": "marketingAgent",
+}
+
+
+def get_agent(name):
+    # importlib caches in sys.modules, so only the first call pays for the import
+    return importlib.import_module(AGENT_MODULES[name])
+
+
+def parse_warmup_agents(value=None):
+    value = os.getenv("WARMUP_AGENTS", "") if value is None else value
+    if value.strip().lower() == "all":
+        return list(AGENT_MODULES)
+    return [name.strip() for name in value.split(",") if name.strip() in AGENT_MODULES]
+
+
+async def warm_up(names=None, teams_per_agent=None):
+    """Import agent modules, create the model client and pre-build teams ahead of the first request."""
+    names = parse_warmup_agents() if names is None else names
+    teams_per_agent = teams_per_agent or int(os.getenv("WARMUP_TEAMS_PER_AGENT", "1"))
+    for name in names:
+        start = time.perf_counter()
+        # Import off the event loop so health checks keep answering meanwhile
+        module = await asyncio.to_thread(importlib.import_module, AGENT_MODULES[name])
+        module.team_pool.prefill(teams_per_agent)
+        print(f"🔥 Warmed up {name} agent in {time.perf_counter() - start:.2f}s")
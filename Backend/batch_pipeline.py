@@ -0,0 +1,98 @@
+# batch_pipeline.py
+import asyncio
+import os
+import time
+
+from agent_pipeline import add_usage, new_usage, stream_full_pipeline
+from cancellation import run_registry
+from checkpoints import new_run_id
+from llm_cache import bypass_cache
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+
+async def run_pipeline_item(item, run_id=None):
+    # `item` is an AgentInput; one report is written per item
+    done = None
+    with bypass_cache(item.bypassCache or item.forceRefresh):
+        async for event in stream_full_pipeline(
+            company1=item.companyName1,
+            company2=item.companyName2,
+            user_input=item.textInstruction,
+            force_refresh=item.forceRefresh,
+            run_id=run_id
+        ):
+            if event["event"] == "done":
+                done = event
+    return done
+
+
+async def run_batch(items, concurrency=None):
+    """Yields one result per item as it completes (in completion order), then a summary."""
+    semaphore = asyncio.Semaphore(max(1, concurrency or BATCH_CONCURRENCY))
+    finished = asyncio.Queue()
+    usage = new_usage()
+    start = time.perf_counter()
+    run_ids = [new_run_id() for _ in items]
+
+    async def run_one(index, item):
+        async with semaphore:
+            item_start = time.perf_counter()
+            try:
+                done = await run_pipeline_item(item, run_ids[index])
+                result = {
+                    "event": "item",
+                    "index": index,
+                    "status": "success",
+                    "companyName1": item.companyName1,
+                    "companyName2": item.companyName2,
+                    "markdown_report": done["markdown_report"],
+                    "results": done["results"],
+                    "usage": done["usage"],
+                    "stop_reasons": done["stop_reasons"],
+                }
+            except Exception as e:
+                # One bad item must not sink the rest of the sweep
+                print(f"Error in batch item {index}:", e)
+                result = {
+                    "event": "item",
+                    "index": index,
+                    "status": "error",
+                    "companyName1": item.companyName1,
+                    "companyName2": item.companyName2,
+                    "detail": str(e),
+                }
+            result["elapsed_seconds"] = round(time.perf_counter() - item_start, 3)
+            await finished.put(result)
+
+    tasks = [asyncio.create_task(run_one(index, item)) for index, item in enumerate(items)]
+    succeeded = 0
+    try:
+        for _ in range(len(tasks)):
+            result = await finished.get()
+            if result["status"] == "success":
+                succeeded += 1
+                add_usage(usage, result["usage"])
+            yield result
+    finally:
+        # Consumer gone before the end: stop the items still running (finished ones are no longer registered)
+        for run_id in run_ids:
+            run_registry.cancel(run_id, "disconnect")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    elapsed = time.perf_counter() - start
+    minutes = max(elapsed, 1e-9) / 60
+    total_tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+    yield {
+        "event": "summary",
+        "items": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_seconds": round(elapsed, 3),
+        "items_per_minute": round(len(items) / minutes, 2),
+        "tokens_per_minute": round(total_tokens / minutes, 2),
+        "usage": usage,
+    }
@@ -0,0 +1,79 @@
+# bench_hedging.py
+# Model calls against a fake provider with a heavy latency tail (most calls fast, a few stragglers):
+# plain client vs the hedged one, comparing latency percentiles and how many extra requests hedging sent.
+# Usage (from Backend/): python benchmarks/bench_hedging.py --calls 400 --concurrency 8
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autogen_core.models import UserMessage
+
+import hedging
+from hedging import HedgingChatCompletionClient, with_deadline, with_latency
+from stub_model_client import StubChatCompletionClient
+
+
+class TailFakeClient(StubChatCompletionClient):
+    """Each request independently takes `fast` seconds, or `slow` seconds with probability `tail`.
+    (The stub's own latency is seeded by the prompt, so a hedged copy would be exactly as slow.)"""
+
+    def __init__(self, fast, slow, tail, seed=0):
+        super().__init__(model="fake", completion_tokens=1)
+        rng = random.Random(seed)
+        self.latency = lambda _: slow if rng.random() < tail else fast
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run(client, calls, concurrency):
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call(i):
+        async with gate:
+            start = time.perf_counter()
+            await client.create([UserMessage(content=f"call {i}", source="user")])
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(call(i) for i in range(calls)))
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fast", type=float, default=0.05)
+    parser.add_argument("--slow", type=float, default=1.0)
+    parser.add_argument("--tail", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=0.1, help="MODEL_HEDGE_MAX_RATE")
+    args = parser.parse_args()
+
+    hedging.hedge_budget = hedging.HedgeBudget(args.rate)
+    for label, hedge in (("plain", False), ("hedged", True)):
+        hedging._trackers.clear()
+        hedging._counts.clear()
+        provider = TailFakeClient(args.fast, args.slow, args.tail)
+        client = with_deadline(with_latency(provider))
+        if hedge:
+            client = HedgingChatCompletionClient(client)
+        latencies = await run(client, args.calls, args.concurrency)
+        extra = provider.calls - args.calls
+        print(
+            f"{label:>7}: p50 {percentile(latencies, 50):.3f}s  p95 {percentile(latencies, 95):.3f}s  "
+            f"p99 {percentile(latencies, 99):.3f}s  max {max(latencies):.3f}s  "
+            f"extra requests {extra} ({extra / args.calls:.1%})"
+        )
+    print("hedges:", hedging._counts.get("fake"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+# bench_load.py
+# HTTP load test of the agent and pipeline endpoints: throughput and p50/p95/p99 latency per endpoint.
+# Runs offline by default: the app is served in-process with MODEL_CLIENT=stub, in a scratch directory.
+# Usage (from Backend/): python benchmarks/bench_load.py --concurrency 8 --requests 40 --latency lognormal:0.8,0.4
+#                        python benchmarks/bench_load.py --url http://localhost:8000   (a server started with MODEL_CLIENT=stub)
+import argparse
+import asyncio
+import contextlib
+import math
+import os
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import httpx
+
+ENDPOINTS = ["research-agent", "product-agent", "marketing-agent", "run-pipeline"]
+PAIRS = [("Microsoft", "Samsung"), ("Google", "Meta"), ("Apple", "Sony"), ("Nintendo", "Valve")]
+
+
+def percentile(values, pct):
+    # Nearest rank on the sorted sample: the smallest value with at least pct% of the sample at or below it
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def build_body(i, cached):
+    company1, company2 = PAIRS[i % len(PAIRS)]
+    body = {"companyName1": company1, "companyName2": company2, "textInstruction": "Launch in Korea"}
+    if not cached:
+        # Distinct instructions and no cache reads, so every request really runs the agents
+        body.update(textInstruction=f"Launch in Korea (load test request {i})", bypassCache=True, forceRefresh=True)
+    return body
+
+
+async def drive(client, endpoint, requests, concurrency, cached):
+    latencies, errors = [], 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"/{endpoint}", json=build_body(i, cached))
+                failed = response.status_code >= 400 or response.json().get("status") == "error"
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def report(results):
+    print(f"{'endpoint':>16} {'reqs':>5} {'errors':>6} {'req/s':>8} {'p50(s)':>7} {'p95(s)':>7} {'p99(s)':>7} {'max(s)':>7}")
+    for endpoint, (elapsed, latencies, errors) in results.items():
+        p50, p95, p99 = (percentile(latencies, pct) for pct in (50, 95, 99))
+        print(
+            f"{endpoint:>16} {len(latencies):>5} {errors:>6} {len(latencies) / elapsed:>8.2f} "
+            f"{p50:>7.2f} {p95:>7.2f} {p99:>7.2f} {max(latencies):>7.2f}"
+        )
+
+
+async def run(args):
+    results = {}
+    for endpoint in args.endpoints:
+        async with args.client_factory() as client:
+            results[endpoint] = await drive(client, endpoint, args.requests, args.concurrency, args.cached)
+    return results
+
+
+async def run_in_process(args):
+    # Stub model and scratch working dir (reports, caches, checkpoints) before the app is imported
+    os.environ["MODEL_CLIENT"] = "stub"
+    os.environ["STUB_LATENCY"] = args.latency
+    os.environ["STUB_COMPLETION_TOKENS"] = args.completion_tokens
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        import main
+
+        transport = httpx.ASGITransport(app=main.app)
+        args.client_factory = lambda: httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None)
+        # The app prints every agent message; keep that out of the results table
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            async with main.lifespan(main.app):
+                results = await run(args)
+        os.chdir(BACKEND)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=40, help="requests per endpoint")
+    parser.add_argument("--url", help="load an already running server instead of an in-process app")
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="stub latency per model call (in-process only)")
+    parser.add_argument("--completion-tokens", default="uniform:80,240", help="stub reply length (in-process only)")
+    parser.add_argument("--cached", action="store_true", help="repeat identical requests and let the caches answer")
+    args = parser.parse_args()
+
+    if args.url:
+        args.client_factory = lambda: httpx.AsyncClient(base_url=args.url, timeout=None)
+        report(asyncio.run(run(args)))
+    else:
+        report(asyncio.run(run_in_process(args)))
+
+
+if __name__ == "__main__":
+    main()
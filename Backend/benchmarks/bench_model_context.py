@@ -0,0 +1,68 @@
+# bench_model_context.py
+# Prompt tokens per team run with autogen's unbounded context vs the bounded summarizing context.
+# Usage (from Backend/): python benchmarks/bench_model_context.py --turns 12
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+import marketingAgent
+import productAgent
+import researchAgent
+from autogen_core.models import CreateResult, RequestUsage
+from bounded_context import SUMMARY_PROMPT
+from stub_model_client import StubChatCompletionClient
+
+TEAMS = {"research": researchAgent, "product": productAgent, "marketing": marketingAgent}
+
+
+class TurnCountingClient(StubChatCompletionClient):
+    """Approves after `turns` agent replies (a bounded prompt never grows to the history length)
+    and keeps summary calls apart so their cost shows up separately."""
+
+    def __init__(self, turns):
+        super().__init__(latency=0, completion_tokens=1)
+        self.turns = turns
+        self.agent_calls = 0
+        self.prompt_tokens = 0
+        self.summary_tokens = 0
+
+    def _reply(self, messages):
+        self.agent_calls += 1
+        if self.agent_calls >= self.turns:
+            return "Numbers gathered. ENOUGH INFO. APPROVE"
+        # Realistic turn length: agents write a few paragraphs each
+        return f"Turn {self.agent_calls}: market share 12%, revenue $4B, 3 new XR devices. " * 40
+
+    async def create(self, messages, **kwargs):
+        if messages and messages[0].content == SUMMARY_PROMPT:
+            self.summary_tokens += self.count_tokens(messages)
+            return CreateResult(finish_reason="stop", content="Summary: 12% share, $4B revenue, 3 XR devices.", usage=RequestUsage(prompt_tokens=0, completion_tokens=0), cached=False)
+        self.prompt_tokens += self.count_tokens(messages)
+        return await super().create(messages, **kwargs)
+
+
+async def measure(module, turns):
+    client = TurnCountingClient(turns)
+    result = await module.build_team(client).run(task=module.get_default_task())
+    return client, len(result.messages)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=12, help="agent replies before the fake model approves")
+    args = parser.parse_args()
+
+    print(f"{'team':>10} {'context':>10} {'messages':>9} {'prompt tokens':>14} {'summary tokens':>15}")
+    for name, module in TEAMS.items():
+        for label, max_messages in (("unbounded", "0"), ("bounded", os.getenv("CONTEXT_MAX_MESSAGES", "6"))):
+            os.environ[f"{name.upper()}_CONTEXT_MAX_MESSAGES"] = max_messages
+            client, messages = asyncio.run(measure(module, args.turns))
+            print(f"{name:>10} {label:>10} {messages:>9} {client.prompt_tokens:>14} {client.summary_tokens:>15}")
+
+
+if __name__ == "__main__":
+    main()
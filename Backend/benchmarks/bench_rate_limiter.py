@@ -0,0 +1,100 @@
+# bench_rate_limiter.py
+# A burst of model calls against a fake provider that enforces a per-second quota and a concurrency cap
+# (answering 429 + Retry-After past either): raw client vs the rate-limited one.
+# Usage (from Backend/): python benchmarks/bench_rate_limiter.py --calls 200 --callers 8
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autogen_core.models import UserMessage
+
+from rate_limiter import RateLimitedChatCompletionClient, RateLimiter, rate_limit_caller
+from stub_model_client import StubChatCompletionClient
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("429 Too Many Requests")
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": str(retry_after)})
+
+
+class QuotaFakeClient(StubChatCompletionClient):
+    """Accepts `per_second` calls per second and `concurrency` at once; anything more gets a 429."""
+
+    def __init__(self, per_second, concurrency, latency=0.05):
+        super().__init__(model="fake", latency=latency, completion_tokens=1)
+        self.per_second = per_second
+        self.concurrency = concurrency
+        self.recent = []
+        self.inflight = 0
+        self.rejected = 0
+
+    async def create(self, messages, **kwargs):
+        now = time.monotonic()
+        self.recent = [t for t in self.recent if now - t < 1]
+        if len(self.recent) >= self.per_second or self.inflight >= self.concurrency:
+            self.rejected += 1
+            raise RateLimitError(retry_after=1)
+        self.recent.append(now)
+        self.inflight += 1
+        try:
+            return await super().create(messages)
+        finally:
+            self.inflight -= 1
+
+
+async def burst(client, calls, callers):
+    finished = {caller: [] for caller in range(callers)}
+    errors = 0
+    start = time.perf_counter()
+
+    async def call(caller, i):
+        nonlocal errors
+        with rate_limit_caller(caller):
+            try:
+                await client.create([UserMessage(content=f"call {i}", source="user")])
+                finished[caller].append(time.perf_counter() - start)
+            except RateLimitError:
+                errors += 1
+
+    # Caller 0 floods the queue first; the others arrive just behind it
+    order = [(0, i) for i in range(calls // 2)] + [(1 + i % (callers - 1), i) for i in range(calls - calls // 2)]
+    await asyncio.gather(*(call(caller, i) for caller, i in order))
+    elapsed = time.perf_counter() - start
+    # Fairness: when each caller's first call completed
+    firsts = [min(times) for times in finished.values() if times]
+    return elapsed, errors, statistics.median(firsts) if firsts else 0, max(firsts) if firsts else 0
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--per-second", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=6)
+    args = parser.parse_args()
+
+    print(f"{'client':>14} {'time(s)':>8} {'failed':>7} {'429s':>6} {'first done p50/max(s)':>22}")
+    for name in ("raw", "rate-limited"):
+        provider = QuotaFakeClient(args.per_second, args.concurrency)
+        client = provider
+        if name == "rate-limited":
+            # rpm tuned to the quota; concurrency starts too high on purpose so AIMD has to find the cap
+            limiter = RateLimiter("fake", rpm=args.per_second * 60, tpm=0, max_concurrency=32)
+            client = RateLimitedChatCompletionClient(provider, limiter)
+        elapsed, errors, first_p50, first_max = await burst(client, args.calls, args.callers)
+        print(f"{name:>14} {elapsed:>8.2f} {errors:>7} {provider.rejected:>6} {first_p50:>10.2f} / {first_max:<10.2f}")
+        if name == "rate-limited":
+            print(f"{'':>14} final concurrency limit {limiter.stats()['concurrency_limit']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+# bench_report_catalog.py
+# /get-reports cost as the reports folder grows: old os.listdir listing vs catalog pages and search.
+# Usage (from Backend/): python benchmarks/bench_report_catalog.py --sizes 1000 10000 30000
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_catalog import ReportCatalog
+from save_report import list_reports
+
+PAIRS = [("Microsoft", "Samsung"), ("Google", "Meta"), ("Apple", "Samsung"), ("Sony", "Nintendo")]
+WORDS = "market share revenue headset display chip korea europe launch pricing retail partner roadmap".split()
+
+
+def write_reports(folder, count):
+    start = time.time() - count * 60
+    for i in range(count):
+        company1, company2 = random.choice(PAIRS)
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(start + i * 60))
+        body = " ".join(random.choices(WORDS, k=300))
+        with open(os.path.join(folder, f"pipeline_report_{stamp}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# 📝 Pipeline Report\n\n**Companies:** {company1} × {company2}\n\n## Research Output\n\n{body}\n")
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'reports':>8} {'listdir':>9} {'page 1':>8} {'page 50':>8} {'pair':>8} {'search':>8} {'backfill(s)':>12}  (ms)")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            write_reports(folder, size)
+            catalog = ReportCatalog(path=os.path.join(folder, "catalog.sqlite3"), report_folder=folder)
+            start = time.perf_counter()
+            catalog.backfill()
+            backfill = time.perf_counter() - start
+
+            listdir_ms, _ = timed(lambda: list_reports(folder))
+            first_ms, page = timed(lambda: catalog.search(limit=50))
+            cursor = page["next_cursor"]
+            for _ in range(48):
+                cursor = catalog.search(limit=50, cursor=cursor)["next_cursor"] or cursor
+            deep_ms, _ = timed(lambda: catalog.search(limit=50, cursor=cursor))
+            pair_ms, _ = timed(lambda: catalog.search(limit=50, company1="samsung", company2="MS"))
+            search_ms, _ = timed(lambda: catalog.search(limit=50, q="headset AND korea"))
+            print(f"{size:>8} {listdir_ms:>9.2f} {first_ms:>8.2f} {deep_ms:>8.2f} {pair_ms:>8.2f} {search_ms:>8.2f} {backfill:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
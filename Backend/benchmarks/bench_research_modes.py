@@ -0,0 +1,54 @@
+# bench_research_modes.py
+# Wall-clock of one research run: round-robin team vs concurrent fan-out.
+# Usage (from Backend/): python benchmarks/bench_research_modes.py --latency 1.0 --runs 3
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+import researchAgent
+from autogen_agentchat.base import TaskResult
+from stub_model_client import StubChatCompletionClient
+
+
+async def round_robin(client):
+    team = researchAgent.build_team(client)
+    return await team.run(task=researchAgent.get_default_task())
+
+async def fanout(client):
+    async for message in researchAgent.run_fanout_stream(client=client):
+        if isinstance(message, TaskResult):
+            return message
+
+
+async def measure(mode, latency, runs):
+    timings, calls, turns = [], 0, 0
+    for _ in range(runs):
+        # Short scripted replies, so the timings are the model latency rather than prompt growth
+        client = StubChatCompletionClient(latency=latency, completion_tokens=1)
+        start = time.perf_counter()
+        result = await mode(client)
+        timings.append(time.perf_counter() - start)
+        calls, turns = client.calls, len(result.messages)
+    return statistics.median(timings), calls, turns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per fake model call")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'calls':>6} {'messages':>9} {'median wall(s)':>15}")
+    for name, mode in (("round_robin", round_robin), ("fanout", fanout)):
+        elapsed, calls, turns = asyncio.run(measure(mode, args.latency, args.runs))
+        print(f"{name:>12} {calls:>6} {turns:>9} {elapsed:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
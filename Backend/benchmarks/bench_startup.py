@@ -0,0 +1,74 @@
+# bench_startup.py
+# Import time of main.py and time until uvicorn answers its first health check.
+# Usage (from Backend/): python benchmarks/bench_startup.py --runs 5
+# Compare with an older commit:  git worktree add /tmp/before <ref>
+#                                python benchmarks/bench_startup.py --tree /tmp/before/Backend
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def env_for(tree):
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [tree, env.get("PYTHONPATH")]))
+    return env
+
+
+def import_time(tree):
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=tree, env=env_for(tree), capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_to_healthy(tree, timeout=60):
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=tree, env=env_for(tree), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("server never became healthy")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tree", default=BACKEND, help="Backend directory to measure")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports = [import_time(args.tree) for _ in range(args.runs)]
+    healthy = [time_to_healthy(args.tree) for _ in range(args.runs)]
+    print(f"tree: {args.tree}")
+    print(f"import main          median {statistics.median(imports):.3f}s  (min {min(imports):.3f}s)")
+    print(f"first healthy reply  median {statistics.median(healthy):.3f}s  (min {min(healthy):.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# bench_team_pool.py
+# Throughput of concurrent research runs as the team pool grows.
+# Usage (from Backend/): python benchmarks/bench_team_pool.py --runs 16 --latency 0.2
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+import researchAgent
+from team_pool import TeamPool
+from stub_model_client import StubChatCompletionClient
+
+
+async def run_batch(pool_size, runs, latency):
+    client = StubChatCompletionClient(latency=latency, completion_tokens=1)
+    pool = TeamPool(lambda: researchAgent.build_team(client), size=pool_size, name="bench")
+
+    async def one_run():
+        async with pool.acquire() as team:
+            await team.run(task=researchAgent.get_default_task())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_run() for _ in range(runs)))
+    return time.perf_counter() - start, client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake model call")
+    parser.add_argument("--sizes", default="1,2,4,8,16")
+    args = parser.parse_args()
+
+    print(f"{'pool':>5} {'runs':>5} {'calls':>6} {'wall(s)':>8} {'runs/s':>7} {'speedup':>8}")
+    baseline = None
+    for size in [int(s) for s in args.sizes.split(",")]:
+        elapsed, calls = asyncio.run(run_batch(size, args.runs, args.latency))
+        baseline = baseline or elapsed
+        print(f"{size:>5} {args.runs:>5} {calls:>6} {elapsed:>8.2f} {args.runs / elapsed:>7.2f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
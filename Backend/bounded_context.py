@@ -0,0 +1,105 @@
+# bounded_context.py
+import os
+
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import FunctionExecutionResultMessage, SystemMessage, UserMessage
+
+SUMMARY_PROMPT = (
+    "You condense a multi-agent business discussion. Merge the existing summary with the new messages "
+    "into one short summary. Keep every company name, number and decision; drop greetings and repetition."
+)
+
+
+def team_setting(team, name, default):
+    # RESEARCH_CONTEXT_MAX_MESSAGES overrides CONTEXT_MAX_MESSAGES for the research team only
+    return os.getenv(f"{team.upper()}_{name}", os.getenv(name, default))
+
+
+def estimate_tokens(messages):
+    # ~4 characters per token; close enough to budget a prompt without a tokenizer download
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+class SummarizingChatCompletionContext(ChatCompletionContext):
+    """Sends the last `max_messages` messages that fit in `token_budget`; older turns are folded
+    into a rolling summary that is only recomputed when the window moves past new messages.
+    The agent's system message is added by the agent itself and is always kept."""
+
+    def __init__(self, model_client, max_messages=6, token_budget=3000, summary_tokens=300, summarize=True, initial_messages=None):
+        super().__init__(initial_messages)
+        self._model_client = model_client
+        self._max_messages = max_messages
+        self._token_budget = token_budget
+        self._summary_tokens = summary_tokens
+        self._summarize = summarize
+        self._summary = ""
+        self._summarized = 0
+
+    def _window_start(self):
+        start = max(len(self._messages) - self._max_messages, self._summarized)
+        # Drop from the front until the window fits, but always keep the latest message
+        while start < len(self._messages) - 1 and estimate_tokens(self._messages[start:]) > self._token_budget:
+            start += 1
+        while start < len(self._messages) and isinstance(self._messages[start], FunctionExecutionResultMessage):
+            start += 1
+        return start
+
+    async def _fold(self, messages):
+        transcript = "\n".join(f"[{getattr(m, 'source', 'assistant')}] {m.content}" for m in messages)
+        prompt = f"Existing summary:\n{self._summary or '(none)'}\n\nNew messages:\n{transcript}"
+        try:
+            result = await self._model_client.create(
+                [SystemMessage(content=SUMMARY_PROMPT), UserMessage(content=prompt, source="user")]
+            )
+            self._summary = str(result.content)[: self._summary_tokens * 4]
+        except Exception as e:
+            # Losing detail beats failing the turn; the window itself is still correct
+            print(f"⚠️ Context summary failed, dropping {len(messages)} old messages: {e}")
+
+    async def get_messages(self):
+        start = self._window_start()
+        if start > self._summarized:
+            # Fold down to half the window so the next summary is several turns away, not one
+            start = max(start, len(self._messages) - max(1, self._max_messages // 2))
+            if self._summarize:
+                await self._fold(self._messages[self._summarized:start])
+            self._summarized = start
+
+        window = list(self._messages[start:])
+        if self._summary:
+            window.insert(0, UserMessage(content=f"Summary of the earlier discussion:\n{self._summary}", source="summary"))
+        return window
+
+    async def clear(self):
+        await super().clear()
+        self._summary = ""
+        self._summarized = 0
+
+    async def save_state(self):
+        state = dict(await super().save_state())
+        state.update(summary=self._summary, summarized=self._summarized)
+        return state
+
+    async def load_state(self, state):
+        state = dict(state)
+        self._summary = state.pop("summary", "")
+        self._summarized = state.pop("summarized", 0)
+        await super().load_state(state)
+
+
+def context_window(team):
+    # Opt-in: unset (or 0) keeps autogen's unbounded context and makes no summarization calls
+    return int(team_setting(team, "CONTEXT_MAX_MESSAGES", "0") or "0")
+
+def build_model_context(team, client):
+    """Per-agent bounded context for `team`, or None (autogen's unbounded default) when disabled."""
+    max_messages = context_window(team)
+    if max_messages <= 0:
+        return None
+    return SummarizingChatCompletionContext(
+        client,
+        max_messages=max_messages,
+        token_budget=int(team_setting(team, "CONTEXT_TOKEN_BUDGET", "3000")),
+        summary_tokens=int(team_setting(team, "CONTEXT_SUMMARY_TOKENS", "300")),
+        summarize=team_setting(team, "CONTEXT_SUMMARY", "1") not in ("0", "false", "no"),
+    )
@@ -0,0 +1,209 @@
+# budget.py
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from autogen_agentchat.base import TerminationCondition, TerminatedException
+from autogen_agentchat.conditions import TimeoutTermination, TokenUsageTermination
+from autogen_agentchat.messages import StopMessage
+
+from context_vars import safe_reset
+
+# USD per million tokens; defaults are Gemini 1.5 Flash-8B list prices
+PRICE_PROMPT_PER_MTOK = float(os.getenv("MODEL_PRICE_PROMPT_PER_MTOK", "0.0375"))
+PRICE_COMPLETION_PER_MTOK = float(os.getenv("MODEL_PRICE_COMPLETION_PER_MTOK", "0.15"))
+
+
+def estimate_cost(prompt_tokens, completion_tokens):
+    return (prompt_tokens * PRICE_PROMPT_PER_MTOK + completion_tokens * PRICE_COMPLETION_PER_MTOK) / 1_000_000
+
+
+def is_budget_stop(stop_reason):
+    # True when the team ran out of time/tokens/money rather than finishing its discussion
+    return bool(stop_reason) and any(
+        marker in stop_reason for marker in ("Timeout of", "Token usage limit", "Cost limit", "Pipeline budget", "Deadline reached")
+    )
+
+
+class DeadlineExceeded(TimeoutError):
+    """A model call was cut off at the deadline of its team run or pipeline."""
+
+def is_deadline_exceeded(error):
+    # Raised inside a team, it comes out of run_stream as a RuntimeError naming it
+    return isinstance(error, DeadlineExceeded) or str(error).startswith(f"{DeadlineExceeded.__name__}:")
+
+
+class CostTermination(TerminationCondition):
+    """Stops once the estimated spend of the conversation reaches `max_cost` USD."""
+
+    def __init__(self, max_cost):
+        self._max_cost = max_cost
+        self._cost = 0.0
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    async def __call__(self, messages):
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        for message in messages:
+            if message.models_usage is not None:
+                self._cost += estimate_cost(message.models_usage.prompt_tokens, message.models_usage.completion_tokens)
+        if self._cost >= self._max_cost:
+            self._terminated = True
+            return StopMessage(content=f"Cost limit of ${self._max_cost:.4f} reached (${self._cost:.4f})", source="CostTermination")
+        return None
+
+    async def reset(self):
+        self._cost = 0.0
+        self._terminated = False
+
+
+class PipelineBudget:
+    """Deadline, token and cost allowance shared by every stage of one pipeline run."""
+
+    def __init__(self, max_seconds=None, max_tokens=None, max_cost=None):
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.started = time.monotonic()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @classmethod
+    def from_env(cls):
+        def limit(name, kind):
+            value = os.getenv(name)
+            return kind(value) if value else None
+        return cls(limit("PIPELINE_MAX_SECONDS", float), limit("PIPELINE_MAX_TOKENS", int), limit("PIPELINE_MAX_COST", float))
+
+    def spend(self, usage):
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+
+    @property
+    def cost(self):
+        return estimate_cost(self.prompt_tokens, self.completion_tokens)
+
+    def exhausted(self):
+        # The first limit hit, as a readable reason, or None while there is budget left
+        elapsed = time.monotonic() - self.started
+        tokens = self.prompt_tokens + self.completion_tokens
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return f"deadline of {self.max_seconds:g}s reached"
+        if self.max_tokens is not None and tokens >= self.max_tokens:
+            return f"token cap of {self.max_tokens} reached ({tokens} used)"
+        if self.max_cost is not None and self.cost >= self.max_cost:
+            return f"cost cap of ${self.max_cost:.4f} reached (${self.cost:.4f})"
+        return None
+
+    def summary(self):
+        return {
+            "max_seconds": self.max_seconds,
+            "max_tokens": self.max_tokens,
+            "max_cost": self.max_cost,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "tokens": self.prompt_tokens + self.completion_tokens,
+            "cost": round(self.cost, 6),
+            "exhausted": self.exhausted(),
+        }
+
+
+# Budget of the pipeline run this task belongs to; None outside a pipeline (single-agent endpoints)
+_pipeline_budget = ContextVar("pipeline_budget", default=None)
+
+def current_budget():
+    return _pipeline_budget.get()
+
+@contextmanager
+def pipeline_budget(budget):
+    token = _pipeline_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        safe_reset(_pipeline_budget, token)
+
+
+def team_limit(team, name, default):
+    # RESEARCH_MAX_SECONDS etc., falling back to TEAM_MAX_SECONDS etc.
+    return os.getenv(f"{team.upper()}_{name}", os.getenv(f"TEAM_{name}", default))
+
+
+# When (time.monotonic()) the team run this task belongs to reaches its TEAM_MAX_SECONDS; None outside one
+_team_deadline = ContextVar("team_deadline", default=None)
+
+@contextmanager
+def team_deadline(team):
+    max_seconds = float(team_limit(team, "MAX_SECONDS", "600"))
+    token = _team_deadline.set(time.monotonic() + max_seconds if max_seconds > 0 else None)
+    try:
+        yield
+    finally:
+        safe_reset(_team_deadline, token)
+
+def remaining_seconds():
+    """Time left before the current team run or its pipeline hits a deadline, or None without one."""
+    deadlines = []
+    if _team_deadline.get() is not None:
+        deadlines.append(_team_deadline.get())
+    budget = current_budget()
+    if budget is not None and budget.max_seconds is not None:
+        deadlines.append(budget.started + budget.max_seconds)
+    return min(deadlines) - time.monotonic() if deadlines else None
+
+
+class PipelineBudgetTermination(TerminationCondition):
+    """Charges every agent turn to the current pipeline budget and stops the team when it runs out.
+    Pooled teams keep one instance; the budget itself is looked up per run."""
+
+    def __init__(self):
+        self._terminated = False
+
+    @property
+    def terminated(self):
+        return self._terminated
+
+    async def __call__(self, messages):
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        budget = current_budget()
+        if budget is None:
+            return None
+        for message in messages:
+            if message.models_usage is not None:
+                budget.spend(message.models_usage)
+        reason = budget.exhausted()
+        if reason:
+            self._terminated = True
+            return StopMessage(content=f"Pipeline budget exhausted: {reason}", source="PipelineBudgetTermination")
+        return None
+
+    async def reset(self):
+        self._terminated = False
+
+
+def with_budget(team, condition):
+    """`condition` OR the team's deadline/token/cost limits OR the pipeline-wide budget.
+    Limits come from RESEARCH_MAX_SECONDS etc., falling back to TEAM_MAX_SECONDS etc."""
+    max_seconds = float(team_limit(team, "MAX_SECONDS", "600"))
+    max_tokens = int(team_limit(team, "MAX_TOKENS", "0"))
+    max_cost = float(team_limit(team, "MAX_COST", "0"))
+
+    condition = condition | PipelineBudgetTermination()
+    if max_seconds > 0:
+        condition = condition | TimeoutTermination(max_seconds)
+    if max_tokens > 0:
+        condition = condition | TokenUsageTermination(max_total_token=max_tokens)
+    if max_cost > 0:
+        condition = condition | CostTermination(max_cost)
+    return condition
+
+
+def best_partial_output(messages):
+    # After a budget stop the last turn is arbitrary; hand on the most substantial recent agent turn
+    turns = [m for m in messages if m.models_usage is not None]
+    recent = [m for m in turns[-3:] if isinstance(m.content, str)]
+    return max(recent, key=lambda m: len(m.content)) if recent else messages[-1]
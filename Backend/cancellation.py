@@ -0,0 +1,252 @@
+# cancellation.py
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult
+
+from context_vars import safe_reset
+from metrics import CANCELLATION_SAVED_TOKENS, CANCELLED_RUNS
+from model_wrappers import DelegatingChatCompletionClient
+from state_backend import InProcessStateBackend, get_state_backend
+
+# How often a request checks that its client is still connected, and (with a shared STATE_BACKEND)
+# how often a worker looks for cancellations of its runs requested on another worker
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+# Cancellations of runs that haven't started yet (queued jobs) are remembered this long
+CANCEL_REQUEST_TTL = 3600
+# Weight of the latest stage in the running average of tokens per stage
+STAGE_TOKENS_ALPHA = 0.2
+
+
+class RunCancelledError(Exception):
+    pass
+
+
+class Run:
+    """One cancellable run: its token, the stages it plans to run and the tokens each has used so far."""
+
+    def __init__(self, run_id, stages):
+        self.run_id = run_id
+        self.stages = list(stages)
+        self.token = CancellationToken()
+        self.reason = None
+        self.started_at = time.time()
+        # A single-stage run (one agent endpoint) is in that stage from the start
+        self.stage = self.stages[0] if len(self.stages) == 1 else None
+        self.used = {}
+        self.done = set()
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def enter(self, stage):
+        self.stage = stage
+
+    def leave(self, stage):
+        self.done.add(stage)
+        if self.stage == stage:
+            self.stage = None
+
+    def charge(self, tokens):
+        self.used[self.stage] = self.used.get(self.stage, 0) + tokens
+
+    def check(self):
+        # Between stages: don't start the next one once the run is cancelled
+        if self.cancelled:
+            raise asyncio.CancelledError()
+
+    def summary(self):
+        return {
+            "run_id": self.run_id,
+            "stages": self.stages,
+            "stage": self.stage,
+            "used_tokens": sum(self.used.values()),
+            "started_at": self.started_at,
+            "cancelled": self.reason,
+        }
+
+
+class RunRegistry:
+    """Runs in flight in this worker, by run id, so a client disconnect or an API call can cancel them."""
+
+    def __init__(self):
+        self._runs = {}
+        self._requested = {}
+        self._stage_tokens = {}
+        self._watcher = None
+
+    @contextmanager
+    def track(self, run_id, stages):
+        run = Run(run_id, stages)
+        requested = self._requested.pop(run_id, None)
+        self._runs[run_id] = run
+        token = _run.set(run)
+        self._watch()
+        try:
+            if requested and requested[1] > time.time() - CANCEL_REQUEST_TTL:
+                self.cancel(run_id, requested[0])
+                run.check()
+            yield run
+            if run.stage is not None and run.stage not in run.done:
+                self.observe_stage(run, run.stage)
+        except (asyncio.CancelledError, Exception):
+            # Stopped by its token rather than by cancelling this task: an ordinary error for the caller
+            task = asyncio.current_task()
+            if run.cancelled and not (task and task.cancelling()):
+                raise RunCancelledError(f"Run {run_id} was cancelled ({run.reason}).") from None
+            raise
+        finally:
+            self._runs.pop(run_id, None)
+            if run.cancelled:
+                self._settle(run)
+            safe_reset(_run, token)
+
+    def cancel(self, run_id, reason="api"):
+        """Cancel a run of this worker: in-flight model calls are aborted and no new ones start. False if unknown."""
+        run = self._runs.get(run_id)
+        if run is None:
+            return False
+        if not run.cancelled:
+            run.reason = reason
+            print(f"🛑 Cancelling run {run_id} ({reason})")
+            run.token.cancel()
+        return True
+
+    async def request_cancel(self, run_id, reason="api"):
+        """Cancel a run wherever it is: here, on another worker sharing the state backend, or once it starts."""
+        if self.cancel(run_id, reason):
+            return "cancelled"
+        self._requested[run_id] = (reason, time.time())
+        if _shared_backend():
+            await get_state_backend().set("cancel", run_id, {"reason": reason}, ttl=CANCEL_REQUEST_TTL)
+        return "requested"
+
+    def observe_stage(self, run, stage):
+        """A stage of `run` finished normally: fold the tokens it used into that stage's running average."""
+        if stage == run.stage:
+            self._observe(stage, run.used.get(stage, 0))
+        run.leave(stage)
+
+    def _observe(self, stage, tokens):
+        if not tokens:
+            return
+        average = self._stage_tokens.get(stage)
+        self._stage_tokens[stage] = tokens if average is None else average + STAGE_TOKENS_ALPHA * (tokens - average)
+
+    def _settle(self, run):
+        # Estimated tokens not spent: what the unfinished stages usually cost, less what they already used
+        saved = sum(
+            max(0, self._stage_tokens.get(stage, 0) - run.used.get(stage, 0))
+            for stage in run.stages if stage not in run.done
+        )
+        CANCELLED_RUNS.labels(run.reason).inc()
+        CANCELLATION_SAVED_TOKENS.labels(run.reason).inc(saved)
+        print(f"🛑 Run {run.run_id} cancelled ({run.reason}): {sum(run.used.values())} tokens used, ~{int(saved)} saved")
+
+    def _watch(self):
+        # Cancellations requested on other workers arrive through the shared state backend
+        if _shared_backend() and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.get_running_loop().create_task(self._poll_requests())
+
+    async def _poll_requests(self):
+        backend = get_state_backend()
+        while self._runs:
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+            for run_id in list(self._runs):
+                requested = await backend.get("cancel", run_id)
+                if requested:
+                    self.cancel(run_id, requested["reason"])
+
+    def stats(self):
+        return {
+            "runs": [run.summary() for run in self._runs.values()],
+            "stage_tokens": {stage: round(tokens) for stage, tokens in self._stage_tokens.items()},
+        }
+
+
+def _shared_backend():
+    return not isinstance(get_state_backend(), InProcessStateBackend)
+
+
+run_registry = RunRegistry()
+
+# The run this task belongs to; None outside tracked runs
+_run = ContextVar("cancellable_run", default=None)
+
+def current_run():
+    return _run.get()
+
+
+async def wait_for_disconnect(request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+async def unless_disconnected(request, awaitable, run_id=None):
+    """Await `awaitable` while the client is connected. If it goes away first, cancel run `run_id`
+    (if given) and the awaitable, and return None; nobody is left to read a response."""
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if work.done():
+        return work.result()
+    print("🔌 Client disconnected")
+    if run_id:
+        run_registry.cancel(run_id, "disconnect")
+    work.cancel()
+    await asyncio.gather(work, return_exceptions=True)
+    return None
+
+
+class CancellableChatCompletionClient(DelegatingChatCompletionClient):
+    """Ties every model call to the current run: calls fail at once after the run is cancelled, calls
+    in flight (or queued in the rate limiter) are aborted with their HTTP request, and usage is charged to the run."""
+
+    async def create(self, messages, **kwargs):
+        run = current_run()
+        if run is None:
+            return await self.inner.create(messages, **kwargs)
+        if kwargs.get("cancellation_token") is None:
+            kwargs["cancellation_token"] = run.token
+        call = asyncio.ensure_future(self.inner.create(messages, **kwargs))
+        run.token.link_future(call)
+        result = await call
+        run.charge(result.usage.prompt_tokens + result.usage.completion_tokens)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        run = current_run()
+        if run is None:
+            async for chunk in self.inner.create_stream(messages, **kwargs):
+                yield chunk
+            return
+        if kwargs.get("cancellation_token") is None:
+            kwargs["cancellation_token"] = run.token
+        stream = self.inner.create_stream(messages, **kwargs)
+        try:
+            while True:
+                chunk = asyncio.ensure_future(anext(stream))
+                run.token.link_future(chunk)
+                try:
+                    chunk = await chunk
+                except StopAsyncIteration:
+                    break
+                if isinstance(chunk, CreateResult):
+                    run.charge(chunk.usage.prompt_tokens + chunk.usage.completion_tokens)
+                yield chunk
+        finally:
+            await stream.aclose()
+
+
+def with_cancellation(client):
+    return CancellableChatCompletionClient(client)
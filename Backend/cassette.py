@@ -0,0 +1,198 @@
+# cassette.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from autogen_core.models import CreateResult
+
+from context_vars import safe_reset
+from model_wrappers import DelegatingChatCompletionClient
+
+# CASSETTE_RECORD=1 writes every model exchange of a pipeline run to CASSETTE_DIR/<run_id>.jsonl
+CASSETTE_RECORD = os.getenv("CASSETTE_RECORD", "0") == "1"
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", os.path.join(".cache", "cassettes"))
+RUN_ID = re.compile(r"^[\w-]{1,64}$")
+
+
+class CassetteError(RuntimeError):
+    pass
+
+
+def cassette_path(run_id):
+    if not RUN_ID.match(run_id or ""):
+        raise CassetteError("Invalid run id.")
+    return os.path.join(CASSETTE_DIR, f"{run_id}.jsonl")
+
+def prompt_digest(messages):
+    payload = json.dumps([m.model_dump(mode="json") for m in messages], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """Append-only JSONL log of one run's model exchanges. Recording appends a line per call; replaying
+    answers each prompt with its recorded response (in recorded order when the prompt no longer matches)."""
+
+    def __init__(self, path, mode, latency=False):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.params = None
+        self.results = None
+        self.stages = {}
+        self.recorded = 0
+        self.served = 0
+        self.out_of_order = 0
+        self._file = None
+        # Recorded calls not served yet, by their position in the cassette (seqs restart on older
+        # cassettes of resumed runs, positions never repeat)
+        self._by_digest = defaultdict(deque)
+        self._pending = {}
+
+    @classmethod
+    def recorder(cls, run_id, params):
+        cassette = cls(cassette_path(run_id), "record")
+        os.makedirs(os.path.dirname(cassette.path) or ".", exist_ok=True)
+        resumed = os.path.exists(cassette.path)
+        if resumed:
+            # A resumed run appends to the cassette of its first attempt and carries on its numbering
+            with open(cassette.path, encoding="utf-8") as f:
+                seqs = [entry["seq"] for entry in map(json.loads, f) if entry["kind"] == "model"]
+            cassette.recorded = max(seqs, default=0)
+        cassette._file = open(cassette.path, "a", encoding="utf-8")
+        if not resumed:
+            cassette._append({"kind": "run", "run_id": run_id, "params": params, "recorded_at": time.time()})
+        return cassette
+
+    @classmethod
+    def player(cls, run_id, latency=False):
+        cassette = cls(cassette_path(run_id), "replay", latency)
+        if not os.path.exists(cassette.path):
+            raise CassetteError(f"No cassette recorded for run {run_id}.")
+        with open(cassette.path, encoding="utf-8") as f:
+            for position, line in enumerate(f):
+                entry = json.loads(line)
+                if entry["kind"] == "run":
+                    cassette.params = entry["params"]
+                elif entry["kind"] == "model":
+                    cassette._by_digest[entry["digest"]].append(position)
+                    cassette._pending[position] = entry
+                elif entry["kind"] == "stage":
+                    cassette.stages[entry["stage"]] = entry["output"]
+                elif entry["kind"] == "done":
+                    cassette.results = entry["results"]
+        return cassette
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def _append(self, entry):
+        # One line per entry, flushed at once, so a crashed run still leaves a readable cassette
+        self._file.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self._file.flush()
+
+    def record(self, messages, result, seconds):
+        self.recorded += 1
+        self._append({
+            "kind": "model",
+            "seq": self.recorded,
+            "digest": prompt_digest(messages),
+            "messages": len(messages),
+            "seconds": round(seconds, 4),
+            "result": result.model_dump(mode="json"),
+        })
+
+    def record_stage(self, stage, output):
+        # Stages answered by the stage cache make no model calls; keep their output instead
+        self._append({"kind": "stage", "stage": stage, "output": output})
+
+    def record_done(self, results):
+        self._append({"kind": "done", "results": results})
+
+    async def replay(self, messages):
+        queue = self._by_digest.get(prompt_digest(messages))
+        while queue and queue[0] not in self._pending:
+            queue.popleft()
+        if queue:
+            position = queue.popleft()
+        elif self._pending:
+            # The prompt changed since recording (new code or a retried stage): take the next call in order
+            position = min(self._pending)
+            self.out_of_order += 1
+        else:
+            raise CassetteError(f"Cassette {os.path.basename(self.path)} has no more recorded calls.")
+        entry = self._pending.pop(position)
+        self.served += 1
+        if self.latency:
+            await asyncio.sleep(entry["seconds"])
+        return CreateResult.model_validate(entry["result"])
+
+    def compare(self, results):
+        """Stages whose replayed output differs from the recorded run (None if the recording never finished)."""
+        if self.results is None:
+            return None
+        return [key for key in self.results if results.get(key) != self.results[key]]
+
+    def stats(self):
+        return {"served": self.served, "out_of_order": self.out_of_order, "unused": len(self._pending)}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Cassette of the pipeline run this task belongs to; None when nothing is recorded or replayed
+_cassette = ContextVar("cassette", default=None)
+
+def current_cassette():
+    return _cassette.get()
+
+@contextmanager
+def use_cassette(cassette):
+    token = _cassette.set(cassette)
+    try:
+        yield cassette
+    finally:
+        if cassette is not None:
+            cassette.close()
+        safe_reset(_cassette, token)
+
+
+class CassetteChatCompletionClient(DelegatingChatCompletionClient):
+    """Records every call into, or answers it from, the current run's cassette; passes through otherwise."""
+
+    async def create(self, messages, **kwargs):
+        cassette = current_cassette()
+        if cassette is None:
+            return await self.inner.create(messages, **kwargs)
+        if cassette.replaying:
+            return await cassette.replay(messages)
+        start = time.perf_counter()
+        result = await self.inner.create(messages, **kwargs)
+        cassette.record(messages, result, time.perf_counter() - start)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        cassette = current_cassette()
+        if cassette is not None and cassette.replaying:
+            result = await cassette.replay(messages)
+            if isinstance(result.content, str):
+                yield result.content
+            yield result
+            return
+        start = time.perf_counter()
+        async for chunk in self.inner.create_stream(messages, **kwargs):
+            if cassette is not None and isinstance(chunk, CreateResult):
+                cassette.record(messages, chunk, time.perf_counter() - start)
+            yield chunk
+
+
+def with_cassette(client):
+    return CassetteChatCompletionClient(client)
@@ -0,0 +1,125 @@
+# checkpoints.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+def new_run_id():
+    return uuid.uuid4().hex
+
+
+class CheckpointStore:
+    """Durable per-run record of finished pipeline stages, so a failed run can resume where it stopped.
+    The async methods run the SQLite work (commits, large team_state blobs) in a worker thread."""
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.getenv("CHECKPOINT_PATH", os.path.join(".cache", "checkpoints.sqlite3"))
+        self.ttl = ttl or int(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, params TEXT, status TEXT, error TEXT, created_at REAL, updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated_at);
+            CREATE TABLE IF NOT EXISTS stages (
+                run_id TEXT, stage TEXT, output TEXT, team_state TEXT, completed_at REAL,
+                PRIMARY KEY (run_id, stage)
+            );
+            """
+        )
+        self._conn.commit()
+
+    async def start_run(self, run_id, params):
+        """Register a run (or re-open an existing one for resume) and return its finished stages."""
+        return await asyncio.to_thread(self._start_run, run_id, params)
+
+    async def save_stage(self, run_id, stage, output, team_state=None):
+        await asyncio.to_thread(self._save_stage, run_id, stage, output, team_state)
+
+    async def finish_run(self, run_id, status, error=None):
+        await asyncio.to_thread(self._finish_run, run_id, status, error)
+
+    async def get_run(self, run_id, include_state=False):
+        return await asyncio.to_thread(self._get_run, run_id, include_state)
+
+    def _start_run(self, run_id, params):
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._conn.execute(
+                "INSERT INTO runs (run_id, params, status, error, created_at, updated_at) VALUES (?, ?, 'running', NULL, ?, ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET status = 'running', error = NULL, updated_at = excluded.updated_at",
+                (run_id, json.dumps(params), now, now),
+            )
+            self._conn.commit()
+            rows = self._conn.execute("SELECT stage, output FROM stages WHERE run_id = ?", (run_id,)).fetchall()
+        return {stage: json.loads(output) for stage, output in rows}
+
+    def _save_stage(self, run_id, stage, output, team_state=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages (run_id, stage, output, team_state, completed_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, stage, json.dumps(output, default=str),
+                 json.dumps(team_state, default=str) if team_state is not None else None, now),
+            )
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+            self._conn.commit()
+
+    def _finish_run(self, run_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, error = ?, updated_at = ? WHERE run_id = ?", (status, error, time.time(), run_id)
+            )
+            self._conn.commit()
+
+    def _get_run(self, run_id, include_state=False):
+        with self._lock:
+            run = self._conn.execute(
+                "SELECT params, status, error, created_at, updated_at FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if run is None:
+                return None
+            stages = self._conn.execute(
+                "SELECT stage, output, team_state, completed_at FROM stages WHERE run_id = ? ORDER BY completed_at", (run_id,)
+            ).fetchall()
+
+        params, status, error, created_at, updated_at = run
+        return {
+            "run_id": run_id,
+            "params": json.loads(params),
+            "status": status,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "stages": {
+                stage: {
+                    "output": json.loads(output),
+                    "completed_at": completed_at,
+                    **({"team_state": json.loads(team_state) if team_state else None} if include_state else {}),
+                }
+                for stage, output, team_state, completed_at in stages
+            },
+        }
+
+    def _prune(self, now):
+        expired = "SELECT run_id FROM runs WHERE updated_at < ?"
+        self._conn.execute(f"DELETE FROM stages WHERE run_id IN ({expired})", (now - self.ttl,))
+        self._conn.execute("DELETE FROM runs WHERE updated_at < ?", (now - self.ttl,))
+
+
+_store = None
+
+def get_checkpoint_store():
+    global _store
+    if _store is None:
+        _store = CheckpointStore()
+    return _store
@@ -1,79 +1,58 @@
 # chooseAgent.py
 
-from autogen_core import CancellationToken
-from autogen_agentchat.messages import TextMessage
-import researchAgent
-import productAgent
-import marketingAgent
-from agent_pipeline import run_agent_team
+from agent_pipeline import PIPELINE_STAGES, run_stage
+from cancellation import run_registry
+from checkpoints import new_run_id
+from stage_scheduler import Stage, StageScheduler
+from budget import PipelineBudget, pipeline_budget
+
+# Each stage feeds on the output of the stage before it
+STAGE_INPUTS = {
+    "research": (),
+    "product": ("research",),
+    "marketing": ("product",),
+}
+
+
+def build_scheduler(company1=None, company2=None, user_input=None, cancellation_token=None, force_refresh=False):
+    def make_runner(name):
+        async def run(inputs):
+            previous = next(iter(inputs.values()), None)
+            print(f"Running {name.title()} Agent...")
+            return await run_stage(
+                name,
+                company1=company1,
+                company2=company2,
+                user_input=user_input,
+                previous=previous,
+                cancellation_token=cancellation_token,
+                force_refresh=force_refresh,
+            )
+        return run
+
+    return StageScheduler([
+        Stage(name, make_runner(name), inputs=STAGE_INPUTS[name])
+        for name in PIPELINE_STAGES
+    ])
 
-async def run_chosen_agents(selected_agents: list):
+async def run_chosen_agents(selected_agents: list, company1=None, company2=None, user_input=None, force_refresh=False, run_id=None):
     valid_agents = {"research", "product", "marketing", "pipeline"}
     selected_agents = [agent.lower() for agent in selected_agents if agent.lower() in valid_agents]
 
     if not selected_agents:
         return {"status": "error", "message": "No valid agents selected."}
 
-    cancellation_token = CancellationToken()
-    results = {}
-    previous_message = None
-
     if "pipeline" in selected_agents:
         selected_agents = ["research", "product", "marketing"]
 
-    for agent in selected_agents:
-        if agent == "research":
-            if "research_output" not in results:
-                print("Running Research Agent...")
-                research_result = await run_agent_team(
-                    team=researchAgent.group_chat,
-                    task="Start by discussing Microsoft and Samsung current operations and XR future.",
-                    cancellation_token=cancellation_token,
-                )
-                previous_message = research_result.messages[-1]
-                results['research_output'] = previous_message.content
-
-        elif agent == "product":
-            if "research_output" not in results:
-                print("Auto-running Research Agent for Product Agent...")
-                research_result = await run_agent_team(
-                    team=researchAgent.group_chat,
-                    task="Start by discussing Microsoft and Samsung current operations and XR future.",
-                    cancellation_token=cancellation_token,
-                )
-                previous_message = research_result.messages[-1]
-                results['research_output'] = previous_message.content
-
-            print("Running Product Agent...")
-            product_result = await run_agent_team(
-                team=productAgent.team,
-                task=[TextMessage(content=results['research_output'], source="research_agent")],
-                cancellation_token=cancellation_token,
-            )
-            previous_message = product_result.messages[-1]
-            results['product_output'] = previous_message.content
-
-        elif agent == "marketing":
-            marketing_input = results.get('product_output') or results.get('research_output')
+    run_id = run_id or new_run_id()
+    with run_registry.track(run_id, build_scheduler().plan(selected_agents)) as run:
+        scheduler = build_scheduler(company1, company2, user_input, run.token, force_refresh)
+        # One budget for every stage the scheduler runs (PIPELINE_MAX_* env vars)
+        with pipeline_budget(PipelineBudget.from_env()):
+            agents_run, outputs = await scheduler.run(selected_agents)
 
-            if not marketing_input:
-                print("Auto-running Research Agent for Marketing Agent...")
-                research_result = await run_agent_team(
-                    team=researchAgent.group_chat,
-                    task="Start by discussing Microsoft and Samsung current operations and XR future.",
-                    cancellation_token=cancellation_token,
-                )
-                previous_message = research_result.messages[-1]
-                results['research_output'] = previous_message.content
-                marketing_input = results['research_output']
-
-            print("Running Marketing Agent...")
-            marketing_result = await run_agent_team(
-                team=marketingAgent.team,
-                task=[TextMessage(content=marketing_input, source="input_agent")],
-                cancellation_token=cancellation_token,
-            )
-            previous_message = marketing_result.messages[-1]
-            results['marketing_output'] = previous_message.content
+    results = {f"{name}_output": output["content"] for name, output in outputs.items()}
+    stop_reasons = {name: output["stop_reason"] for name, output in outputs.items()}
 
-    return {"status": "success", "agents_run": selected_agents, "results": results}
+    return {"status": "success", "run_id": run_id, "agents_run": agents_run, "results": results, "stop_reasons": stop_reasons}
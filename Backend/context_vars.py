@@ -0,0 +1,11 @@
+# context_vars.py
+
+
+def safe_reset(var, token):
+    """Undo `var.set()` from a `with` block's exit. A streaming response dropped by its client is closed
+    (and its context managers exit) from another context, where the token doesn't apply; there is
+    nothing to restore then, since the request's own context is gone."""
+    try:
+        var.reset(token)
+    except ValueError:
+        pass
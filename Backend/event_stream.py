@@ -0,0 +1,77 @@
+# event_stream.py
+import asyncio
+import json
+import os
+
+from fastapi.responses import StreamingResponse
+
+# Idle proxies (Azure ingress, nginx) drop connections after ~60-240s without bytes
+HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+_DONE = object()
+
+
+def format_sse(event):
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+def format_ndjson(event):
+    return json.dumps(event, default=str) + "\n"
+
+
+async def with_heartbeat(events, encode, heartbeat, interval=HEARTBEAT_SECONDS, on_disconnect=None):
+    # Run the producer in its own task so a slow model turn can't stall heartbeats
+    queue = asyncio.Queue()
+    finished = False
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            print("Error in event stream:", e)
+            await queue.put({"event": "error", "detail": str(e)})
+        finally:
+            await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield heartbeat
+                continue
+            if event is _DONE:
+                finished = True
+                break
+            yield encode(event)
+    finally:
+        # Client went away (or we finished): stop the pipeline behind the stream. Cancelling the
+        # producer alone would leave the teams' in-flight model calls running to completion.
+        if not finished and on_disconnect:
+            print("🔌 Stream client disconnected")
+            on_disconnect()
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+def event_stream_response(events, accept="", format=None, on_disconnect=None):
+    # SSE by default for EventSource-style clients, newline-delimited JSON otherwise.
+    # on_disconnect() runs if the client goes away before the stream ends (e.g. to cancel the run behind it)
+    use_sse = format == "sse" or (format is None and "application/x-ndjson" not in accept)
+    if use_sse:
+        body = with_heartbeat(events, format_sse, ": keep-alive\n\n", on_disconnect=on_disconnect)
+        media_type = "text/event-stream"
+    else:
+        body = with_heartbeat(events, format_ndjson, format_ndjson({"event": "ping"}), on_disconnect=on_disconnect)
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # disable proxy buffering so events flush immediately
+        },
+    )
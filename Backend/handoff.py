@@ -0,0 +1,154 @@
+# handoff.py
+import json
+import os
+import re
+from typing import List
+
+from autogen_core.models import SystemMessage, UserMessage
+from pydantic import BaseModel
+
+from bounded_context import context_window, team_setting
+
+# What the next stage receives as its task: "off" (the stage's whole last message), "rules"
+# (sentences picked out of the transcript, no model call) or "model" (one extraction call, rules as fallback)
+HANDOFF_MODE = os.getenv("HANDOFF_MODE", "off")
+HANDOFF_MAX_TOKENS = int(os.getenv("HANDOFF_MAX_TOKENS", "400"))
+
+HANDOFF_PROMPT = (
+    "You hand a multi-agent business discussion on to the next team. Reply with JSON only, shaped "
+    '{"key_facts": [], "numbers": [], "usps": [], "constraints": []}: short bullet strings with every company '
+    "name, figure and decision that matters; unique selling points of the product; constraints such as budget, "
+    "timing, regulation or the user's instruction. No greetings, no repetition."
+)
+# Phrases that end a team's discussion; a task that contains one would stop the next team before it starts
+TERMINATION_PHRASES = re.compile(r"\b(APPROVE|ENOUGH INFO)\b[.!]?")
+
+NUMBER = re.compile(r"\d")
+USP = re.compile(r"\b(unique|only|first|exclusive|differentiat\w*|advantage|USP|unlike|best-in-class)\b", re.IGNORECASE)
+CONSTRAINT = re.compile(r"\b(must|cannot|can't|limit\w*|constraint\w*|risk\w*|regulat\w*|budget|deadline|require\w*|instruction)\b", re.IGNORECASE)
+SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def text_tokens(text):
+    # Same ~4 characters per token estimate as the bounded context
+    return len(text) // 4
+
+
+class StageHandoff(BaseModel):
+    key_facts: List[str] = []
+    numbers: List[str] = []
+    usps: List[str] = []
+    constraints: List[str] = []
+
+    def render(self, stage):
+        sections = [("Key facts", self.key_facts), ("Numbers", self.numbers), ("USPs", self.usps), ("Constraints", self.constraints)]
+        lines = [f"Summary of the {stage} discussion:"]
+        for title, items in sections:
+            if items:
+                lines.append(f"{title}:")
+                lines += [f"- {item}" for item in items]
+        return "\n".join(lines)
+
+    def fit(self, stage, max_tokens):
+        """Drop items (from the longest section, last first) until the rendered text fits in max_tokens."""
+        text = self.render(stage)
+        while text_tokens(text) > max_tokens:
+            longest = max((self.key_facts, self.numbers, self.usps, self.constraints), key=len)
+            if not longest:
+                break
+            longest.pop()
+            text = self.render(stage)
+        return text
+
+
+def transcript_text(messages):
+    # Agent turns only: the task message is the previous stage's handoff, already summarized
+    return "\n\n".join(f"[{m.source}] {m.content}" for m in messages if m.models_usage is not None and isinstance(m.content, str))
+
+def extract_rules(messages):
+    seen = set()
+    handoff = StageHandoff()
+    # Latest turns first: the closing messages carry the settled conclusions
+    for message in reversed([m for m in messages if m.models_usage is not None and isinstance(m.content, str)]):
+        for sentence in SENTENCE.split(TERMINATION_PHRASES.sub("", message.content)):
+            sentence = sentence.strip(" -*#\t")
+            if len(sentence) < 12 or sentence.lower() in seen:
+                continue
+            seen.add(sentence.lower())
+            if CONSTRAINT.search(sentence):
+                handoff.constraints.append(sentence)
+            elif USP.search(sentence):
+                handoff.usps.append(sentence)
+            elif NUMBER.search(sentence):
+                handoff.numbers.append(sentence)
+            else:
+                handoff.key_facts.append(sentence)
+    return handoff
+
+async def extract_model(messages, client):
+    result = await client.create([
+        SystemMessage(content=HANDOFF_PROMPT),
+        UserMessage(content=transcript_text(messages), source="user"),
+    ])
+    content = result.content if isinstance(result.content, str) else ""
+    # Models like to wrap JSON in a code fence
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    handoff = StageHandoff.model_validate(json.loads(match.group(0))) if match else None
+    return handoff, result.usage.prompt_tokens + result.usage.completion_tokens
+
+
+async def build_handoff(stage, messages, full_content, client=None):
+    """Compact typed summary of a stage's transcript for the next stage, or None with HANDOFF_MODE=off."""
+    mode = team_setting(stage, "HANDOFF_MODE", HANDOFF_MODE)
+    if mode not in ("rules", "model"):
+        return None
+    max_tokens = int(team_setting(stage, "HANDOFF_MAX_TOKENS", str(HANDOFF_MAX_TOKENS)))
+
+    handoff, extraction_tokens = None, 0
+    if mode == "model":
+        from model_registry import get_model_client
+
+        try:
+            handoff, extraction_tokens = await extract_model(messages, client or get_model_client())
+        except Exception as e:
+            # A failed or malformed extraction must not fail the stage that already finished
+            print(f"⚠️ {stage} handoff extraction failed ({e}); using rules")
+    if handoff is None:
+        handoff = extract_rules(messages)
+
+    for items in (handoff.key_facts, handoff.numbers, handoff.usps, handoff.constraints):
+        items[:] = [TERMINATION_PHRASES.sub("", item).strip() for item in items if item.strip()]
+    text = handoff.fit(stage, max_tokens)
+    full_tokens = text_tokens(full_content)
+    # Short messages are handed on as they are
+    if text_tokens(text) >= full_tokens:
+        return None
+    return {
+        "mode": mode,
+        "text": text,
+        "summary": handoff.model_dump(),
+        "full_tokens": full_tokens,
+        "handoff_tokens": text_tokens(text),
+        "extraction_tokens": extraction_tokens,
+    }
+
+
+def handoff_text(previous):
+    """What the next stage gets from `previous`: its compact handoff if one was built, else its last message."""
+    handoff = previous.get("handoff")
+    return handoff["text"] if handoff else previous["content"]
+
+
+def handoff_savings(handoff, downstream_team, downstream_turns):
+    """Estimated prompt tokens saved downstream: the trimmed task is resent on each turn while it is
+    still in the bounded context window, minus what the extraction call cost."""
+    window = context_window(downstream_team)
+    resends = min(downstream_turns, window) if window > 0 else downstream_turns
+    saved = (handoff["full_tokens"] - handoff["handoff_tokens"]) * resends - handoff["extraction_tokens"]
+    return {
+        "full_tokens": handoff["full_tokens"],
+        "handoff_tokens": handoff["handoff_tokens"],
+        "extraction_tokens": handoff["extraction_tokens"],
+        "downstream_turns": downstream_turns,
+        "saved_prompt_tokens": saved,
+    }
@@ -0,0 +1,177 @@
+# hedging.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from budget import DeadlineExceeded, remaining_seconds
+from metrics import MODEL_DEADLINE_EXCEEDED, MODEL_HEDGES
+from model_wrappers import DelegatingChatCompletionClient
+
+# Agents whose slow calls get a hedged second request: "all" or names like "critic_agent,product.collaborator"
+MODEL_HEDGE_AGENTS = {name.strip() for name in os.getenv("MODEL_HEDGE_AGENTS", "").split(",") if name.strip()}
+# Hedge once a call has run longer than this latency percentile of its model
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", "95"))
+# At most this fraction of hedge-enabled calls may send a second request (bounds the extra spend)
+MODEL_HEDGE_MAX_RATE = float(os.getenv("MODEL_HEDGE_MAX_RATE", "0.1"))
+# Calls of a model observed before its percentiles are trusted, and how many recent ones are kept
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", "20"))
+MODEL_LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "500"))
+
+
+class LatencyTracker:
+    """Latencies of the last `window` successful calls of one model."""
+
+    def __init__(self, window=MODEL_LATENCY_WINDOW, min_samples=MODEL_HEDGE_MIN_SAMPLES):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        # None until there are enough samples to say what "slow" means for this model
+        if len(self.samples) < max(1, self.min_samples):
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def stats(self):
+        return {
+            "samples": len(self.samples),
+            **{f"p{p}": self.percentile(p) for p in (50, 95, 99)},
+        }
+
+
+class HedgeBudget:
+    """Global cap on hedges: each hedge-enabled call earns `rate` credit, each hedge spends one."""
+
+    def __init__(self, rate=MODEL_HEDGE_MAX_RATE):
+        self.rate = rate
+        self.burst = max(1.0, rate * 100)
+        self.credit = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.credit = min(self.burst, self.credit + self.rate)
+
+    def take(self):
+        with self._lock:
+            if self.credit < 1:
+                return False
+            self.credit -= 1
+            return True
+
+
+_trackers = {}
+_counts = {}
+hedge_budget = HedgeBudget()
+
+def get_latency_tracker(model):
+    if model not in _trackers:
+        _trackers[model] = LatencyTracker()
+    return _trackers[model]
+
+def _count(model, outcome):
+    if model not in _counts:
+        _counts[model] = {"calls": 0, "won": 0, "lost": 0, "capped": 0, "deadline_exceeded": 0}
+    _counts[model][outcome] += 1
+
+
+class LatencyChatCompletionClient(DelegatingChatCompletionClient):
+    """Records how long the provider takes to answer each successful call. Sits below the rate limiter,
+    so time spent queued for a slot doesn't count as model latency."""
+
+    async def create(self, messages, **kwargs):
+        start = time.perf_counter()
+        result = await self.inner.create(messages, **kwargs)
+        if not result.cached:
+            get_latency_tracker(self.model_name).record(time.perf_counter() - start)
+        return result
+
+
+class DeadlineChatCompletionClient(DelegatingChatCompletionClient):
+    """Gives every call the time left before its team run or pipeline hits a deadline. A call out of time
+    raises DeadlineExceeded; the stage then ends as a budget stop with the turns it already has."""
+
+    async def create(self, messages, **kwargs):
+        remaining = remaining_seconds()
+        model = self.model_name
+        try:
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(self.inner.create(messages, **kwargs), remaining)
+        except asyncio.TimeoutError:
+            # Only our own deadline; a timeout raised below (HTTP, provider) is a real error
+            if remaining is None or remaining_seconds() > 0:
+                raise
+            print(f"⏱️ Model call to {model} stopped at the stage deadline")
+            MODEL_DEADLINE_EXCEEDED.labels(model).inc()
+            _count(model, "deadline_exceeded")
+            raise DeadlineExceeded(f"Deadline reached during a call to {model}") from None
+
+
+class HedgingChatCompletionClient(DelegatingChatCompletionClient):
+    """Sends a second copy of a call that has outlived its model's MODEL_HEDGE_PERCENTILE latency and
+    returns whichever answer comes first, cancelling the other. Streaming calls are not hedged."""
+
+    async def create(self, messages, **kwargs):
+        model = self.model_name
+        hedge_budget.earn()
+        _count(model, "calls")
+        delay = get_latency_tracker(model).percentile(MODEL_HEDGE_PERCENTILE)
+        if delay is None:
+            return await self.inner.create(messages, **kwargs)
+
+        primary = asyncio.ensure_future(self.inner.create(messages, **kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            if not hedge_budget.take():
+                MODEL_HEDGES.labels(model, "capped").inc()
+                _count(model, "capped")
+                return await primary
+
+            backup = asyncio.ensure_future(self.inner.create(messages, **kwargs))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if not call.cancelled() and call.exception() is None:
+                        outcome = "won" if call is backup else "lost"
+                        MODEL_HEDGES.labels(model, outcome).inc()
+                        _count(model, outcome)
+                        return call.result()
+            # Both copies failed: surface the original call's error
+            return primary.result()
+        finally:
+            for call in pending:
+                call.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def with_latency(client):
+    return LatencyChatCompletionClient(client)
+
+def with_deadline(client):
+    return DeadlineChatCompletionClient(client)
+
+def hedged(client, team, agent):
+    # Hedging is opt-in per agent ("critic_agent" or "research.critic_agent"), off by default
+    if "all" in MODEL_HEDGE_AGENTS or agent in MODEL_HEDGE_AGENTS or f"{team}.{agent}" in MODEL_HEDGE_AGENTS:
+        return HedgingChatCompletionClient(client)
+    return client
+
+def hedging_stats():
+    return {
+        "agents": sorted(MODEL_HEDGE_AGENTS),
+        "percentile": MODEL_HEDGE_PERCENTILE,
+        "max_rate": MODEL_HEDGE_MAX_RATE,
+        "models": {
+            model: {**tracker.stats(), **_counts.get(model, {})} for model, tracker in _trackers.items()
+        },
+    }
@@ -0,0 +1,130 @@
+# job_queue.py
+import asyncio
+import os
+import time
+import uuid
+
+from cancellation import RunCancelledError
+from state_backend import get_state_backend
+
+# Unfinished jobs expire too, so a worker that died mid-run can't leave a job "running" forever
+UNFINISHED_JOB_TTL = 24 * 3600
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    """Bounded asyncio worker pool for long pipeline runs, polled by job id. Job records live in the
+    state backend, so any worker sharing it can answer a poll; the run itself stays on the submitting worker."""
+
+    def __init__(self, concurrency=None, max_queued=None, ttl=None):
+        self.concurrency = concurrency or int(os.getenv("PIPELINE_WORKERS", "2"))
+        self.max_queued = max_queued or int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+        # Finished jobs are kept this long (seconds) so clients can still fetch results
+        self.ttl = ttl or int(os.getenv("JOB_TTL_SECONDS", "3600"))
+        self.jobs = {}
+        self._queue = None
+        self._saves = {}
+        self._workers = []
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        print(f"🧵 Job queue started with {self.concurrency} worker(s)")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, kind, runner, params=None):
+        # runner is `async def runner(on_progress) -> dict`
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started.")
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "params": params or {},
+            "stages": {},
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        # Take the queue slot before awaiting anything, so concurrent submits can't overfill it
+        self.jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, runner))
+        except asyncio.QueueFull:
+            del self.jobs[job_id]
+            raise QueueFullError(f"Too many queued jobs (limit {self.max_queued}), try again later.")
+        # Stored before submit returns, so a poll that lands on another worker right away finds it;
+        # chained with the worker's own saves, so a "queued" write can't land after "running"
+        await self._save(job)
+        return job
+
+    async def get(self, job_id):
+        return await get_state_backend().get("jobs", job_id)
+
+    async def _store(self, job):
+        ttl = self.ttl if job["finished_at"] else UNFINISHED_JOB_TTL
+        await get_state_backend().set("jobs", job["job_id"], job, ttl=ttl)
+
+    def _save(self, job):
+        # Progress callbacks are synchronous; chain the writes so they land in order
+        previous = self._saves.get(job["job_id"])
+
+        async def save():
+            if previous:
+                await asyncio.gather(previous, return_exceptions=True)
+            await self._store(job)
+
+        self._saves[job["job_id"]] = asyncio.ensure_future(save())
+        return self._saves[job["job_id"]]
+
+    async def _worker(self):
+        while True:
+            job_id, runner = await self._queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            self._save(job)
+
+            def on_progress(stage, status, job=job):
+                job["stages"][stage] = {"status": status, "updated_at": time.time()}
+                self._save(job)
+
+            try:
+                job["result"] = await runner(on_progress)
+                job["status"] = "completed"
+            except asyncio.CancelledError:
+                job["status"] = "cancelled"
+                raise
+            except RunCancelledError as e:
+                # POST /runs/<run_id>/cancel: the worker moves on to the next job
+                job["status"] = "cancelled"
+                job["error"] = str(e)
+            except Exception as e:
+                print(f"Error in job {job_id}:", e)
+                job["status"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+                try:
+                    await asyncio.shield(self._save(job))
+                except Exception as e:
+                    print(f"Error saving job {job_id}:", e)
+                self._saves.pop(job_id, None)
+                self.jobs.pop(job_id, None)
+                self._queue.task_done()
+
+
+# Shared queue for this worker process
+job_queue = JobQueue()
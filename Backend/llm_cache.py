@@ -0,0 +1,206 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from autogen_core.models import CreateResult
+from pydantic import BaseModel
+
+from context_vars import safe_reset
+from model_wrappers import DelegatingChatCompletionClient
+
+# Set per request to skip cache reads (fresh answers are still written back)
+_bypass = ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_cache(enabled=True):
+    token = _bypass.set(bool(enabled))
+    try:
+        yield
+    finally:
+        safe_reset(_bypass, token)
+
+
+class DiskCacheStore:
+    """SQLite-backed key/value store with a TTL and size-based LRU eviction."""
+
+    def __init__(self, path=None, max_bytes=None, ttl=None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+        self.max_bytes = max_bytes or int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self.ttl = ttl or int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB, size INTEGER, created_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        expired = self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,)).rowcount
+        self.evictions += max(expired, 0)
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we're back under the limit
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+        }
+
+
+_default_store = None
+
+def get_default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = DiskCacheStore()
+    return _default_store
+
+
+def _jsonable(value):
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return value.model_json_schema()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if hasattr(value, "schema"):  # autogen Tool
+        return value.schema
+    return value
+
+
+class CachingChatCompletionClient(DelegatingChatCompletionClient):
+    """Drop-in model_client that serves repeated prompts from a content-addressed disk cache."""
+
+    def __init__(self, inner, store=None):
+        super().__init__(inner)
+        self.store = store or get_default_store()
+
+    def cache_key(self, messages, tools=(), tool_choice="auto", json_output=None, extra_create_args=None):
+        payload = {
+            "model": self.model_name,
+            # temperature, top_p etc. configured on the client
+            "create_args": getattr(self.inner, "_create_args", {}),
+            "messages": [_jsonable(m) for m in messages],
+            "tools": [_jsonable(t) for t in tools],
+            "tool_choice": _jsonable(tool_choice),
+            "json_output": _jsonable(json_output),
+            "extra_create_args": dict(extra_create_args or {}),
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def _lookup(self, key):
+        if _bypass.get():
+            return None
+        value = await asyncio.to_thread(self.store.get, key)
+        if value is None:
+            return None
+        result = CreateResult.model_validate_json(value)
+        result.cached = True
+        return result
+
+    async def _save(self, key, result):
+        if result.finish_reason not in ("stop", "function_calls"):
+            return
+        await asyncio.to_thread(self.store.set, key, result.model_dump_json().encode("utf-8"))
+
+    async def create(self, messages, **kwargs):
+        key = self.cache_key(
+            messages,
+            kwargs.get("tools", ()),
+            kwargs.get("tool_choice", "auto"),
+            kwargs.get("json_output"),
+            kwargs.get("extra_create_args"),
+        )
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+
+        result = await self.inner.create(messages, **kwargs)
+        await self._save(key, result)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        key = self.cache_key(
+            messages,
+            kwargs.get("tools", ()),
+            kwargs.get("tool_choice", "auto"),
+            kwargs.get("json_output"),
+            kwargs.get("extra_create_args"),
+        )
+        cached = await self._lookup(key)
+        if cached is not None:
+            if isinstance(cached.content, str):
+                yield cached.content
+            yield cached
+            return
+
+        async for chunk in self.inner.create_stream(messages, **kwargs):
+            if isinstance(chunk, CreateResult):
+                await self._save(key, chunk)
+            yield chunk
+
+
+def with_cache(client):
+    # LLM_CACHE_ENABLED=0 turns caching off without touching the agents
+    if os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("0", "false", "no"):
+        return client
+    return CachingChatCompletionClient(client)
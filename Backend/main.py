@@ -1,23 +1,61 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, Request
 
+import asyncio
 import os
+import sqlite3
 import uvicorn
+from datetime import datetime
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware  
-from productAgent import run_agent_post as run_product_agent
-from researchAgent import run_agent_post as run_research_agent
-from marketingAgent import run_agent_post as run_marketing_agent
-from productAgent import run_agent as run_product_agent_get
-from marketingAgent import run_agent as run_marketing_agent_get
-from researchAgent import run_agent as run_research_agent_get
-from agent_pipeline import run_full_pipeline
-from save_report import list_reports, get_report_path, delete_report, save_pipeline_report
-from fastapi.responses import FileResponse
-from typing import Optional
-
+from agent_registry import get_agent, warm_up
+from agent_pipeline import run_full_pipeline, stream_full_pipeline
+from checkpoints import get_checkpoint_store, new_run_id
+from cassette import Cassette, CassetteError
+from cancellation import RunCancelledError, run_registry, unless_disconnected
+from single_flight import request_key, single_flight
+from chooseAgent import run_chosen_agents
+from batch_pipeline import run_batch, BATCH_MAX_ITEMS
+from event_stream import event_stream_response
+from save_report import search_reports, get_report_path, get_pdf_path, delete_report, save_pipeline_report
+from report_files import serve_report
+from report_renderer import RENDER_EAGER, RENDERERS, renderer
+from report_catalog import get_catalog
+from job_queue import job_queue, QueueFullError
+from llm_cache import bypass_cache, get_default_store
+from metrics import render_metrics
+from model_registry import model_registry
+from rate_limiter import rate_limit_stats
+from hedging import hedging_stats
+from fastapi.responses import JSONResponse, Response
+from typing import List, Optional
+
+
+# Index reports saved before the catalog existed (or copied in by hand)
+async def backfill_catalog():
+    try:
+        print(f"🗂️ Report catalog backfilled: {await asyncio.to_thread(get_catalog().backfill)}")
+    except Exception as e:
+        print(f"⚠️ Report catalog backfill failed: {e}")
+
+# Start/stop background job workers with the app, and close pooled model connections on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_queue.start()
+    backfill = asyncio.create_task(backfill_catalog())
+    # Optional warm-up (WARMUP_AGENTS=research,product or all) runs in the background so health checks pass right away
+    warmup = asyncio.create_task(warm_up())
+    yield
+    warmup.cancel()
+    # Stops waiting for the backfill; its thread finishes the current batch on its own
+    backfill.cancel()
+    await asyncio.gather(backfill, return_exceptions=True)
+    await job_queue.stop()
+    await model_registry.close()
+    renderer.close()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Define the input model
 class AgentInput(BaseModel):
@@ -25,7 +63,18 @@ class AgentInput(BaseModel):
     companyName2: str
     textInstruction: Optional[str] = None  
     task: Optional[str] = None  
+    bypassCache: bool = False  # skip cached model responses for this request
+    forceRefresh: bool = False  # recompute every pipeline stage instead of reusing memoized outputs
     
+# Pick which stages to run; prerequisites are added automatically
+class RunAgentsInput(AgentInput):
+    agents: List[str] = ["pipeline"]
+
+# Many company pairs / instructions in one request
+class BatchInput(BaseModel):
+    items: List[AgentInput]
+    concurrency: Optional[int] = None  # defaults to BATCH_CONCURRENCY
+
 # CORS settings for allowing cross-origin requests
 app.add_middleware(
     CORSMiddleware,
@@ -42,106 +91,329 @@ def root():
 
 #research agent
 @app.post("/research-agent")
-async def research_agent_dynamic(input: AgentInput):
-    chat_result = await run_research_agent(
-        company1=input.companyName1,
-        company2=input.companyName2,
-        user_input=input.textInstruction,
-        task=input.task 
-    )
-    return {
-        "status": "success",
-        "messages": [
-            {"source": msg.source, "content": msg.content}
-            for msg in chat_result.messages
-        ]
-    }
+async def research_agent_dynamic(input: AgentInput, request: Request):
+    run_id = new_run_id()
+
+    async def run():
+        try:
+            with bypass_cache(input.bypassCache), run_registry.track(run_id, ["research"]) as tracked:
+                chat_result = await get_agent("research").run_agent_post(
+                    company1=input.companyName1,
+                    company2=input.companyName2,
+                    user_input=input.textInstruction,
+                    task=input.task,
+                    cancellation_token=tracked.token
+                )
+        except RunCancelledError as e:
+            return {"status": "error", "detail": str(e), "run_id": run_id}
+        return {
+            "status": "success",
+            "messages": [
+                {"source": msg.source, "content": msg.content}
+                for msg in chat_result.messages
+            ]
+        }
+
+    # Identical requests already running share that run's result; it is cancelled once all their clients are gone
+    return await unless_disconnected(request, single_flight.run(
+        request_key("research-agent", input), run, on_abandoned=lambda: run_registry.cancel(run_id, "disconnect")
+    ))
 
 @app.post("/product-agent")
-async def product_agent_dynamic(input: AgentInput):
-    chat_result = await run_product_agent(
-        company1=input.companyName1,
-        company2=input.companyName2,
-        user_input=input.textInstruction,
-        task=input.task 
-    )
-    return {
-        "status": "success",
-        "messages": [
-            {"source": msg.source, "content": msg.content}
-            for msg in chat_result.messages
-        ]
-    }
+async def product_agent_dynamic(input: AgentInput, request: Request):
+    run_id = new_run_id()
+
+    async def run():
+        try:
+            with bypass_cache(input.bypassCache), run_registry.track(run_id, ["product"]) as tracked:
+                chat_result = await get_agent("product").run_agent_post(
+                    company1=input.companyName1,
+                    company2=input.companyName2,
+                    user_input=input.textInstruction,
+                    task=input.task,
+                    cancellation_token=tracked.token
+                )
+        except RunCancelledError as e:
+            return {"status": "error", "detail": str(e), "run_id": run_id}
+        return {
+            "status": "success",
+            "messages": [
+                {"source": msg.source, "content": msg.content}
+                for msg in chat_result.messages
+            ]
+        }
+
+    # Identical requests already running share that run's result; it is cancelled once all their clients are gone
+    return await unless_disconnected(request, single_flight.run(
+        request_key("product-agent", input), run, on_abandoned=lambda: run_registry.cancel(run_id, "disconnect")
+    ))
 
 @app.post("/marketing-agent")
-async def marketing_agent_dynamic(input: AgentInput):
-    chat_result = await run_marketing_agent(
-        company1=input.companyName1,
-        company2=input.companyName2,
-        user_input=input.textInstruction,
-        task=input.task 
-    )
-    return {
-        "status": "success",
-        "messages": [
-            {"source": msg.source, "content": msg.content}
-            for msg in chat_result.messages
-        ]
+async def marketing_agent_dynamic(input: AgentInput, request: Request):
+    run_id = new_run_id()
+
+    async def run():
+        try:
+            with bypass_cache(input.bypassCache), run_registry.track(run_id, ["marketing"]) as tracked:
+                chat_result = await get_agent("marketing").run_agent_post(
+                    company1=input.companyName1,
+                    company2=input.companyName2,
+                    user_input=input.textInstruction,
+                    task=input.task,
+                    cancellation_token=tracked.token
+                )
+        except RunCancelledError as e:
+            return {"status": "error", "detail": str(e), "run_id": run_id}
+        return {
+            "status": "success",
+            "messages": [
+                {"source": msg.source, "content": msg.content}
+                for msg in chat_result.messages
+            ]
+        }
+
+    # Identical requests already running share that run's result; it is cancelled once all their clients are gone
+    return await unless_disconnected(request, single_flight.run(
+        request_key("marketing-agent", input), run, on_abandoned=lambda: run_registry.cancel(run_id, "disconnect")
+    ))
+
+# Shape a finished pipeline run (run_full_pipeline's "done" event) for the frontend and save the report
+def build_pipeline_response(done):
+    results = done["results"]
+    role_mapping = {
+        "research_output": "research_agent",
+        "product_output": "product_agent",
+        "marketing_output": "marketing_agent"
     }
 
+    messages = [
+        {
+            "role": role_mapping[key],
+            "stage": key.replace("_", " ").title(),
+            "content": value
+        }
+        for key, value in results.items()
+    ]
+
+
+    company1, company2 = done["companies"]
+    markdown_report = save_pipeline_report(results, company1=company1, company2=company2, stop_reasons=done["stop_reasons"])
+
+    return {"status": "success", 
+            "run_id": done["run_id"],
+            "messages": messages,
+            "markdown_report":markdown_report, 
+            "stop_reasons": done["stop_reasons"],
+            "budget": done["budget"],
+            # Per stage: compact handoff size and estimated prompt tokens saved downstream (HANDOFF_MODE)
+            "handoff": done["handoff"],
+            # The frontend downloads this automatically; only offered when PDFs are rendered eagerly
+            **({"pdf_report": markdown_report.replace(".md", ".pdf")} if "pdf" in RENDER_EAGER else {}),
+            }
+
 #get api enpooints
 @app.post("/run-pipeline")
-async def run_pipeline_dynamic(input: AgentInput):
+async def run_pipeline_dynamic(input: AgentInput, request: Request):
+    run_id = new_run_id()
+    # Identical requests already running share that run's result and report; the run is cancelled
+    # (POST /runs/<run_id>/cancel does the same) once every client waiting on it has disconnected
+    return await unless_disconnected(request, single_flight.run(
+        request_key("run-pipeline", input),
+        lambda: run_pipeline_once(input, run_id),
+        on_abandoned=lambda: run_registry.cancel(run_id, "disconnect"),
+    ))
+
+async def run_pipeline_once(input: AgentInput, run_id=None):
+    run_id = run_id or new_run_id()
     try:
         print("Dynamic Pipeline started...")
 
-        results = await run_full_pipeline(
-            company1=input.companyName1,
-            company2=input.companyName2,
-            user_input=input.textInstruction
-        )
+        with bypass_cache(input.bypassCache or input.forceRefresh):
+            done = await run_full_pipeline(
+                company1=input.companyName1,
+                company2=input.companyName2,
+                user_input=input.textInstruction,
+                save=False,  # build_pipeline_response saves the report
+                force_refresh=input.forceRefresh,
+                run_id=run_id
+            )
 
         print("✅ Dynamic Pipeline completed!")
 
-        role_mapping = {
-            "research_output": "research_agent",
-            "product_output": "product_agent",
-            "marketing_output": "marketing_agent"
-        }
-
-        messages = [
-            {
-                "role": role_mapping[key],
-                "stage": key.replace("_", " ").title(),
-                "content": value
-            }
-            for key, value in results.items()
-        ]
+        return build_pipeline_response(done)
 
+    except Exception as e:
+        print("Error in dynamic pipeline:", e)
+        # Finished stages are checkpointed; resuming only reruns what failed
+        return {"status": "error", "detail": str(e), "run_id": run_id, "resume_url": f"/runs/{run_id}/resume"}
+
+# Runs in flight in this worker (run_id, planned stages, current stage, tokens used) and the
+# average tokens per stage used to estimate what cancelling saves
+@app.get("/runs/active")
+def active_runs():
+    return {"status": "success", **run_registry.stats()}
+
+# Stop a pipeline or agent run: in-flight model calls are aborted and no stage starts after them.
+# Runs on another worker sharing STATE_BACKEND, or queued jobs, stop as soon as they see the request.
+@app.post("/runs/{run_id}/cancel")
+async def cancel_run(run_id: str):
+    outcome = await run_registry.request_cancel(run_id)
+    return {"status": "success", "run_id": run_id, "cancellation": outcome}
+
+# Checkpointed stages of a pipeline run (add ?include_state=true for the saved team conversations)
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str, include_state: bool = False):
+    run = await get_checkpoint_store().get_run(run_id, include_state=include_state)
+    if not run:
+        return {"status": "error", "detail": "Run not found."}
+    return {"status": "success", **run}
+
+# Re-run a failed pipeline from its first unfinished stage, with the original inputs
+@app.post("/runs/{run_id}/resume")
+async def resume_run(run_id: str, request: Request):
+    run = await get_checkpoint_store().get_run(run_id)
+    if not run:
+        return {"status": "error", "detail": "Run not found."}
+    try:
+        done = await unless_disconnected(request, run_full_pipeline(**run["params"], save=False, run_id=run_id), run_id)
+        return build_pipeline_response(done) if done else None
+    except Exception as e:
+        print("Error resuming pipeline:", e)
+        return {"status": "error", "detail": str(e), "run_id": run_id, "resume_url": f"/runs/{run_id}/resume"}
 
-        markdown_report = save_pipeline_report(results)
+# Re-run a recorded run (CASSETTE_RECORD=1) offline from its cassette, optionally with the recorded latencies.
+# Nothing is saved; `changed_stages` lists stage outputs that differ from the recording.
+@app.post("/runs/{run_id}/replay")
+async def replay_run(run_id: str, latency: bool = False):
+    try:
+        cassette = Cassette.player(run_id, latency=latency)
+    except CassetteError as e:
+        return {"status": "error", "detail": str(e)}
+    try:
+        done = await run_full_pipeline(**cassette.params, save=False, cassette=cassette)
+    except Exception as e:
+        print("Error replaying pipeline:", e)
+        return {"status": "error", "detail": str(e), "replay_of": run_id, "cassette": cassette.stats()}
+    return {
+        "status": "success",
+        "run_id": done["run_id"],
+        "replay_of": run_id,
+        "results": done["results"],
+        "stop_reasons": done["stop_reasons"],
+        "usage": done["usage"],
+        "handoff": done["handoff"],
+        "changed_stages": cassette.compare(done["results"]),
+        "cassette": cassette.stats(),
+    }
 
-        return {"status": "success", 
-                "messages": messages,
-                "markdown_report":markdown_report, 
-                }
+# Streaming pipeline: SSE by default, NDJSON with `Accept: application/x-ndjson` or ?format=ndjson
+@app.post("/run-pipeline/stream")
+async def run_pipeline_stream(input: AgentInput, request: Request, format: Optional[str] = None):
+    run_id = new_run_id()
+
+    async def events():
+        # Runs inside the streaming task, so the bypass flag is set there
+        with bypass_cache(input.bypassCache or input.forceRefresh):
+            async for event in stream_full_pipeline(
+                company1=input.companyName1,
+                company2=input.companyName2,
+                user_input=input.textInstruction,
+                force_refresh=input.forceRefresh,
+                run_id=run_id
+            ):
+                yield event
+
+    return event_stream_response(
+        events(), accept=request.headers.get("accept", ""), format=format,
+        on_disconnect=lambda: run_registry.cancel(run_id, "disconnect"),
+    )
 
+# Run any subset of research/product/marketing ("pipeline" = all) through the stage scheduler
+@app.post("/run-agents")
+async def run_agents(input: RunAgentsInput, request: Request):
+    run_id = new_run_id()
+    try:
+        with bypass_cache(input.bypassCache or input.forceRefresh):
+            return await unless_disconnected(request, run_chosen_agents(
+                input.agents,
+                company1=input.companyName1,
+                company2=input.companyName2,
+                user_input=input.textInstruction,
+                force_refresh=input.forceRefresh,
+                run_id=run_id
+            ), run_id)
     except Exception as e:
-        print("Error in dynamic pipeline:", e)
+        print("Error in run-agents:", e)
         return {"status": "error", "detail": str(e)}
 
+# Batch pipeline: streams one NDJSON line per item as it finishes, then a throughput summary
+@app.post("/run-pipeline/batch")
+async def run_pipeline_batch(input: BatchInput):
+    if len(input.items) > BATCH_MAX_ITEMS:
+        return {"status": "error", "detail": f"Batch too large ({len(input.items)} items, limit {BATCH_MAX_ITEMS})."}
+
+    return event_stream_response(run_batch(input.items, input.concurrency), format="ndjson")
+
+# Async pipeline: returns a job id right away, poll /jobs/{job_id} for progress and results
+@app.post("/run-pipeline/jobs")
+async def submit_pipeline_job(input: AgentInput):
+    run_id = new_run_id()
+
+    async def run_pipeline_job(on_progress):
+        with bypass_cache(input.bypassCache or input.forceRefresh):
+            done = await run_full_pipeline(
+                company1=input.companyName1,
+                company2=input.companyName2,
+                user_input=input.textInstruction,
+                on_progress=on_progress,
+                save=False,
+                force_refresh=input.forceRefresh,
+                run_id=run_id
+            )
+        return build_pipeline_response(done)
+
+    try:
+        job = await job_queue.submit("pipeline", run_pipeline_job, params=input.model_dump())
+    except QueueFullError as e:
+        return {"status": "error", "detail": str(e)}
+
+    return {"status": "queued", "job_id": job["job_id"], "status_url": f"/jobs/{job['job_id']}", "run_id": run_id}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        return {"status": "error", "detail": "Job not found."}
+    return job
+
 
 
 
 # Standalone - Run Research Agent
 @app.get("/research-agent-test")
-async def research_agent_status(background_tasks: BackgroundTasks):
-    background_tasks.add_task(run_research_agent_get)
-    return {"status": "Research agent task started."}
+async def research_agent_status():
+    async def run_research_job(on_progress):
+        on_progress("research", "running")
+        chat_result = await get_agent("research").run_agent()
+        on_progress("research", "completed")
+        return {
+            "status": "success",
+            "messages": [
+                {"source": msg.source, "content": msg.content}
+                for msg in chat_result.messages
+            ]
+        }
+
+    try:
+        job = await job_queue.submit("research", run_research_job)
+    except QueueFullError as e:
+        return {"status": "error", "detail": str(e)}
+
+    return {"status": "Research agent task started.", "job_id": job["job_id"], "status_url": f"/jobs/{job['job_id']}"}
 
 @app.get("/research-agent-get")
 async def research_agent():
-    chat_result = await run_research_agent_get()
+    chat_result = await get_agent("research").run_agent()
     return {
         "status": "success",
         "messages": [
@@ -153,7 +425,7 @@ async def research_agent():
 # Standalone - Run Product Agent
 @app.get("/product-agent-get")
 async def product_agent():
-    chat_result = await run_product_agent_get()
+    chat_result = await get_agent("product").run_agent()
     return {
         "status": "success",
         "messages": [
@@ -165,7 +437,7 @@ async def product_agent():
 # Standalone - Run Marketing Agent
 @app.get("/marketing-agent-get")
 async def marketing_agent():
-    chat_result = await run_marketing_agent_get()
+    chat_result = await get_agent("marketing").run_agent()
     return {
         "status": "success",
         "messages": [
@@ -179,13 +451,13 @@ async def run_pipeline():
     try:
         print("🚀 Pipeline task started...")
 
-        results = await run_full_pipeline()
+        done = await run_full_pipeline()
 
         print("✅ Pipeline task completed!")
 
         # Prepare structured frontend-friendly output
         output = []
-        for stage, content in results.items():
+        for stage, content in done["results"].items():
             output.append({
                 "stage": stage.replace('_', ' ').title(),  # e.g., research_output -> Research Output
                 "content": content
@@ -193,40 +465,111 @@ async def run_pipeline():
 
         return {
             "status": "success",
-            "pipeline_results": output
+            "pipeline_results": output,
+            "stop_reasons": done["stop_reasons"]
         }
 
     except Exception as e:
         print("Error in pipeline:", e)
         return {"status": "error", "detail": str(e)}
 
-# List all reports
+# Prometheus scrape endpoint: per stage/team/agent latency, turns, tokens and stop reasons
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Model response cache counters
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    return {"status": "success", "cache": get_default_store().stats()}
+
+# Per-model limiter state: current concurrency limit, queue length and 429s seen
+@app.get("/rate-limit/stats")
+def rate_limit_stats_route():
+    return {"status": "success", "limiters": rate_limit_stats()}
+
+
+@app.get("/hedging/stats")
+def hedging_stats_route():
+    return {"status": "success", **hedging_stats()}
+
+# List reports from the catalog, newest first. Page with ?cursor=<next_cursor>; filter by
+# companyName1+companyName2, since/until (ISO dates) or q (full-text search over report content)
 @app.get("/get-reports")
-def get_reports():
+def get_reports(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    order: str = "desc",
+    companyName1: Optional[str] = None,
+    companyName2: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = None,
+):
     try:
-        reports = list_reports()
-        return {"status": "success", "reports": reports}
+        page = search_reports(
+            limit=limit,
+            cursor=cursor,
+            order=order,
+            company1=companyName1,
+            company2=companyName2,
+            since=since.timestamp() if since else None,
+            until=until.timestamp() if until else None,
+            q=q,
+        )
+        # "reports" keeps the old list-of-filenames shape; "items" carries the metadata
+        return {
+            "status": "success",
+            "reports": [item["filename"] for item in page["items"]],
+            "items": page["items"],
+            "next_cursor": page["next_cursor"],
+        }
+    except sqlite3.OperationalError as e:
+        # A search the full-text index can't parse is the caller's mistake, not ours
+        return JSONResponse(status_code=400, content={"status": "error", "detail": f"Invalid search: {e}"})
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
-# Download specific report
+# Download specific report (ETag/Last-Modified revalidation, byte ranges, gzip/brotli by Accept-Encoding)
 @app.get("/download-report/{filename}")
-def download_report(filename: str):
+async def download_report(filename: str, request: Request):
     try:
         report_path = get_report_path(filename)
         if report_path:
-            return FileResponse(report_path, media_type="text/markdown", filename=filename)
+            return await serve_report(request, report_path, media_type="text/markdown", filename=filename)
         else:
             return {"status": "error", "detail": "Report not found."}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
-#save report-pdf -- moved this on frontend
+# Rendered copy of a report ("report.pdf" / "report.html" for "report.md"), rendered on first request
+async def download_rendered(filename, fmt, request):
+    stem, ext = os.path.splitext(filename)
+    md_path = get_report_path(stem + ".md") if ext == f".{fmt}" else None
+    if not md_path:
+        return {"status": "error", "detail": f"{fmt.upper()} not found"}
+    path = await renderer.render(md_path, fmt)
+    # PDFs are already compressed
+    return await serve_report(request, path, media_type=RENDERERS[fmt][1], filename=filename, compress=fmt != "pdf")
+
+# Report as PDF: a PDF saved next to the report (older frontend exports) wins, otherwise it is rendered here
 @app.get("/download-report-pdf/{filename}")
-def download_pdf(filename: str):
-    file_path = os.path.join("reports", filename)
-    if os.path.exists(file_path):
-        return FileResponse(file_path, media_type="application/pdf", filename=filename)
-    return {"status": "error", "detail": "PDF not found"}
+async def download_pdf(filename: str, request: Request):
+    try:
+        file_path = get_pdf_path(filename)
+        if file_path:
+            return await serve_report(request, file_path, media_type="application/pdf", filename=filename, compress=False)
+        return await download_rendered(filename, "pdf", request)
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+
+# Report as a standalone HTML page
+@app.get("/download-report-html/{filename}")
+async def download_html(filename: str, request: Request):
+    try:
+        return await download_rendered(filename, "html", request)
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
 
 
 #delete specific report
@@ -7,46 +7,57 @@ from autogen_agentchat.conditions import ExternalTermination, TextMentionTermina
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.ui import Console
 from autogen_core import CancellationToken
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from typing import List, Optional
 from dotenv import load_dotenv
+from team_pool import TeamPool
+from metrics import observe_team_run
+from model_registry import get_model_client
+from bounded_context import build_model_context
+from budget import team_deadline, with_budget
+from hedging import hedged
 import os
 
 load_dotenv()
 
 
-# Create an OpenAI model client.
-model_client = OpenAIChatCompletionClient(
-    model="gemini-1.5-flash-8b",
-    api_key=os.getenv("GEMINI_API_KEY"),    
-)
-# Create the primary agent.
-Microsoft_market_agent = AssistantAgent(
-    "microsoft_bot",
-    model_client=model_client,
-    system_message="You are a expert AI assistant and marketer of Microsoft.",
-)
+# Model clients come from the shared registry (one connection pool per endpoint, closed on shutdown)
+# Build a fresh marketing team (agents hold per-conversation state, so teams are never shared)
+def build_team(client=None):
+    client = client or get_model_client()
 
-Samsung_market_agent = AssistantAgent(
-    "samsung_bot",
-    model_client=model_client,
-    system_message="You are a helpful AI assistant and marketer of Samsung.",
-)
+    # Create the primary agent.
+    Microsoft_market_agent = AssistantAgent(
+        "microsoft_bot",
+        model_client=hedged(client, "marketing", "microsoft_bot"),
+        model_context=build_model_context("marketing", client),
+        system_message="You are a expert AI assistant and marketer of Microsoft.",
+    )
+
+    Samsung_market_agent = AssistantAgent(
+        "samsung_bot",
+        model_client=hedged(client, "marketing", "samsung_bot"),
+        model_context=build_model_context("marketing", client),
+        system_message="You are a helpful AI assistant and marketer of Samsung.",
+    )
 
 
-# Create the collab agent.
-colab_market_agent = AssistantAgent(
-    "collaborator",
-    model_client=model_client,
-    system_message="Think and make a collabrative product of samsung and microsoft in virtual reality and XR domain and prepare a maketing plan in Korea. Respond with capital letter approve when aleast agent has spoken twice and you find good data from them",
-)
+    # Create the collab agent.
+    colab_market_agent = AssistantAgent(
+        "collaborator",
+        model_client=hedged(client, "marketing", "collaborator"),
+        model_context=build_model_context("marketing", client),
+        system_message="Think and make a collabrative product of samsung and microsoft in virtual reality and XR domain and prepare a maketing plan in Korea. Respond with capital letter approve when aleast agent has spoken twice and you find good data from them",
+    )
+
+    # Define a termination condition that stops the task if the critic approves.
+    termination_condition = with_budget("marketing", TextMentionTermination("APPROVE"))
 
-# Define a termination condition that stops the task if the critic approves.
-termination_condition = TextMentionTermination("APPROVE")
 
+    # Create a team with the primary and critic agents.
+    return RoundRobinGroupChat([Microsoft_market_agent, Samsung_market_agent,colab_market_agent], termination_condition=termination_condition)
 
-# Create a team with the primary and critic agents.
-team = RoundRobinGroupChat([Microsoft_market_agent, Samsung_market_agent,colab_market_agent], termination_condition=termination_condition)
+# Pool of pre-built teams shared by every request in this worker
+team_pool = TeamPool(build_team, name="marketing")
 
 
 # Default task for standalone
@@ -60,16 +71,9 @@ class ChatResult:
 
 # Unified runner
 async def run_agent(task=None, cancellation_token=None):
-    await team.reset()
-
-    task = task or get_default_task()
-
     # Collect messages during stream
     messages = []
-    async for message in team.run_stream(
-        task=task,
-        cancellation_token=cancellation_token
-    ):
+    async for message in run_agent_stream(task=task, cancellation_token=cancellation_token):
         if isinstance(message, TaskResult):
             print(f"✅ Task completed: {message.stop_reason}\n")
         else:
@@ -78,9 +82,23 @@ async def run_agent(task=None, cancellation_token=None):
 
     return ChatResult(messages)
     
-async def run_agent_post(company1: str, company2: str, user_input: Optional[str] = None, task: Optional[str] = None):
-    await team.reset()
+# Stream messages as the team produces them, ending with the TaskResult
+async def run_agent_stream(task=None, cancellation_token=None, on_team_state=None):
+    task = task or get_default_task()
 
+    # Every model call of this run gets the time left before MARKETING_MAX_SECONDS / TEAM_MAX_SECONDS
+    with team_deadline("marketing"):
+        async with team_pool.acquire() as team:
+            async for message in observe_team_run("marketing", team.run_stream(
+                task=task,
+                cancellation_token=cancellation_token
+            )):
+                yield message
+            # Snapshot the conversation before the team is reset and returned to the pool
+            if on_team_state:
+                on_team_state(await team.save_state())
+
+async def run_agent_post(company1: str, company2: str, user_input: Optional[str] = None, task: Optional[str] = None, cancellation_token=None):
     final_task = (
         f"Prepare a collaborative marketing plan for an XR/VR product between {company1} and {company2}, focused on the Korean market.\n"
         f"\n--- User Instruction ---\n{user_input.strip()}"
@@ -89,15 +107,7 @@ async def run_agent_post(company1: str, company2: str, user_input: Optional[str]
     if task:
         final_task += f"\n\n--- Context from Previous Agent(s) ---\n{task.strip()}"
 
-    messages = []
-    async for message in team.run_stream(task=final_task, cancellation_token=None):
-        if isinstance(message, TaskResult):
-            print(f"✅ Task completed: {message.stop_reason}\n")
-        else:
-            print(f"[{message.source}] {message.content}\n")
-            messages.append(message)
-
-    return ChatResult(messages)
+    return await run_agent(task=final_task, cancellation_token=cancellation_token)
 
 def main():
     asyncio.run(run_agent())
@@ -0,0 +1,140 @@
+# metrics.py
+import os
+import re
+import time
+
+from autogen_agentchat.base import TaskResult
+from model_wrappers import DelegatingChatCompletionClient
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+
+# Agent turns and whole runs are slow: seconds to minutes
+TURN_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+RUN_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200)
+
+TEAM_RUN_SECONDS = Histogram(
+    "team_run_duration_seconds", "Wall time of one team conversation", ["team"], buckets=RUN_BUCKETS
+)
+TEAM_FIRST_MESSAGE_SECONDS = Histogram(
+    "team_time_to_first_message_seconds", "Time until the first agent message of a run", ["team"], buckets=TURN_BUCKETS
+)
+TEAM_TURNS = Histogram(
+    "team_turns", "Agent turns per team run", ["team"], buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+)
+TEAM_RUNS = Counter("team_runs_total", "Finished team runs by stop reason", ["team", "stop_reason"])
+
+AGENT_TURN_SECONDS = Histogram(
+    "agent_turn_duration_seconds", "Time an agent took to produce its message", ["team", "agent"], buckets=TURN_BUCKETS
+)
+AGENT_TOKENS = Counter("agent_tokens_total", "Model tokens used by agent turns", ["team", "agent", "type"])
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Wall time of a pipeline stage", ["stage", "cached"], buckets=RUN_BUCKETS
+)
+
+MODEL_CALL_SECONDS = Histogram(
+    "model_call_duration_seconds", "Latency of one model completion", ["model", "streaming"], buckets=TURN_BUCKETS
+)
+MODEL_FIRST_TOKEN_SECONDS = Histogram(
+    "model_time_to_first_token_seconds", "Time to the first streamed chunk of a completion", ["model"], buckets=TURN_BUCKETS
+)
+MODEL_CALL_ERRORS = Counter("model_call_errors_total", "Failed model completions", ["model", "error"])
+MODEL_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "model_rate_limit_wait_seconds", "Time a model call queued in the rate limiter", ["model"], buckets=TURN_BUCKETS
+)
+MODEL_THROTTLED = Counter("model_throttled_total", "Model calls answered with 429 / Retry-After", ["model"])
+MODEL_HEDGES = Counter(
+    "model_hedges_total", "Slow model calls that got (or were refused) a hedged second request", ["model", "outcome"]
+)
+MODEL_DEADLINE_EXCEEDED = Counter(
+    "model_deadline_exceeded_total", "Model calls cut short by the remaining team/pipeline deadline", ["model"]
+)
+
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests_total", "Requests answered by joining an identical in-flight request", ["endpoint"]
+)
+CANCELLED_RUNS = Counter("cancelled_runs_total", "Runs cancelled before they finished", ["reason"])
+CANCELLATION_SAVED_TOKENS = Counter(
+    "cancellation_saved_tokens_total", "Estimated model tokens not spent because a run was cancelled", ["reason"]
+)
+
+
+def stop_reason_label(reason):
+    # "Maximum number of messages 8 reached, current message count: 8" -> bounded label set
+    if not reason:
+        return "none"
+    return re.sub(r"\d+", "N", reason.split(",")[0]).strip()[:80]
+
+
+async def observe_team_run(team, stream):
+    """Pass a team's run_stream through while recording run, turn and token metrics."""
+    start = time.perf_counter()
+    last = start
+    turns = 0
+    async for message in stream:
+        now = time.perf_counter()
+        if isinstance(message, TaskResult):
+            TEAM_RUN_SECONDS.labels(team).observe(now - start)
+            TEAM_TURNS.labels(team).observe(turns)
+            TEAM_RUNS.labels(team, stop_reason_label(message.stop_reason)).inc()
+        elif message.models_usage is not None:
+            # Only agent turns carry model usage; the echoed task messages don't
+            if turns == 0:
+                TEAM_FIRST_MESSAGE_SECONDS.labels(team).observe(now - start)
+            turns += 1
+            AGENT_TURN_SECONDS.labels(team, message.source).observe(now - last)
+            AGENT_TOKENS.labels(team, message.source, "prompt").inc(message.models_usage.prompt_tokens)
+            AGENT_TOKENS.labels(team, message.source, "completion").inc(message.models_usage.completion_tokens)
+            last = now
+        yield message
+
+
+class MetricsChatCompletionClient(DelegatingChatCompletionClient):
+    """Records latency, time to first token and errors of every model call."""
+
+    async def create(self, messages, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await self.inner.create(messages, **kwargs)
+        except Exception as e:
+            MODEL_CALL_ERRORS.labels(self.model_name, type(e).__name__).inc()
+            raise
+        elapsed = time.perf_counter() - start
+        # Without streaming the first token arrives with the whole completion
+        MODEL_FIRST_TOKEN_SECONDS.labels(self.model_name).observe(elapsed)
+        MODEL_CALL_SECONDS.labels(self.model_name, "false").observe(elapsed)
+        return result
+
+    async def create_stream(self, messages, **kwargs):
+        start = time.perf_counter()
+        first = True
+        try:
+            async for chunk in self.inner.create_stream(messages, **kwargs):
+                if first:
+                    MODEL_FIRST_TOKEN_SECONDS.labels(self.model_name).observe(time.perf_counter() - start)
+                    first = False
+                yield chunk
+        except Exception as e:
+            MODEL_CALL_ERRORS.labels(self.model_name, type(e).__name__).inc()
+            raise
+        MODEL_CALL_SECONDS.labels(self.model_name, "true").observe(time.perf_counter() - start)
+
+
+def with_metrics(client):
+    return MetricsChatCompletionClient(client)
+
+
+def render_metrics():
+    # With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR so every worker's samples are merged
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
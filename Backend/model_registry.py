@@ -0,0 +1,93 @@
+# model_registry.py
+import os
+
+import httpx
+from dotenv import load_dotenv
+
+from cancellation import with_cancellation
+from cassette import with_cassette
+from hedging import with_deadline, with_latency
+from llm_cache import with_cache
+from metrics import with_metrics
+from rate_limiter import with_rate_limit
+
+load_dotenv()
+
+DEFAULT_MODEL = os.getenv("MODEL_NAME", "gemini-1.5-flash-8b")
+# "stub" answers every call offline from stub_model_client (load tests, demos without an API key)
+MODEL_CLIENT = os.getenv("MODEL_CLIENT", "openai")
+
+# One keep-alive pool per model endpoint, shared by every agent in the worker
+HTTP_MAX_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("MODEL_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MODEL_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("MODEL_HTTP_TIMEOUT", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("MODEL_HTTP_CONNECT_TIMEOUT", "10"))
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "2"))
+
+
+class ModelClientRegistry:
+    """Process-wide model clients keyed by (model, base_url), created lazily and closed on shutdown."""
+
+    def __init__(self):
+        self._clients = {}
+        self._http_clients = {}
+
+    def get(self, model=None, base_url=None):
+        key = (model or DEFAULT_MODEL, base_url)
+        if key not in self._clients:
+            self._clients[key] = self._build(*key)
+        return self._clients[key]
+
+    def _build(self, model, base_url):
+        if MODEL_CLIENT == "stub":
+            from stub_model_client import StubChatCompletionClient
+
+            print(f"🧪 Stub model client serving {model}")
+            return with_deadline(with_cassette(with_cache(with_cancellation(with_rate_limit(with_latency(with_metrics(StubChatCompletionClient(model))), model)))))
+
+        # The OpenAI SDK is the slowest import in the tree; pay for it on the first model call, not at startup
+        from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        self._http_clients[(model, base_url)] = http_client
+
+        config = {
+            "model": model,
+            "api_key": os.getenv("GEMINI_API_KEY"),
+            "http_client": http_client,
+            "max_retries": MODEL_MAX_RETRIES,
+        }
+        if base_url:
+            config["base_url"] = base_url
+        print(f"🔌 Model client created for {model}")
+
+        # Cache outside the rate limiter and the call metrics, so hits skip both (they measure the real API);
+        # cancellation around the rate limiter, so a cancelled run's calls leave its queue as well as the wire;
+        # the cassette above them, so a replay touches nothing below it; the deadline outermost, so it bounds
+        # the whole call (queueing included) and records the latency hedging compares against
+        return with_deadline(with_cassette(with_cache(with_cancellation(with_rate_limit(with_latency(with_metrics(OpenAIChatCompletionClient(**config))), model)))))
+
+    def stats(self):
+        return {"clients": [{"model": model, "base_url": base_url} for model, base_url in self._clients]}
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.close()
+        for http_client in self._http_clients.values():
+            await http_client.aclose()
+        self._clients.clear()
+        self._http_clients.clear()
+
+
+model_registry = ModelClientRegistry()
+
+def get_model_client(model=None, base_url=None):
+    return model_registry.get(model, base_url)
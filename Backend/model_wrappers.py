@@ -0,0 +1,51 @@
+# model_wrappers.py
+from autogen_core.models import ChatCompletionClient
+
+
+class DelegatingChatCompletionClient(ChatCompletionClient):
+    """Base for model-client wrappers: forwards everything to `inner`, override what you need."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def create(self, messages, **kwargs):
+        return await self.inner.create(messages, **kwargs)
+
+    def create_stream(self, messages, **kwargs):
+        return self.inner.create_stream(messages, **kwargs)
+
+    async def close(self):
+        await self.inner.close()
+
+    def actual_usage(self):
+        return self.inner.actual_usage()
+
+    def total_usage(self):
+        return self.inner.total_usage()
+
+    def count_tokens(self, messages, *, tools=[]):
+        return self.inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages, *, tools=[]):
+        return self.inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self):
+        return self.inner.model_info
+
+    @property
+    def model_info(self):
+        return self.inner.model_info
+
+    @property
+    def _create_args(self):
+        # Model, temperature etc. of the concrete client; the response cache keys on them
+        return getattr(self.inner, "_create_args", {})
+
+    @property
+    def model_name(self):
+        # OpenAIChatCompletionClient keeps the model in its create args
+        inner_name = getattr(self.inner, "model_name", None)
+        if inner_name:
+            return inner_name
+        return self._create_args.get("model", type(self.inner).__name__)
@@ -6,52 +6,63 @@ from autogen_agentchat.conditions import MaxMessageTermination,ExternalTerminati
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.ui import Console
 from autogen_core import CancellationToken
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from typing import List, Optional
 from dotenv import load_dotenv
+from team_pool import TeamPool
+from metrics import observe_team_run
+from model_registry import get_model_client
+from bounded_context import build_model_context
+from budget import team_deadline, with_budget
+from hedging import hedged
 import os
 
 load_dotenv()
 
-# Create an OpenAI model client.
-model_client = OpenAIChatCompletionClient(
-    model="gemini-1.5-flash-8b",
-    api_key=os.getenv("GEMINI_API_KEY"),    
-)
+# Model clients come from the shared registry (one connection pool per endpoint, closed on shutdown)
 # model_client = OpenAIChatCompletionClient(
 #     model="gpt-4o",
 #     api_key=os.getenv("OPENAI_API_KEY"),
 # )
 
-# Create the first marketing agent.
-Microsoft_product_agent = AssistantAgent(
-    "microsoft_product_bot",
-    model_client=model_client,
-    system_message="You are a expert executive of  Microsoft. having idea and description of microsoft products offering.",
-)
+# Build a fresh product team (agents hold per-conversation state, so teams are never shared)
+def build_team(client=None):
+    client = client or get_model_client()
+
+    # Create the first marketing agent.
+    Microsoft_product_agent = AssistantAgent(
+        "microsoft_product_bot",
+        model_client=hedged(client, "product", "microsoft_product_bot"),
+        model_context=build_model_context("product", client),
+        system_message="You are a expert executive of  Microsoft. having idea and description of microsoft products offering.",
+    )
+
+    # Create the second marketing agent.
+    Samsung_product_agent = AssistantAgent(
+        "samsung_product_bot",
+        model_client=hedged(client, "product", "samsung_product_bot"),
+        model_context=build_model_context("product", client),
+        system_message="You are a expert executive of  Microsoft. having idea and description of samsung products offering.",
+    )
 
-# Create the second marketing agent.
-Samsung_product_agent = AssistantAgent(
-    "samsung_product_bot",
-    model_client=model_client,
-    system_message="You are a expert executive of  Microsoft. having idea and description of samsung products offering.",
-)
 
+    # Create the collab agent.
+    colab_agent = AssistantAgent(
+        "collaborator",
+        model_client=hedged(client, "product", "collaborator"),
+        model_context=build_model_context("product", client),
+        system_message="Think and make a collabrative product of samsung and microsoft in xr and virtual reality. only respond with approve when each agent has spoken twice and you are satified with the product. then said approve in capital letters ",
+    )
 
-# Create the collab agent.
-colab_agent = AssistantAgent(
-    "collaborator",
-    model_client=model_client,
-    system_message="Think and make a collabrative product of samsung and microsoft in xr and virtual reality. only respond with approve when each agent has spoken twice and you are satified with the product. then said approve in capital letters ",
-)
+    # Define a termination condition that stops the task if the critic approves.
+    text_mention_termination = TextMentionTermination("APPROVE")
+    max_messages_termination = MaxMessageTermination(max_messages=8)
+    termination_condition = with_budget("product", text_mention_termination |max_messages_termination)
 
-# Define a termination condition that stops the task if the critic approves.
-text_mention_termination = TextMentionTermination("APPROVE")
-max_messages_termination = MaxMessageTermination(max_messages=8)
-termination_condition = text_mention_termination |max_messages_termination
+    # Create a team with the primary and critic agents.
+    return RoundRobinGroupChat([Microsoft_product_agent, Samsung_product_agent,colab_agent], termination_condition=termination_condition)
 
-# Create a team with the primary and critic agents.
-team = RoundRobinGroupChat([Microsoft_product_agent, Samsung_product_agent,colab_agent], termination_condition=termination_condition)
+# Pool of pre-built teams shared by every request in this worker
+team_pool = TeamPool(build_team, name="product")
 
 # Default task for standalone
 def get_default_task():
@@ -59,23 +70,33 @@ def get_default_task():
 
 # Unified runner
 async def run_agent(task=None, cancellation_token=None):
-    await team.reset()
-
-    task = task or get_default_task()
-
-    chat_result = await team.run(
-        task=task,
-        cancellation_token=cancellation_token
-    )
+    chat_result = None
+    async for message in run_agent_stream(task=task, cancellation_token=cancellation_token):
+        if isinstance(message, TaskResult):
+            chat_result = message
 
     for message in chat_result.messages:
         print(f"[{message.source}] {message.content}\n")
 
     return chat_result
 
-async def run_agent_post(company1: str, company2: str, user_input: Optional[str] = None, task: str = None):
-    await team.reset()
+# Stream messages as the team produces them, ending with the TaskResult
+async def run_agent_stream(task=None, cancellation_token=None, on_team_state=None):
+    task = task or get_default_task()
 
+    # Every model call of this run gets the time left before PRODUCT_MAX_SECONDS / TEAM_MAX_SECONDS
+    with team_deadline("product"):
+        async with team_pool.acquire() as team:
+            async for message in observe_team_run("product", team.run_stream(
+                task=task,
+                cancellation_token=cancellation_token
+            )):
+                yield message
+            # Snapshot the conversation before the team is reset and returned to the pool
+            if on_team_state:
+                on_team_state(await team.save_state())
+
+async def run_agent_post(company1: str, company2: str, user_input: Optional[str] = None, task: str = None, cancellation_token=None):
     # Combine both the user's instruction and previous task context if provided
     final_task = (
         f"Think and make a collabrative product between {company1} and {company2}\n\n"
@@ -85,15 +106,7 @@ async def run_agent_post(company1: str, company2: str, user_input: Optional[str]
     if task:
         final_task += f"\nContext from previous agent(s):\n{task.strip()}"
 
-    chat_result = await team.run(
-        task=final_task,
-        cancellation_token=None
-    )
-
-    for message in chat_result.messages:
-        print(f"[{message.source}] {message.content}\n")
-
-    return chat_result
+    return await run_agent(task=final_task, cancellation_token=cancellation_token)
 
 
 def main():
@@ -0,0 +1,343 @@
+# rate_limiter.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+from autogen_core.models import CreateResult
+
+from bounded_context import estimate_tokens
+from context_vars import safe_reset
+from metrics import MODEL_RATE_LIMIT_WAIT_SECONDS, MODEL_THROTTLED
+from model_wrappers import DelegatingChatCompletionClient
+
+# Provider quotas per model (0 = no bucket); concurrency adapts below MODEL_MAX_CONCURRENCY
+MODEL_RPM = int(os.getenv("MODEL_RPM", "0"))
+MODEL_TPM = int(os.getenv("MODEL_TPM", "0"))
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "20")))
+MODEL_RATE_LIMIT_RETRIES = int(os.getenv("MODEL_RATE_LIMIT_RETRIES", "5"))
+# SQLite file shared by every uvicorn worker on the host; unset keeps the buckets in this process
+MODEL_RATE_LIMIT_STATE = os.getenv("MODEL_RATE_LIMIT_STATE")
+MAX_BACKOFF_SECONDS = 60
+
+# Who is waiting: queued calls are granted round-robin across callers (one pipeline run each)
+_caller = ContextVar("rate_limit_caller", default="default")
+
+
+@contextmanager
+def rate_limit_caller(key):
+    token = _caller.set(key)
+    try:
+        yield
+    finally:
+        safe_reset(_caller, token)
+
+
+def refill(state, name, per_minute, now):
+    level, updated_at = state.get(name, (per_minute, now))
+    return min(per_minute, level + (now - updated_at) * per_minute / 60)
+
+def take(state, rpm, tpm, tokens, now):
+    """Charge one request of `tokens` to the buckets in `state`; returns 0, or the seconds to wait first."""
+    wait = state.get("cooldown_until", 0) - now
+    if wait > 0:
+        return wait
+    charges = []
+    for name, per_minute, cost in (("requests", rpm, 1), ("tokens", tpm, min(tokens, tpm))):
+        if per_minute > 0:
+            level = refill(state, name, per_minute, now)
+            wait = max(wait, (cost - level) * 60 / per_minute)
+            charges.append((name, level - cost))
+    if wait > 0:
+        return wait
+    for name, level in charges:
+        state[name] = [level, now]
+    return 0
+
+def settle(state, tpm, delta, now):
+    # Reservations are prompt estimates: charge the completion (or refund the overestimate) afterwards
+    if tpm > 0:
+        state["tokens"] = [refill(state, "tokens", tpm, now) - delta, now]
+
+def cool_down(state, until):
+    state["cooldown_until"] = max(state.get("cooldown_until", 0), until)
+
+
+class LocalLimiterState:
+    """Bucket state of this process."""
+
+    def __init__(self):
+        self._states = {}
+
+    async def update(self, model, fn):
+        return fn(self._states.setdefault(model, {}))
+
+
+class SqliteLimiterState:
+    """Bucket state in a SQLite file, so every worker on the host draws from the same quota."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (model TEXT PRIMARY KEY, state TEXT)")
+        # One thread, so updates apply in the order they were made; BEGIN IMMEDIATE can wait up to
+        # `timeout` on another worker's write, which must never stall the event loop
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="rate-limit-state")
+
+    async def update(self, model, fn):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._update, model, fn)
+
+    def _update(self, model, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT state FROM buckets WHERE model = ?", (model,)).fetchone()
+                state = json.loads(row[0]) if row else {}
+                result = fn(state)
+                self._conn.execute("INSERT OR REPLACE INTO buckets (model, state) VALUES (?, ?)", (model, json.dumps(state)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+
+class RateLimiter:
+    """Token buckets (requests and tokens per minute) in front of one model, plus an AIMD concurrency
+    limit: +1 slot per window of successful calls, halved when the provider answers 429.
+    Callers queue instead of failing; each caller's calls are granted in turn."""
+
+    def __init__(self, model, rpm=MODEL_RPM, tpm=MODEL_TPM, max_concurrency=MODEL_MAX_CONCURRENCY, state=None):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.inflight = 0
+        self.state = state or LocalLimiterState()
+        self.granted = 0
+        self.throttled = 0
+        self._queues = OrderedDict()
+        self._timer = None
+        self._dispatcher = None
+        self._writes = deque()
+        self._decreased_until = 0
+
+    async def acquire(self, tokens):
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(_caller.get(), deque()).append((waiter, tokens))
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller went away: hand the slot on
+                self.release()
+            raise
+
+    def release(self, success=False):
+        self.inflight -= 1
+        if success:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._dispatch()
+
+    def backoff(self, delay):
+        """Release a throttled call's slot: halve concurrency and hold every caller for `delay` seconds."""
+        self.inflight -= 1
+        self.throttled += 1
+        now = time.time()
+        # Calls in flight together all get the same 429; count that as one signal
+        if now >= self._decreased_until:
+            self.limit = max(1.0, self.limit / 2)
+            self._decreased_until = now + delay
+        self._write(lambda state: cool_down(state, now + delay))
+        self._dispatch()
+
+    def settle(self, reserved, usage):
+        delta = usage.prompt_tokens + usage.completion_tokens - reserved
+        if self.tpm > 0 and delta:
+            self._write(lambda state: settle(state, self.tpm, delta, time.time()))
+
+    def _write(self, fn):
+        # Applied by the grant loop before its next take, so no call is granted against a stale cool-down
+        self._writes.append(fn)
+        self._dispatch()
+
+    def _dispatch(self):
+        # One grant loop at a time: it awaits the bucket state, and a second loop would grant past the limit
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._grant())
+
+    async def _flush_writes(self):
+        while self._writes:
+            await self.state.update(self.model, self._writes.popleft())
+
+    async def _grant(self):
+        # Re-checks the queue and concurrency after every await, so releases meanwhile are picked up
+        while True:
+            await self._flush_writes()
+            if not self._queues or self.inflight >= int(self.limit):
+                return
+            caller, queue = next(iter(self._queues.items()))
+            waiter, tokens = queue[0]
+            granted = False
+            if not waiter.done():
+                wait = await self.state.update(self.model, lambda state: take(state, self.rpm, self.tpm, tokens, time.time()))
+                if wait > 0:
+                    self._wake_in(wait)
+                    await self._flush_writes()
+                    return
+                # A caller that left while its tokens were taken just doesn't use them
+                if not waiter.done():
+                    self.inflight += 1
+                    self.granted += 1
+                    waiter.set_result(None)
+                    granted = True
+            queue.popleft()
+            # Round robin: this caller's next call goes behind everyone else's
+            del self._queues[caller]
+            if queue:
+                self._queues[caller] = queue
+            if granted:
+                # Let the granted call go out first: an immediate 429 then cools the bucket before the next grant
+                await asyncio.sleep(0)
+
+    def _wake_in(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def stats(self):
+        return {
+            "model": self.model,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "concurrency_limit": int(self.limit),
+            "inflight": self.inflight,
+            "queued": sum(not waiter.done() for queue in self._queues.values() for waiter, _ in queue),
+            "callers_waiting": len(self._queues),
+            "granted": self.granted,
+            "throttled": self.throttled,
+        }
+
+
+def retry_delay(error, attempt):
+    """Seconds to back off after a rate-limited call (Retry-After if sent), or None for other errors."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after_ms, retry_after = headers.get("retry-after-ms"), headers.get("retry-after")
+    if status != 429 and retry_after is None and retry_after_ms is None:
+        return None
+    delay = None
+    try:
+        if retry_after_ms is not None:
+            delay = float(retry_after_ms) / 1000
+        elif retry_after is not None:
+            delay = float(retry_after)
+    except ValueError:
+        # HTTP-date form
+        try:
+            delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+        except (TypeError, ValueError):
+            pass
+    if delay is None:
+        delay = 2 ** attempt
+    return min(max(delay, 0.0), MAX_BACKOFF_SECONDS)
+
+
+class RateLimitedChatCompletionClient(DelegatingChatCompletionClient):
+    """Routes every call through the model's RateLimiter and retries 429s after the advertised delay."""
+
+    def __init__(self, inner, limiter):
+        super().__init__(inner)
+        self.limiter = limiter
+
+    async def _acquire(self, tokens):
+        start = time.perf_counter()
+        await self.limiter.acquire(tokens)
+        MODEL_RATE_LIMIT_WAIT_SECONDS.labels(self.model_name).observe(time.perf_counter() - start)
+
+    def _throttled(self, error, attempt):
+        # Backoff before the next attempt, or None when the error should reach the caller
+        delay = retry_delay(error, attempt)
+        if delay is None:
+            self.limiter.release()
+            return None
+        MODEL_THROTTLED.labels(self.model_name).inc()
+        self.limiter.backoff(delay)
+        if attempt == MODEL_RATE_LIMIT_RETRIES:
+            return None
+        print(f"🚦 {self.model_name} rate limited, retrying in {delay:.1f}s ({attempt + 1}/{MODEL_RATE_LIMIT_RETRIES})")
+        return delay
+
+    async def create(self, messages, **kwargs):
+        tokens = estimate_tokens(messages)
+        for attempt in range(MODEL_RATE_LIMIT_RETRIES + 1):
+            await self._acquire(tokens)
+            try:
+                result = await self.inner.create(messages, **kwargs)
+            except Exception as e:
+                if self._throttled(e, attempt) is None:
+                    raise
+                continue
+            except BaseException:
+                self.limiter.release()
+                raise
+            self.limiter.release(success=True)
+            self.limiter.settle(tokens, result.usage)
+            return result
+
+    async def create_stream(self, messages, **kwargs):
+        tokens = estimate_tokens(messages)
+        for attempt in range(MODEL_RATE_LIMIT_RETRIES + 1):
+            await self._acquire(tokens)
+            started = False
+            try:
+                async for chunk in self.inner.create_stream(messages, **kwargs):
+                    started = True
+                    if isinstance(chunk, CreateResult):
+                        self.limiter.settle(tokens, chunk.usage)
+                    yield chunk
+            except Exception as e:
+                # Once chunks went out the call can't be replayed
+                if started:
+                    self.limiter.release()
+                    raise
+                if self._throttled(e, attempt) is None:
+                    raise
+                continue
+            except BaseException:
+                self.limiter.release()
+                raise
+            self.limiter.release(success=True)
+            return
+
+
+_limiters = {}
+_state = None
+
+def get_rate_limiter(model):
+    """One limiter per model in this process; with MODEL_RATE_LIMIT_STATE they share buckets across workers."""
+    global _state
+    if model not in _limiters:
+        if _state is None:
+            _state = SqliteLimiterState(MODEL_RATE_LIMIT_STATE) if MODEL_RATE_LIMIT_STATE else LocalLimiterState()
+        _limiters[model] = RateLimiter(model, state=_state)
+    return _limiters[model]
+
+def with_rate_limit(client, model):
+    return RateLimitedChatCompletionClient(client, get_rate_limiter(model))
+
+def rate_limit_stats():
+    return [limiter.stats() for limiter in _limiters.values()]
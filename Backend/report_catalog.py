@@ -0,0 +1,198 @@
+# report_catalog.py
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from stage_cache import normalize_company, normalize_pair
+
+REPORT_FOLDER = "reports"
+MAX_PAGE_SIZE = 200
+
+# "pipeline_report_20250429_000748.md" -> creation time, for reports saved before the catalog existed
+FILENAME_TIME = re.compile(r"(\d{8}_\d{6})")
+COMPANIES_LINE = re.compile(r"^\*\*Companies:\*\* (.+?) × (.+?)\s*$", re.MULTILINE)
+
+
+def pair_key(company1, company2):
+    return "|".join(name.lower() for name in normalize_pair(company1, company2))
+
+
+def encode_cursor(created_at, filename):
+    return base64.urlsafe_b64encode(json.dumps([created_at, filename]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, filename = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(created_at), str(filename)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def fts_query(q):
+    # Each whitespace-separated term as a quoted FTS5 string, so "XR/VR", "Korea's" or a stray AND
+    # are searched for as text instead of parsed as query syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in (q or "").split())
+
+
+class ReportCatalog:
+    """SQLite index of saved reports: metadata for listing/filtering plus an FTS5 table for search."""
+
+    def __init__(self, path=None, report_folder=REPORT_FOLDER):
+        self.path = path or os.getenv("REPORT_CATALOG_PATH", os.path.join(".cache", "report_catalog.sqlite3"))
+        self.report_folder = report_folder
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY, filename TEXT UNIQUE, created_at REAL, company1 TEXT, company2 TEXT,
+                pair TEXT, size INTEGER, status TEXT, stop_reasons TEXT
+            );
+            CREATE INDEX IF NOT EXISTS reports_created ON reports (created_at, filename);
+            CREATE INDEX IF NOT EXISTS reports_pair_created ON reports (pair, created_at, filename);
+            -- rowid matches reports.id (an explicit key, so VACUUM can't renumber it)
+            CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5 (content);
+            """
+        )
+        self._conn.commit()
+
+    def add(self, filename, content, created_at, company1=None, company2=None, status="complete", stop_reasons=None):
+        with self._lock:
+            self._insert(filename, content, created_at, company1, company2, status, stop_reasons)
+            self._conn.commit()
+
+    def _insert(self, filename, content, created_at, company1=None, company2=None, status="complete", stop_reasons=None):
+        self._delete(filename)
+        pair = pair_key(company1, company2) if company1 and company2 else None
+        company1, company2 = (normalize_company(company1), normalize_company(company2)) if pair else (None, None)
+        rowid = self._conn.execute(
+            "INSERT INTO reports (filename, created_at, company1, company2, pair, size, status, stop_reasons) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, created_at, company1, company2, pair, len(content.encode("utf-8")), status,
+             json.dumps(stop_reasons) if stop_reasons else None),
+        ).lastrowid
+        self._conn.execute("INSERT INTO reports_fts (rowid, content) VALUES (?, ?)", (rowid, content))
+
+    def _delete(self, filename):
+        row = self._conn.execute("SELECT id FROM reports WHERE filename = ?", (filename,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM reports_fts WHERE rowid = ?", (row[0],))
+            self._conn.execute("DELETE FROM reports WHERE id = ?", (row[0],))
+
+    def remove(self, filename):
+        with self._lock:
+            self._delete(filename)
+            self._conn.commit()
+
+    def get(self, filename):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM reports WHERE filename = ?", (filename,)).fetchone()
+        return self._to_item(row) if row else None
+
+    def backfill(self):
+        """Index .md files the catalog doesn't know yet and forget entries whose file is gone."""
+        os.makedirs(self.report_folder, exist_ok=True)
+        on_disk = {name for name in os.listdir(self.report_folder) if name.endswith(".md")}
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT filename FROM reports")}
+
+        added = sorted(on_disk - known)
+        for start in range(0, len(added), 500):
+            # Commit in batches: one transaction per file would take minutes on a large folder
+            batch = [(filename, *self._read_report(filename)) for filename in added[start:start + 500]]
+            with self._lock:
+                for filename, content, created_at, companies in batch:
+                    self._insert(filename, content, created_at, *companies)
+                self._conn.commit()
+
+        with self._lock:
+            for filename in known - on_disk:
+                self._delete(filename)
+            self._conn.commit()
+        return {"added": len(added), "removed": len(known - on_disk)}
+
+    def _read_report(self, filename):
+        path = os.path.join(self.report_folder, filename)
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        stamp = FILENAME_TIME.search(filename)
+        created_at = datetime.strptime(stamp.group(1), "%Y%m%d_%H%M%S").timestamp() if stamp else os.path.getmtime(path)
+        companies = COMPANIES_LINE.search(content)
+        return content, created_at, companies.groups() if companies else (None, None)
+
+    def search(self, limit=50, cursor=None, order="desc", company1=None, company2=None, since=None, until=None, q=None):
+        """One page of reports, newest first by default. Pass the returned next_cursor to get the next page."""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        descending = order != "asc"
+        where, params = [], []
+
+        if company1 and company2:
+            where.append("r.pair = ?")
+            params.append(pair_key(company1, company2))
+        if since is not None:
+            where.append("r.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("r.created_at < ?")
+            params.append(until)
+        if cursor:
+            # Keyset pagination: cost stays flat however deep the page is
+            created_at, filename = decode_cursor(cursor)
+            where.append(f"(r.created_at, r.filename) {'<' if descending else '>'} (?, ?)")
+            params += [created_at, filename]
+
+        q = fts_query(q)
+        if q:
+            where.append("r.id IN (SELECT rowid FROM reports_fts WHERE reports_fts MATCH ?)")
+            params.append(q)
+
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT r.* FROM reports r {'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY r.created_at {direction}, r.filename {direction} LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit + 1]).fetchall()
+            page = rows[:limit]
+            snippets = {}
+            if q and page:
+                # Snippets only for the rows on this page, not for every match
+                snippets = dict(self._conn.execute(
+                    f"SELECT rowid, snippet(reports_fts, 0, '[', ']', '…', 12) FROM reports_fts "
+                    f"WHERE reports_fts MATCH ? AND rowid IN ({','.join('?' * len(page))})",
+                    [q] + [row["id"] for row in page],
+                ).fetchall())
+
+        items = [self._to_item(row, snippets.get(row["id"])) for row in page]
+        next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["filename"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _to_item(self, row, snippet=None):
+        item = {
+            "filename": row["filename"],
+            "created_at": datetime.fromtimestamp(row["created_at"]).isoformat(timespec="seconds"),
+            "company1": row["company1"],
+            "company2": row["company2"],
+            "size": row["size"],
+            "status": row["status"],
+            "stop_reasons": json.loads(row["stop_reasons"]) if row["stop_reasons"] else None,
+        }
+        if snippet:
+            item["snippet"] = snippet
+        return item
+
+
+_catalog = None
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = ReportCatalog()
+    return _catalog
@@ -0,0 +1,111 @@
+# report_files.py
+import asyncio
+import gzip
+import hashlib
+import os
+import uuid
+from email.utils import formatdate, parsedate
+
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are kept
+    brotli = None
+
+# Reports never change once written, so browsers may reuse them for a while before revalidating
+REPORT_CACHE_MAX_AGE = int(os.getenv("REPORT_CACHE_MAX_AGE", "3600"))
+
+# Content-Encoding -> (file suffix, compressor), in order of preference
+ENCODINGS = {"gzip": (".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))}
+if brotli is not None:
+    ENCODINGS = {"br": (".br", lambda data: brotli.compress(data, quality=11)), **ENCODINGS}
+
+
+def build_variants(path):
+    """Write precompressed copies next to a report (report.md.gz, report.md.br)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    for suffix, compress in ENCODINGS.values():
+        # A temp file of its own: the save-time build and a download's rebuild can run at once
+        tmp = f"{path}{suffix}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(compress(data))
+            # Atomic swap so a concurrent download never sees half a file
+            os.replace(tmp, path + suffix)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+def schedule_variants(path):
+    # Compression (brotli level 11 especially) takes long on a big report: keep it off the event loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        build_variants(path)
+        return
+    loop.run_in_executor(None, build_variants, path)
+
+def remove_variants(path):
+    for suffix in (".gz", ".br"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def accepted_encodings(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip().lower())
+    return accepted
+
+async def pick_variant(path, stat, accept_encoding):
+    # Returns (encoding, file to send); identity when nothing acceptable is available
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, (suffix, _) in ENCODINGS.items():
+        if encoding in accepted or "*" in accepted:
+            variant = path + suffix
+            # Variants of older reports (saved before compression existed) are built on first download
+            if not os.path.exists(variant) or os.stat(variant).st_mtime < stat.st_mtime:
+                await asyncio.to_thread(build_variants, path)
+            return encoding, variant
+    return None, path
+
+
+def is_not_modified(headers, etag, last_modified):
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = parsedate(headers.get("if-modified-since") or "")
+    return if_modified_since is not None and if_modified_since >= parsedate(last_modified)
+
+
+async def serve_report(request, path, media_type, filename, compress=True):
+    """FileResponse with ETag/Last-Modified revalidation (304), byte ranges and precompressed variants."""
+    stat = os.stat(path)
+    encoding, send_path = None, path
+    # Ranges refer to the identity bytes, so a range request is never served compressed
+    if compress and "range" not in request.headers:
+        encoding, send_path = await pick_variant(path, stat, request.headers.get("accept-encoding"))
+
+    tag = hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode(), usedforsecurity=False).hexdigest()
+    headers = {
+        "etag": f'"{tag}-{encoding}"' if encoding else f'"{tag}"',
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "cache-control": f"private, max-age={REPORT_CACHE_MAX_AGE}",
+    }
+    if compress:
+        headers["vary"] = "Accept-Encoding"
+
+    if is_not_modified(request.headers, headers["etag"], headers["last-modified"]):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["content-encoding"] = encoding
+    # FileResponse handles Range/If-Range and sends 206 partial content
+    return FileResponse(send_path, media_type=media_type, filename=filename, headers=headers, stat_result=os.stat(send_path))
@@ -0,0 +1,121 @@
+# report_renderer.py
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(".cache", "renders"))
+# Formats rendered right after a report is saved ("html,pdf"); others are rendered on first download
+RENDER_EAGER = [fmt.strip() for fmt in os.getenv("RENDER_EAGER", "").split(",") if fmt.strip()]
+
+REPORT_CSS = """
+body { font-family: -apple-system, "Segoe UI", Helvetica, Arial, sans-serif; line-height: 1.5; max-width: 860px; margin: 2em auto; color: #222; }
+h1, h2, h3 { color: #0b3d91; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; }
+code, pre { background: #f5f5f5; }
+hr { border: 0; border-top: 1px solid #ddd; }
+"""
+
+
+# The two renderers run in worker processes: module-level and plain str/bytes in and out
+def render_html(markdown_text):
+    import markdown
+
+    body = markdown.markdown(markdown_text, extensions=["extra", "sane_lists"])
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Pipeline Report</title>'
+        f"<style>{REPORT_CSS}</style></head><body>{body}</body></html>"
+    ).encode("utf-8")
+
+def render_pdf(markdown_text):
+    from xhtml2pdf import pisa
+
+    out = io.BytesIO()
+    result = pisa.CreatePDF(render_html(markdown_text).decode("utf-8"), dest=out, encoding="utf-8")
+    if result.err:
+        raise RuntimeError(f"PDF rendering failed with {result.err} error(s)")
+    return out.getvalue()
+
+
+# format -> (renderer, media type)
+RENDERERS = {
+    "html": (render_html, "text/html"),
+    "pdf": (render_pdf, "application/pdf"),
+}
+
+
+def log_render_failure(task):
+    if not task.cancelled() and task.exception():
+        print(f"⚠️ Eager render failed: {task.exception()}")
+
+
+class ReportRenderer:
+    """Renders markdown reports in a process pool; results are cached on disk by content hash + format."""
+
+    def __init__(self, workers=RENDER_WORKERS, cache_dir=RENDER_CACHE_DIR):
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self._executor = None
+        self._inflight = {}
+        self.renders = 0
+        self.cache_hits = 0
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: forking a server that holds sqlite handles and connection pools is not safe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def render(self, markdown_path, fmt):
+        """Path of the rendered file, rendering it first unless this content was rendered before."""
+        with open(markdown_path, encoding="utf-8") as f:
+            text = f.read()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = os.path.join(self.cache_dir, f"{digest}.{fmt}")
+        if os.path.exists(path):
+            self.cache_hits += 1
+            return path
+
+        # Concurrent downloads of the same report share one render
+        key = (digest, fmt)
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._render(text, fmt, path))
+            self._inflight[key].add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(self._inflight[key])
+
+    async def _render(self, text, fmt, path):
+        renderer, _ = RENDERERS[fmt]
+        data = await asyncio.get_running_loop().run_in_executor(self._pool(), renderer, text)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.renders += 1
+        print(f"🖨️ Rendered {fmt} ({len(data)} bytes)")
+        return path
+
+    def schedule_eager(self, markdown_path):
+        # Called right after a report is saved; no-op outside an event loop or with RENDER_EAGER unset
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for fmt in RENDER_EAGER:
+            if fmt in RENDERERS:
+                loop.create_task(self.render(markdown_path, fmt)).add_done_callback(log_render_failure)
+
+    def stats(self):
+        return {"workers": self.workers, "renders": self.renders, "cache_hits": self.cache_hits, "inflight": len(self._inflight)}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+renderer = ReportRenderer()
@@ -1,80 +1,173 @@
 #marketing research agent
 import asyncio
 from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
 from autogen_agentchat.teams import RoundRobinGroupChat
 from autogen_agentchat.conditions import TextMentionTermination
 from autogen_core import CancellationToken
-from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_agentchat.ui import Console
 from typing import List, Optional
 from dotenv import load_dotenv
+from team_pool import TeamPool
+from metrics import observe_team_run
+from model_registry import get_model_client
+from bounded_context import build_model_context
+from budget import team_deadline, with_budget
+from hedging import hedged
 import os
 
 load_dotenv()
 
 
-# Create an OpenAI model client.
-model_client = OpenAIChatCompletionClient(
-    model="gemini-1.5-flash-8b",
-    api_key=os.getenv("GEMINI_API_KEY"),    
-)
-
-# Define Research Agent 1: Current business research
-research_agent_current = AssistantAgent(
-    name="research_agent_current",
-    model_client=model_client,
-    system_message="You are a research assistant. Provide detailed and up-to-date information about the CURRENT business operations of Microsoft and Samsung.",
-)
-
-# Define Research Agent 2: Future XR research
-research_agent_future = AssistantAgent(
-    name="research_agent_future",
-    model_client=model_client,
-    system_message="You are a research assistant. Explore and discuss the FUTURE plans of Microsoft and Samsung, especially in XR (Extended Reality) technologies.",
-)
-
-# Define Critic/Review Agent
-critic_agent = AssistantAgent(
-    name="critic_agent",
-    model_client=model_client,
-    system_message=(
-        "You are a review agent. Listen to the discussion between research agents. "
-        "If you feel you have gathered ENOUGH DATA and NUMBERS, at least 3 for a report from both of the agent, respond with 'ENOUGH INFO'."
-    ),
-)
-
-# Create a termination condition based on critic's approval
-termination_condition = TextMentionTermination(text="ENOUGH INFO")
-
-# Setup a group chat between all agents
-team = RoundRobinGroupChat(
-    [research_agent_current, research_agent_future, critic_agent],
-    termination_condition=termination_condition,
-)
+# Model clients come from the shared registry (one connection pool per endpoint, closed on shutdown)
+
+# Build fresh research agents (agents hold per-conversation state, so they are never shared)
+def build_agents(client=None):
+    client = client or get_model_client()
+
+    # Define Research Agent 1: Current business research
+    research_agent_current = AssistantAgent(
+        name="research_agent_current",
+        model_client=hedged(client, "research", "research_agent_current"),
+        model_context=build_model_context("research", client),
+        system_message="You are a research assistant. Provide detailed and up-to-date information about the CURRENT business operations of Microsoft and Samsung.",
+    )
+
+    # Define Research Agent 2: Future XR research
+    research_agent_future = AssistantAgent(
+        name="research_agent_future",
+        model_client=hedged(client, "research", "research_agent_future"),
+        model_context=build_model_context("research", client),
+        system_message="You are a research assistant. Explore and discuss the FUTURE plans of Microsoft and Samsung, especially in XR (Extended Reality) technologies.",
+    )
+
+    # Define Critic/Review Agent
+    critic_agent = AssistantAgent(
+        name="critic_agent",
+        model_client=hedged(client, "research", "critic_agent"),
+        model_context=build_model_context("research", client),
+        system_message=(
+            "You are a review agent. Listen to the discussion between research agents. "
+            "If you feel you have gathered ENOUGH DATA and NUMBERS, at least 3 for a report from both of the agent, respond with 'ENOUGH INFO'."
+        ),
+    )
+
+    return research_agent_current, research_agent_future, critic_agent
+
+# Build a fresh round-robin research team
+def build_team(client=None):
+    # Create a termination condition based on critic's approval
+    termination_condition = with_budget("research", TextMentionTermination(text="ENOUGH INFO"))
+
+    # Setup a group chat between all agents
+    return RoundRobinGroupChat(
+        list(build_agents(client)),
+        termination_condition=termination_condition,
+    )
+
+# Pool of pre-built teams shared by every request in this worker
+team_pool = TeamPool(build_team, name="research")
+
+# "round_robin" (agents take turns) or "fanout" (both researchers answer concurrently, then the critic judges)
+RESEARCH_MODE = os.getenv("RESEARCH_MODE", "round_robin")
+FANOUT_MAX_ROUNDS = int(os.getenv("RESEARCH_FANOUT_MAX_ROUNDS", "3"))
 
 # Default task for standalone
 def get_default_task():
     return "Let's research for making a marketing plan for the new XR/VR product between Microsoft and Samsung. after researching the market and global product condition in Korea."
 
-# Unified runner
-async def run_agent(task=None, cancellation_token=None):
-    await team.reset()
-
+# Fan-out research: the two researchers are independent, so each round they generate concurrently
+# and the critic reviews the merged findings. Yields messages as they arrive, then a TaskResult
+# shaped like RoundRobinGroupChat's so the pipeline can't tell the modes apart.
+async def run_fanout_stream(task=None, cancellation_token=None, max_rounds=None, client=None):
     task = task or get_default_task()
+    cancellation_token = cancellation_token or CancellationToken()
+    max_rounds = max_rounds or FANOUT_MAX_ROUNDS
+
+    task_messages = [TextMessage(content=task, source="user")] if isinstance(task, str) else list(task)
+    research_agent_current, research_agent_future, critic_agent = build_agents(client)
+    # Same stop rules as the round-robin team, checked after every round
+    termination = with_budget("research", TextMentionTermination(text="ENOUGH INFO"))
+
+    messages = list(task_messages)
+    for message in task_messages:
+        yield message
+
+    # What each researcher hasn't seen yet: the task first, then the other's findings plus the critique
+    inbox = {research_agent_current.name: list(task_messages), research_agent_future.name: list(task_messages)}
+    critic_inbox = list(task_messages)
+    stop_reason = f"Maximum number of fan-out rounds {max_rounds} reached."
+
+    for _ in range(max_rounds):
+        async def respond(agent):
+            response = await agent.on_messages(inbox[agent.name], cancellation_token)
+            return agent, response.chat_message
+
+        findings = {}
+        pending = [asyncio.ensure_future(respond(agent)) for agent in (research_agent_current, research_agent_future)]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                agent, finding = await next_done
+                findings[agent.name] = finding
+                messages.append(finding)
+                yield finding
+        finally:
+            # Don't leave a researcher running if the caller stops listening
+            for request in pending:
+                request.cancel()
+
+        verdict = (await critic_agent.on_messages(critic_inbox + list(findings.values()), cancellation_token)).chat_message
+        messages.append(verdict)
+        yield verdict
+
+        stop_message = await termination(list(findings.values()) + [verdict])
+        if stop_message:
+            stop_reason = stop_message.content
+            break
+
+        inbox = {
+            research_agent_current.name: [findings[research_agent_future.name], verdict],
+            research_agent_future.name: [findings[research_agent_current.name], verdict],
+        }
+        critic_inbox = []
+
+    yield TaskResult(messages=messages, stop_reason=stop_reason)
 
-    chat_result = await team.run(
-        task=task,
-        cancellation_token=cancellation_token
-    )
+# Unified runner
+async def run_agent(task=None, cancellation_token=None, mode=None):
+    chat_result = None
+    async for message in run_agent_stream(task=task, cancellation_token=cancellation_token, mode=mode):
+        if isinstance(message, TaskResult):
+            chat_result = message
 
     for message in chat_result.messages:
         print(f"[{message.source}] {message.content}\n")
 
     return chat_result
 
-async def run_agent_post(company1: str, company2: str, user_input: Optional[str] = None, task: str = None):
-    await team.reset()
+# Stream messages as the team produces them, ending with the TaskResult
+async def run_agent_stream(task=None, cancellation_token=None, mode=None, on_team_state=None):
+    task = task or get_default_task()
 
+    # Every model call of this run gets the time left before RESEARCH_MAX_SECONDS / TEAM_MAX_SECONDS
+    with team_deadline("research"):
+        if (mode or RESEARCH_MODE) == "fanout":
+            async for message in observe_team_run("research", run_fanout_stream(task=task, cancellation_token=cancellation_token)):
+                yield message
+            return
+
+        async with team_pool.acquire() as team:
+            async for message in observe_team_run("research", team.run_stream(
+                task=task,
+                cancellation_token=cancellation_token
+            )):
+                yield message
+            # Snapshot the conversation before the team is reset and returned to the pool
+            if on_team_state:
+                on_team_state(await team.save_state())
+
+async def run_agent_post(company1: str, company2: str, user_input: Optional[str] = None, task: str = None, cancellation_token=None):
     final_task = (
         f"Let's research for creating a marketing plan for a new collabrative product between {company1} and {company2} and make sure to consider their current relation and future potential and market in geographical condtion which user will be mentioning in below instruction.\n"
         f"\n--- User Instruction ---\n{user_input.strip()}"
@@ -83,15 +176,7 @@ async def run_agent_post(company1: str, company2: str, user_input: Optional[str]
     if task:
         final_task += f"\n\n--- Context from Previous Agent(s) ---\n{task.strip()}"
 
-    chat_result = await team.run(
-        task=final_task,
-        cancellation_token=None
-    )
-
-    for message in chat_result.messages:
-        print(f"[{message.source}] {message.content}\n")
-
-    return chat_result
+    return await run_agent(task=final_task, cancellation_token=cancellation_token)
 
 
 def main():
@@ -1,16 +1,30 @@
+import asyncio
 import os
 from datetime import datetime
 
-def save_pipeline_report(results: dict, report_folder="reports"):
+from budget import is_budget_stop
+from report_catalog import get_catalog
+from report_files import remove_variants, schedule_variants
+from report_renderer import renderer
+
+def save_pipeline_report(results: dict, report_folder="reports", company1=None, company2=None, stop_reasons=None):
     os.makedirs(report_folder, exist_ok=True)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    now = datetime.now()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
     filename_md = f"pipeline_report_{timestamp}.md"
+    # Concurrent runs can finish in the same second; don't overwrite each other's report
+    suffix = 2
+    while os.path.exists(os.path.join(report_folder, filename_md)):
+        filename_md = f"pipeline_report_{timestamp}_{suffix}.md"
+        suffix += 1
     filepath_md = os.path.join(report_folder, filename_md)
 
     # Build Markdown content
     md_content = "# 📝 Pipeline Report\n\n"
-    md_content += f"**Generated At:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    md_content += f"**Generated At:** {now.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    if company1 and company2:
+        md_content += f"**Companies:** {company1} × {company2}\n\n"
 
     for key, value in results.items():
         md_content += f"## {key.replace('_', ' ').title()}\n\n"
@@ -21,19 +35,76 @@ def save_pipeline_report(results: dict, report_folder="reports"):
         f.write(md_content)
 
     print(f"✅ Markdown saved at: {filepath_md}")
+    # Compressed copies are built once here (in a worker thread) instead of on every download
+    schedule_variants(filepath_md)
+    # HTML/PDF in the background when RENDER_EAGER asks for them
+    renderer.schedule_eager(filepath_md)
+
+    # Index it for /get-reports; a run that hit its budget is flagged as partial
+    stop_reasons = stop_reasons or {}
+    status = "partial" if any(is_budget_stop(reason) for reason in stop_reasons.values()) else "complete"
+    if report_folder == get_catalog().report_folder:
+        schedule_index(filename_md, md_content, now.timestamp(), company1, company2, status, stop_reasons)
     return filename_md
 
+def schedule_index(filename, *fields):
+    # Indexing (an FTS insert and a commit) runs in a worker thread when called from the event loop;
+    # until it lands, downloads of the report are resolved from the folder (is_known_report)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        get_catalog().add(filename, *fields)
+        return
+    loop.run_in_executor(None, _index_report, filename, *fields)
+
+def _index_report(filename, *fields):
+    try:
+        get_catalog().add(filename, *fields)
+    except Exception as e:
+        print(f"⚠️ Could not index {filename}: {e}")
+
 def list_reports(report_folder="reports"):
     os.makedirs(report_folder, exist_ok=True)
     return [f for f in os.listdir(report_folder) if f.endswith(".md")]
 
+# One page of catalogued reports with metadata; see ReportCatalog.search for the filters
+def search_reports(**filters):
+    return get_catalog().search(**filters)
+
+# Only plain report names inside the folder are turned into paths, so "../main.py" and friends never reach the filesystem
+def is_known_report(filename, report_folder="reports"):
+    if not filename or filename != os.path.basename(filename) or filename.startswith("."):
+        return False
+    if report_folder == get_catalog().report_folder and get_catalog().get(filename) is not None:
+        return True
+    # Not catalogued (yet): the startup backfill may still be running, so fall back to the folder itself
+    return _is_report_file(filename, report_folder)
+
+def _is_report_file(filename, report_folder="reports"):
+    folder = os.path.realpath(report_folder)
+    path = os.path.realpath(os.path.join(folder, filename))
+    return filename.endswith(".md") and os.path.dirname(path) == folder and os.path.isfile(path)
+
 def get_report_path(filename, report_folder="reports"):
+    if not is_known_report(filename, report_folder):
+        return None
     filepath = os.path.join(report_folder, filename)
     return filepath if os.path.exists(filepath) else None
 
-def delete_report(filename, report_folder="reports"):
+# PDFs are rendered from a saved markdown report and share its name
+def get_pdf_path(filename, report_folder="reports"):
+    stem, ext = os.path.splitext(filename)
+    if ext != ".pdf" or not is_known_report(stem + ".md", report_folder):
+        return None
     filepath = os.path.join(report_folder, filename)
-    if os.path.exists(filepath):
+    return filepath if os.path.exists(filepath) else None
+
+def delete_report(filename, report_folder="reports"):
+    filepath = get_report_path(filename, report_folder)
+    if filepath:
         os.remove(filepath)
+        remove_variants(filepath)
+        if report_folder == get_catalog().report_folder:
+            get_catalog().remove(filename)
         return True
     return False
\ No newline at end of file
@@ -0,0 +1,75 @@
+# single_flight.py
+import asyncio
+
+from metrics import COALESCED_REQUESTS
+from stage_cache import normalize_company, normalize_text
+
+
+def request_key(endpoint, input):
+    """Identity of an AgentInput for coalescing. Company order is kept: it shows in the prompts and the report."""
+    return (
+        endpoint,
+        (normalize_company(input.companyName1).lower(), normalize_company(input.companyName2).lower()),
+        normalize_text(input.textInstruction),
+        normalize_text(input.task),
+        input.bypassCache,
+        input.forceRefresh,
+    )
+
+
+class Flight:
+    """One in-flight run and how many callers are waiting on it."""
+
+    def __init__(self, future, on_abandoned=None):
+        self.future = future
+        self.waiters = 0
+        self.on_abandoned = on_abandoned
+
+
+class SingleFlight:
+    """Runs one coroutine per key at a time; identical calls that arrive meanwhile await the same result."""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, fn, on_abandoned=None):
+        # on_abandoned() is called if every caller waiting on the run goes away before it finishes
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = Flight(asyncio.ensure_future(fn()), on_abandoned)
+            self._inflight[key] = flight
+            flight.future.add_done_callback(lambda _: self._finished(key, flight))
+        else:
+            COALESCED_REQUESTS.labels(key[0]).inc()
+            print(f"🔗 Joined in-flight {key[0]} request")
+            result = await self._wait(key, flight)
+            return {**result, "coalesced": True} if isinstance(result, dict) else result
+        return await self._wait(key, flight)
+
+    async def _wait(self, key, flight):
+        flight.waiters += 1
+        try:
+            # Shielded so one caller disconnecting doesn't cancel the run the others are waiting on
+            return await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.future.done():
+                # Nobody is left to read the result: stop the run and let new requests start afresh
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                if flight.on_abandoned:
+                    flight.on_abandoned()
+            raise
+
+    def _finished(self, key, flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # An abandoned run's error has no reader left
+        if not flight.future.cancelled():
+            flight.future.exception()
+
+    def stats(self):
+        return {"inflight": len(self._inflight)}
+
+
+single_flight = SingleFlight()
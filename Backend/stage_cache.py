@@ -0,0 +1,90 @@
+# stage_cache.py
+import hashlib
+import os
+import re
+from contextlib import asynccontextmanager
+
+from state_backend import get_state_backend
+
+# Lower-cased spellings we see from users -> canonical company name
+COMPANY_ALIASES = {
+    "ms": "Microsoft",
+    "msft": "Microsoft",
+    "microsoft corp": "Microsoft",
+    "microsoft corporation": "Microsoft",
+    "samsung electronics": "Samsung",
+    "samsung electronics co": "Samsung",
+    "sec": "Samsung",
+    "google": "Google",
+    "alphabet": "Google",
+    "meta": "Meta",
+    "facebook": "Meta",
+    "apple inc": "Apple",
+}
+
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", (text or "").strip()).lower()
+
+def normalize_company(name):
+    cleaned = re.sub(r"\s+", " ", (name or "").strip())
+    key = cleaned.lower().rstrip(".")
+    return COMPANY_ALIASES.get(key, cleaned)
+
+def normalize_pair(company1, company2):
+    # "samsung " + "MS" and "Microsoft" + "Samsung" are the same research question
+    return tuple(sorted((normalize_company(company1), normalize_company(company2)), key=str.lower))
+
+def stage_key(*parts):
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Stage output cache whose entries expire after `ttl` seconds. Entries live in the state backend,
+    so with STATE_BACKEND=sqlite a stage computed by one worker is reused by all of them."""
+
+    def __init__(self, ttl, max_entries=1000, namespace="stage"):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+
+    async def get(self, key):
+        return await get_state_backend().get(self.namespace, key)
+
+    async def set(self, key, value):
+        await get_state_backend().set(self.namespace, key, value, ttl=self.ttl, max_entries=self.max_entries)
+
+    async def clear(self):
+        await get_state_backend().clear(self.namespace)
+
+
+research_cache = TTLCache(ttl=int(os.getenv("RESEARCH_CACHE_TTL_SECONDS", str(24 * 3600))), namespace="stage:research")
+product_cache = TTLCache(ttl=int(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "3600")), namespace="stage:product")
+marketing_cache = TTLCache(ttl=int(os.getenv("MARKETING_CACHE_TTL_SECONDS", "3600")), namespace="stage:marketing")
+# Lease of a stage lock: renewed while the stage runs, so this is how long a crashed worker keeps it
+STAGE_LOCK_TTL = int(os.getenv("STAGE_LOCK_TTL_SECONDS", "900"))
+
+STAGE_CACHES = {
+    "research": research_cache,
+    "product": product_cache,
+    "marketing": marketing_cache,
+}
+
+
+def stage_cache_key(stage, pair, user_input=None, previous_output=None):
+    # research: company pair only; product: research output + instruction; marketing: product output
+    if stage == "research":
+        return stage_key(*(normalize_text(company) for company in pair))
+    if stage == "product":
+        return stage_key(previous_output or "", normalize_text(user_input))
+    return stage_key(previous_output or "")
+
+
+@asynccontextmanager
+async def stage_lock(stage, key, enabled=True):
+    # Requests computing the same stage, on any worker, take turns: the later ones then find it cached
+    if not enabled:
+        yield
+        return
+    async with get_state_backend().lock(f"stage:{stage}:{key}", ttl=STAGE_LOCK_TTL, poll=0.5):
+        yield
@@ -0,0 +1,66 @@
+# stage_scheduler.py
+import asyncio
+
+
+class Stage:
+    """A unit of work that declares which stages' outputs it needs."""
+
+    def __init__(self, name, run, inputs=()):
+        self.name = name
+        # `async def run(inputs) -> output`, where inputs maps dependency name -> output
+        self.run = run
+        self.inputs = tuple(inputs)
+
+
+class StageScheduler:
+    """Runs any subset of stages in dependency order; independent stages run concurrently."""
+
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+
+    def plan(self, requested):
+        # Requested stages plus everything they depend on, in topological order
+        unknown = [name for name in requested if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependency cycle at '{name}'")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in requested:
+            visit(name)
+        return order
+
+    async def run(self, requested):
+        order = self.plan(requested)
+        tasks = {}
+
+        async def run_stage(stage):
+            # Each dependency is a single shared task, so it runs once however many stages need it
+            inputs = {name: await tasks[name] for name in stage.inputs}
+            return await stage.run(inputs)
+
+        # Topological order guarantees dependencies are scheduled before their dependents
+        for name in order:
+            tasks[name] = asyncio.ensure_future(run_stage(self.stages[name]))
+
+        try:
+            outputs = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        return order, dict(zip(order, outputs))
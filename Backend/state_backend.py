@@ -0,0 +1,239 @@
+# state_backend.py
+import asyncio
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+# "memory": this process only. "sqlite": a WAL database every worker on the host shares (STATE_PATH).
+# Replicas on different hosts need a networked backend: subclass StateBackend and add it to BACKENDS.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_PATH = os.getenv("STATE_PATH", os.path.join(".cache", "state.sqlite3"))
+
+
+class StateBackend(ABC):
+    """Namespaced key/value store with per-entry TTLs plus leased locks; everything is async, so a
+    networked store (Redis, a database) can implement it without blocking the event loop.
+    Values must be JSON-serializable."""
+
+    @abstractmethod
+    async def get(self, namespace, key):
+        ...
+
+    @abstractmethod
+    async def set(self, namespace, key, value, ttl=None, max_entries=None):
+        # max_entries: keep at most that many entries in the namespace, dropping those closest to expiry
+        ...
+
+    @abstractmethod
+    async def delete(self, namespace, key):
+        ...
+
+    @abstractmethod
+    async def clear(self, namespace):
+        ...
+
+    @abstractmethod
+    async def acquire(self, name, owner, ttl):
+        # True if `owner` now holds lock `name` (or extended its lease); the lease lapses after `ttl`
+        # seconds so a dead worker can't keep it
+        ...
+
+    @abstractmethod
+    async def release(self, name, owner):
+        ...
+
+    @asynccontextmanager
+    async def lock(self, name, ttl=60, poll=0.2):
+        owner = uuid.uuid4().hex
+        while not await self.acquire(name, owner, ttl):
+            await asyncio.sleep(poll)
+        # Renew the lease while we hold it, so only a dead holder loses the lock after `ttl`
+        renewal = asyncio.ensure_future(self._renew(name, owner, ttl))
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            await self.release(name, owner)
+
+    async def _renew(self, name, owner, ttl):
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                if not await self.acquire(name, owner, ttl):
+                    # The lease lapsed before we could renew it (a stalled worker) and someone else took it
+                    print(f"⚠️ Lost lock {name}; another worker may run the same work")
+                    return
+            except Exception as e:
+                print(f"⚠️ Could not renew lock {name}: {e}")
+
+
+class InProcessStateBackend(StateBackend):
+    def __init__(self):
+        # namespace -> {key: (expires_at, value)}, plus a heap of (expiry, key) per namespace for eviction
+        self._entries = defaultdict(dict)
+        self._expiry = defaultdict(list)
+        self._locks = {}
+
+    async def get(self, namespace, key):
+        entries = self._entries.get(namespace, {})
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.time():
+            del entries[key]
+            return None
+        return value
+
+    async def set(self, namespace, key, value, ttl=None, max_entries=None):
+        entries = self._entries[namespace]
+        heap = self._expiry[namespace]
+        expires_at = time.time() + ttl if ttl else None
+        if max_entries and key not in entries:
+            while len(entries) >= max_entries and heap:
+                # Drop the entry closest to expiry to make room (heap items of replaced or deleted entries are stale)
+                expiry, old = heapq.heappop(heap)
+                if old in entries and _expiry(entries[old][0]) == expiry:
+                    del entries[old]
+        entries[key] = (expires_at, value)
+        heapq.heappush(heap, (_expiry(expires_at), key))
+        if len(heap) > 2 * len(entries) + 64:
+            heap[:] = [(_expiry(expires), k) for k, (expires, _) in entries.items()]
+            heapq.heapify(heap)
+
+    async def delete(self, namespace, key):
+        self._entries.get(namespace, {}).pop(key, None)
+
+    async def clear(self, namespace):
+        self._entries.pop(namespace, None)
+        self._expiry.pop(namespace, None)
+
+    async def acquire(self, name, owner, ttl):
+        holder = self._locks.get(name)
+        if holder and holder[0] != owner and holder[1] > time.time():
+            return False
+        self._locks[name] = (owner, time.time() + ttl)
+        return True
+
+    async def release(self, name, owner):
+        if self._locks.get(name, (None,))[0] == owner:
+            del self._locks[name]
+
+def _expiry(expires_at):
+    return float("inf") if expires_at is None else expires_at
+
+
+class SqliteStateBackend(StateBackend):
+    """SQLite in WAL mode: safe for several processes on one host (not for a network filesystem)."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT, key TEXT, value TEXT, expires_at REAL, PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS entries_expiry ON entries (namespace, expires_at);
+            CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL);
+            """
+        )
+
+    def _run(self, fn, *args):
+        with self._lock:
+            return fn(*args)
+
+    async def get(self, namespace, key):
+        row = await asyncio.to_thread(
+            self._run, lambda: self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        )
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    async def set(self, namespace, key, value, ttl=None, max_entries=None):
+        # Serialized here, on the loop, so the caller can keep mutating `value` afterwards
+        encoded = json.dumps(value, default=str)
+        await asyncio.to_thread(self._run, self._set, namespace, key, encoded, time.time() + ttl if ttl else None, max_entries)
+
+    def _set(self, namespace, key, encoded, expires_at, max_entries):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, encoded, expires_at),
+            )
+            if max_entries:
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key IN (SELECT key FROM entries WHERE namespace = ? "
+                    "ORDER BY expires_at IS NULL DESC, expires_at DESC LIMIT -1 OFFSET ?)",
+                    (namespace, namespace, max_entries),
+                )
+            self._writes += 1
+            if self._writes % 200 == 0:
+                conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def delete(self, namespace, key):
+        await asyncio.to_thread(
+            self._run, self._conn.execute, "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    async def clear(self, namespace):
+        await asyncio.to_thread(self._run, self._conn.execute, "DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    async def acquire(self, name, owner, ttl):
+        return await asyncio.to_thread(self._run, self._acquire, name, owner, ttl)
+
+    def _acquire(self, name, owner, ttl):
+        now = time.time()
+        # One statement: take the lock if it is free, expired or already ours
+        cursor = self._conn.execute(
+            "INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE locks.expires_at < ? OR locks.owner = excluded.owner",
+            (name, owner, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    async def release(self, name, owner):
+        await asyncio.to_thread(
+            self._run, self._conn.execute, "DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner)
+        )
+
+
+BACKENDS = {
+    "memory": InProcessStateBackend,
+    "sqlite": SqliteStateBackend,
+}
+
+_backend = None
+
+def get_state_backend():
+    global _backend
+    if _backend is None:
+        if STATE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown STATE_BACKEND {STATE_BACKEND!r}; expected one of {', '.join(BACKENDS)}")
+        _backend = BACKENDS[STATE_BACKEND]()
+        print(f"🗄️ State backend: {STATE_BACKEND}")
+    return _backend
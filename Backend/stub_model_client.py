@@ -0,0 +1,129 @@
+# stub_model_client.py
+import asyncio
+import json
+import math
+import os
+import random
+
+from autogen_core.models import ChatCompletionClient, CreateResult, ModelFamily, ModelInfo, RequestUsage, SystemMessage
+
+from bounded_context import estimate_tokens
+
+# MODEL_CLIENT=stub serves every model call from this client: no network, no API key, repeatable timings
+STUB_LATENCY = os.getenv("STUB_LATENCY", "lognormal:0.8,0.4")
+STUB_COMPLETION_TOKENS = os.getenv("STUB_COMPLETION_TOKENS", "uniform:80,240")
+STUB_SCRIPT = os.getenv("STUB_SCRIPT")
+STUB_SEED = int(os.getenv("STUB_SEED", "0"))
+
+# One reply per agent turn; the last one repeats once the script runs out
+DEFAULT_SCRIPT = [
+    "Current operations: market share 12%, revenue $4B, three XR devices shipping this year.",
+    "Future plans: a joint XR headset, Korean retail partners and a launch within 12 months.",
+    "The findings are consistent and cover both companies.",
+]
+FILLER = "Details on pricing, channels, partners and timelines follow. "
+
+
+def parse_distribution(spec):
+    """"0.5", "uniform:lo,hi", "normal:mean,sd" or "lognormal:median,sigma" -> fn(rng) returning a value >= 0."""
+    kind, _, args = str(spec).partition(":")
+    if not args:
+        value = float(kind)
+        return lambda rng: value
+    params = [float(arg) for arg in args.split(",")]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(*params)
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(*params))
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda rng: median * math.exp(rng.gauss(0, sigma))
+    raise ValueError(f"Unknown distribution: {spec}")
+
+def load_script(path):
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    if not isinstance(script, list) or not script or not all(isinstance(reply, str) for reply in script):
+        raise ValueError(f"{path} must hold a JSON list of reply strings")
+    return script
+
+
+def closing_phrase(messages):
+    # Reviewers are told which phrase ends their team's discussion (ENOUGH INFO for research,
+    # APPROVE for product/marketing); saying only that one keeps it out of the next stage's task
+    system = " ".join(str(m.content) for m in messages if isinstance(m, SystemMessage))
+    if "ENOUGH INFO" in system:
+        return "ENOUGH INFO"
+    if "approve" in system.lower():
+        return "APPROVE"
+    return None
+
+
+class StubChatCompletionClient(ChatCompletionClient):
+    """Offline stand-in for the Gemini client. Latency and completion length are drawn from the
+    configured distributions with an RNG seeded by the prompt, so a given prompt always gets the
+    same timing and reply whatever else runs concurrently."""
+
+    def __init__(self, model="stub", latency=STUB_LATENCY, completion_tokens=STUB_COMPLETION_TOKENS, script=None, seed=STUB_SEED):
+        self.model_name = model
+        self.latency = parse_distribution(latency)
+        self.completion_tokens = parse_distribution(completion_tokens)
+        self.script = script or (load_script(STUB_SCRIPT) if STUB_SCRIPT else DEFAULT_SCRIPT)
+        self.seed = seed
+        self.calls = 0
+        self._usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._total = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def _reply(self, messages):
+        # The n-th agent turn of a conversation gets the n-th scripted reply
+        history = [m for m in messages if not isinstance(m, SystemMessage)]
+        turn = min(max(len(history) - 1, 0), len(self.script) - 1)
+        closing = closing_phrase(messages) if turn == len(self.script) - 1 else None
+        return f"{self.script[turn]} {closing}" if closing else self.script[turn]
+
+    async def create(self, messages, *, tools=[], tool_choice="auto", json_output=None, extra_create_args={}, cancellation_token=None):
+        self.calls += 1
+        rng = random.Random(f"{self.seed}:{[str(m.content) for m in messages]}")
+        await asyncio.sleep(self.latency(rng))
+
+        reply = self._reply(messages)
+        completion_tokens = max(1, int(self.completion_tokens(rng)))
+        # Pad to the drawn length (~4 characters per token) so downstream prompts grow realistically
+        padding = max(0, completion_tokens * 4 - len(reply))
+        content = reply + (" " + (FILLER * (padding // len(FILLER) + 1))[:padding] if padding else "")
+
+        self._usage = RequestUsage(prompt_tokens=self.count_tokens(messages), completion_tokens=completion_tokens)
+        self._total = RequestUsage(
+            prompt_tokens=self._total.prompt_tokens + self._usage.prompt_tokens,
+            completion_tokens=self._total.completion_tokens + self._usage.completion_tokens,
+        )
+        return CreateResult(finish_reason="stop", content=content, usage=self._usage, cached=False)
+
+    async def create_stream(self, messages, *, tools=[], tool_choice="auto", json_output=None, extra_create_args={}, cancellation_token=None):
+        result = await self.create(messages)
+        for start in range(0, len(result.content), 64):
+            yield result.content[start:start + 64]
+        yield result
+
+    async def close(self):
+        pass
+
+    def actual_usage(self):
+        return self._usage
+
+    def total_usage(self):
+        return self._total
+
+    def count_tokens(self, messages, *, tools=[]):
+        return estimate_tokens(messages)
+
+    def remaining_tokens(self, messages, *, tools=[]):
+        return 1_000_000 - self.count_tokens(messages)
+
+    @property
+    def capabilities(self):
+        return self.model_info
+
+    @property
+    def model_info(self):
+        return ModelInfo(vision=False, function_calling=False, json_output=False, family=ModelFamily.UNKNOWN, structured_output=False)
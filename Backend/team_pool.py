@@ -0,0 +1,63 @@
+# team_pool.py
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+
+class TeamPool:
+    """Bounded pool of reusable teams so concurrent runs never share a conversation."""
+
+    def __init__(self, factory, size=None, name="team"):
+        self.factory = factory
+        self.name = name
+        # e.g. RESEARCH_TEAM_POOL_SIZE, falling back to TEAM_POOL_SIZE
+        self.size = size or int(os.getenv(f"{name.upper()}_TEAM_POOL_SIZE", os.getenv("TEAM_POOL_SIZE", "4")))
+        self._idle = asyncio.Queue()
+        self._created = 0
+
+    def prefill(self, count=None):
+        # Build teams up front so the first requests don't pay for construction
+        target = min(count or self.size, self.size)
+        while self._created < target:
+            self._created += 1
+            self._idle.put_nowait(self.factory())
+
+    async def _checkout(self):
+        if self._idle.empty() and self._created < self.size:
+            self._created += 1
+            try:
+                return self.factory()
+            except Exception:
+                self._created -= 1
+                raise
+        # Pool is at capacity: wait (FIFO) for a team to be released
+        return await self._idle.get()
+
+    @asynccontextmanager
+    async def acquire(self):
+        team = await self._checkout()
+        try:
+            await team.reset()
+            yield team
+        except BaseException:
+            # A failed or cancelled run can leave the team mid-conversation, replace it
+            self._replace()
+            raise
+        else:
+            self._idle.put_nowait(team)
+
+    def _replace(self):
+        try:
+            self._idle.put_nowait(self.factory())
+        except Exception:
+            self._created -= 1
+
+    def stats(self):
+        idle = self._idle.qsize()
+        return {
+            "name": self.name,
+            "size": self.size,
+            "created": self._created,
+            "idle": idle,
+            "in_use": self._created - idle,
+        }
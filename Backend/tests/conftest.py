@@ -0,0 +1,6 @@
+# conftest.py
+# Backend modules are flat and import each other by name, as they do when uvicorn runs from Backend/
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,16 @@
+from bounded_context import SummarizingChatCompletionContext, build_model_context, context_window
+from stub_model_client import StubChatCompletionClient
+
+
+def test_unbounded_unless_configured(monkeypatch):
+    monkeypatch.delenv("CONTEXT_MAX_MESSAGES", raising=False)
+    monkeypatch.delenv("RESEARCH_CONTEXT_MAX_MESSAGES", raising=False)
+    assert context_window("research") == 0
+    assert build_model_context("research", StubChatCompletionClient()) is None
+
+
+def test_window_per_team(monkeypatch):
+    monkeypatch.setenv("CONTEXT_MAX_MESSAGES", "0")
+    monkeypatch.setenv("PRODUCT_CONTEXT_MAX_MESSAGES", "6")
+    assert build_model_context("research", StubChatCompletionClient()) is None
+    assert isinstance(build_model_context("product", StubChatCompletionClient()), SummarizingChatCompletionContext)
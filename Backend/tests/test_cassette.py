@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+from autogen_core.models import CreateResult, RequestUsage, UserMessage
+
+import cassette as cassette_module
+from cassette import Cassette, CassetteError
+
+
+@pytest.fixture(autouse=True)
+def cassette_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cassette_module, "CASSETTE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def prompt(text):
+    return [UserMessage(content=text, source="user")]
+
+def reply(text):
+    return CreateResult(finish_reason="stop", content=text, usage=RequestUsage(prompt_tokens=1, completion_tokens=1), cached=False)
+
+def record(run_id, texts):
+    recorder = Cassette.recorder(run_id, {"company1": "A"})
+    for text in texts:
+        recorder.record(prompt(text), reply(f"answer to {text}"), 0.01)
+    recorder.close()
+
+def model_seqs(path):
+    with open(path, encoding="utf-8") as f:
+        return [entry["seq"] for entry in map(json.loads, f) if entry["kind"] == "model"]
+
+
+def test_resumed_recording_continues_seqs(cassette_dir):
+    record("run-1", ["a", "b", "c"])
+    record("run-1", ["d", "e", "f"])
+    assert model_seqs(cassette_dir / "run-1.jsonl") == [1, 2, 3, 4, 5, 6]
+
+
+def test_replay_serves_every_call_of_a_resumed_run():
+    record("run-1", ["a", "b", "c"])
+    record("run-1", ["d", "e", "f"])
+    player = Cassette.player("run-1")
+    assert player.params == {"company1": "A"}
+
+    async def scenario():
+        return [(await player.replay(prompt(text))).content for text in "abcdef"]
+
+    assert asyncio.run(scenario()) == [f"answer to {text}" for text in "abcdef"]
+    assert player.stats() == {"served": 6, "out_of_order": 0, "unused": 0}
+
+
+def test_replay_of_old_cassette_with_repeated_seqs(cassette_dir):
+    # Cassettes written before seqs carried on over a resume hold 1,2,1,2
+    lines = [{"kind": "run", "run_id": "old", "params": {}}]
+    for seq, text in ((1, "a"), (2, "b"), (1, "c"), (2, "d")):
+        lines.append({"kind": "model", "seq": seq, "digest": cassette_module.prompt_digest(prompt(text)),
+                      "messages": 1, "seconds": 0, "result": reply(text).model_dump(mode="json")})
+    (cassette_dir / "old.jsonl").write_text("".join(json.dumps(line) + "\n" for line in lines))
+    player = Cassette.player("old")
+
+    async def scenario():
+        return [(await player.replay(prompt(text))).content for text in "abcd"]
+
+    assert asyncio.run(scenario()) == ["a", "b", "c", "d"]
+    assert player.stats()["unused"] == 0
+
+
+def test_changed_prompts_fall_back_to_recorded_order():
+    record("run-1", ["a", "b"])
+    player = Cassette.player("run-1")
+
+    async def scenario():
+        first = await player.replay(prompt("b"))
+        second = await player.replay(prompt("something new"))
+        with pytest.raises(CassetteError):
+            await player.replay(prompt("a"))
+        return first.content, second.content
+
+    assert asyncio.run(scenario()) == ("answer to b", "answer to a")
+    assert player.stats() == {"served": 2, "out_of_order": 1, "unused": 0}
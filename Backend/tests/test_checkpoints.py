@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+from autogen_core.models import RequestUsage
+
+import agent_pipeline
+from checkpoints import CheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    monkeypatch.setattr(agent_pipeline, "get_checkpoint_store", lambda: store)
+    return store
+
+
+def test_start_run_returns_finished_stages(store):
+    async def scenario():
+        assert await store.start_run("run-1", {"company1": "A"}) == {}
+        await store.save_stage("run-1", "research", {"source": "critic", "content": "findings", "stop_reason": "done"})
+        await store.finish_run("run-1", "failed", "boom")
+        assert (await store.get_run("run-1"))["status"] == "failed"
+        # Re-opening the run for resume hands back its checkpoints and marks it running again
+        return await store.start_run("run-1", {"company1": "A"}), await store.get_run("run-1")
+
+    completed, run = asyncio.run(scenario())
+    assert completed == {"research": {"source": "critic", "content": "findings", "stop_reason": "done"}}
+    assert (run["status"], run["error"], list(run["stages"])) == ("running", None, ["research"])
+
+
+def test_expired_runs_are_pruned(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"), ttl=1)
+
+    async def scenario():
+        await store.start_run("old", {})
+        await store.save_stage("old", "research", {"content": "x"})
+        store._conn.execute("UPDATE runs SET updated_at = updated_at - 10")
+        await store.start_run("new", {})
+        return await store.get_run("old")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_failed_run_resumes_at_the_first_unfinished_stage(store, monkeypatch):
+    runs = []
+    failing = {"product"}
+
+    class Agent:
+        def __init__(self, stage):
+            self.stage = stage
+
+        async def run_agent_stream(self, task, cancellation_token=None, on_team_state=None):
+            runs.append(self.stage)
+            if self.stage in failing:
+                raise RuntimeError(f"{self.stage} failed")
+            yield task[0]
+            reply = TextMessage(content=f"{self.stage} output", source=self.stage, models_usage=RequestUsage(prompt_tokens=1, completion_tokens=1))
+            yield reply
+            yield TaskResult(messages=[task[0], reply], stop_reason="done")
+
+    async def no_handoff(stage, messages, content):
+        return None
+
+    monkeypatch.setattr(agent_pipeline, "get_agent", Agent)
+    monkeypatch.setattr(agent_pipeline, "build_handoff", no_handoff)
+    monkeypatch.setattr(agent_pipeline, "STAGE_RETRIES", 0)
+
+    async def run():
+        return [event async for event in agent_pipeline.stream_full_pipeline(
+            company1="A", company2="B", save=False, force_refresh=True, run_id="resume-test",
+        )]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert runs == ["research", "product"]
+    assert asyncio.run(store.get_run("resume-test"))["status"] == "failed"
+
+    failing.clear()
+    events = asyncio.run(run())
+    # research comes from its checkpoint; only the unfinished stages run again
+    assert runs == ["research", "product", "product", "marketing"]
+    assert events[0] == {"event": "run", "run_id": "resume-test", "restored_stages": ["research"]}
+    assert events[-1]["results"] == {
+        "research_output": "research output", "product_output": "product output", "marketing_output": "marketing output",
+    }
+    assert asyncio.run(store.get_run("resume-test"))["status"] == "completed"
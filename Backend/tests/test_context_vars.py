@@ -0,0 +1,22 @@
+import contextvars
+from contextvars import ContextVar
+
+from context_vars import safe_reset
+from llm_cache import _bypass, bypass_cache
+
+
+def test_reset_restores_the_previous_value():
+    var = ContextVar("var", default="outer")
+    token = var.set("inner")
+    safe_reset(var, token)
+    assert var.get() == "outer"
+
+
+def test_exit_from_another_context_is_ignored():
+    # What happens when a dropped stream's generator is closed outside the request's context
+    manager = bypass_cache(True)
+    request = contextvars.copy_context()
+    request.run(manager.__enter__)
+    assert request[_bypass] is True
+    contextvars.copy_context().run(manager.__exit__, None, None, None)
+    assert _bypass.get() is False
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+from autogen_core.models import RequestUsage, UserMessage
+
+import agent_pipeline
+import hedging
+from budget import DeadlineExceeded, is_budget_stop, is_deadline_exceeded, team_deadline
+from hedging import with_deadline, with_latency
+from rate_limiter import RateLimitedChatCompletionClient, RateLimiter
+from stage_cache import marketing_cache
+from stub_model_client import StubChatCompletionClient
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    hedging._trackers.clear()
+    hedging._counts.clear()
+    yield
+    hedging._trackers.clear()
+    hedging._counts.clear()
+
+
+def prompt(text="hi"):
+    return [UserMessage(content=text, source="user")]
+
+
+def test_call_past_the_deadline_raises_instead_of_answering(monkeypatch):
+    monkeypatch.setenv("TEAM_MAX_SECONDS", "0.05")
+    client = with_deadline(StubChatCompletionClient(model="slow", latency=1.0, completion_tokens=1))
+
+    async def scenario():
+        with team_deadline("research"):
+            await client.create(prompt())
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert hedging._counts["slow"]["deadline_exceeded"] == 1
+
+
+def test_deadline_error_is_recognised_after_a_team_wraps_it():
+    # autogen re-raises a participant's error as a RuntimeError naming its type
+    assert is_deadline_exceeded(DeadlineExceeded("Deadline reached during a call to m"))
+    assert is_deadline_exceeded(RuntimeError("DeadlineExceeded: Deadline reached during a call to m\nTraceback:\n"))
+    assert not is_deadline_exceeded(RuntimeError("TimeoutError: read timed out"))
+    assert is_budget_stop("Deadline reached during a call to m")
+
+
+def test_latency_excludes_time_queued_in_the_rate_limiter():
+    provider = StubChatCompletionClient(model="queued", latency=0.05, completion_tokens=1)
+    limiter = RateLimiter("queued", rpm=0, tpm=0, max_concurrency=1)
+    client = RateLimitedChatCompletionClient(with_latency(provider), limiter)
+
+    async def scenario():
+        # One slot: the fourth call queues behind three others for ~0.15s
+        await asyncio.gather(*(client.create(prompt(str(i))) for i in range(4)))
+
+    asyncio.run(scenario())
+    samples = hedging.get_latency_tracker("queued").samples
+    assert len(samples) == 4
+    assert max(samples) < 0.1
+
+
+def test_stage_cut_at_the_deadline_is_not_cached(monkeypatch):
+    turn = TextMessage(content="A partial plan.", source="planner", models_usage=RequestUsage(prompt_tokens=1, completion_tokens=1))
+
+    class Agent:
+        async def run_agent_stream(self, task, cancellation_token=None, on_team_state=None):
+            yield task[0]
+            yield turn
+            raise RuntimeError("DeadlineExceeded: Deadline reached during a call to m\nTraceback:\n")
+
+    monkeypatch.setattr(agent_pipeline, "get_agent", lambda stage: Agent())
+
+    async def scenario():
+        task = TextMessage(content="Plan it.", source="user")
+        events = [event async for event in agent_pipeline.stream_stage("marketing", task, "deadline-test")]
+        return events[-1], await marketing_cache.get("deadline-test")
+
+    final, cached = asyncio.run(scenario())
+    assert final["status"] == "completed"
+    assert final["stop_reason"] == "Deadline reached during a call to m"
+    assert final["output"]["content"] == "A partial plan."
+    assert cached is None
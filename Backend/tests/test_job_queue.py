@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import job_queue as job_queue_module
+from job_queue import JobQueue, QueueFullError
+from state_backend import InProcessStateBackend
+
+
+class SlowBackend(InProcessStateBackend):
+    # Like the sqlite backend, every write yields to other tasks
+    async def set(self, namespace, key, value, ttl=None, max_entries=None):
+        await asyncio.sleep(0.01)
+        await super().set(namespace, key, value, ttl, max_entries)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = SlowBackend()
+    monkeypatch.setattr(job_queue_module, "get_state_backend", lambda: backend)
+    return backend
+
+
+async def runner(on_progress):
+    on_progress("research", "completed")
+    return {"status": "success"}
+
+
+def test_concurrent_submits_never_overfill_the_queue(backend):
+    async def scenario():
+        queue = JobQueue(concurrency=1, max_queued=2)
+        # Not started: nothing drains the queue
+        queue._queue = asyncio.Queue(maxsize=2)
+        results = await asyncio.gather(*(queue.submit("pipeline", runner) for _ in range(5)), return_exceptions=True)
+        stored = [await queue.get(job["job_id"]) for job in results if isinstance(job, dict)]
+        return queue, results, stored
+
+    queue, results, stored = asyncio.run(scenario())
+    assert sum(isinstance(result, QueueFullError) for result in results) == 3
+    assert len(queue.jobs) == queue._queue.qsize() == 2
+    assert [job["status"] for job in stored] == ["queued", "queued"]
+
+
+def test_submitted_job_runs_to_completion(backend):
+    async def scenario():
+        queue = JobQueue(concurrency=1, max_queued=2)
+        queue.start()
+        try:
+            job = await queue.submit("pipeline", runner)
+            await queue._queue.join()
+            return await queue.get(job["job_id"])
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert job["result"] == {"status": "success"}
+    assert job["stages"]["research"]["status"] == "completed"
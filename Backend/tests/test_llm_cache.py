@@ -0,0 +1,60 @@
+import asyncio
+
+from autogen_core.models import UserMessage
+
+from cancellation import with_cancellation
+from llm_cache import CachingChatCompletionClient, DiskCacheStore
+from metrics import with_metrics
+from model_wrappers import DelegatingChatCompletionClient
+from stub_model_client import StubChatCompletionClient
+
+
+class ConfiguredStub(StubChatCompletionClient):
+    """Stub that keeps its settings in _create_args, like OpenAIChatCompletionClient."""
+
+    def __init__(self, **create_args):
+        super().__init__(model=create_args["model"], latency="0")
+        self._create_args = create_args
+
+
+MESSAGES = [UserMessage(content="Research Microsoft and Samsung", source="user")]
+
+
+def caching(client, tmp_path):
+    return CachingChatCompletionClient(client, store=DiskCacheStore(path=str(tmp_path / "cache.sqlite3")))
+
+
+def test_key_includes_create_args_through_wrappers(tmp_path):
+    # The registry puts cancellation, rate limiting and metrics between the cache and the real client
+    cold = caching(with_cancellation(with_metrics(ConfiguredStub(model="m", temperature=0.0))), tmp_path)
+    hot = caching(with_cancellation(with_metrics(ConfiguredStub(model="m", temperature=1.0))), tmp_path)
+    assert cold.cache_key(MESSAGES) != hot.cache_key(MESSAGES)
+
+
+def test_wrapper_forwards_create_args():
+    client = ConfiguredStub(model="m", temperature=0.3)
+    wrapped = DelegatingChatCompletionClient(DelegatingChatCompletionClient(client))
+    assert wrapped._create_args == {"model": "m", "temperature": 0.3}
+    assert wrapped.model_name == "m"
+
+
+def test_key_depends_on_model_and_messages(tmp_path):
+    a = caching(ConfiguredStub(model="a"), tmp_path)
+    b = caching(ConfiguredStub(model="b"), tmp_path)
+    other = [UserMessage(content="Research Apple", source="user")]
+    assert a.cache_key(MESSAGES) == caching(ConfiguredStub(model="a"), tmp_path).cache_key(MESSAGES)
+    assert a.cache_key(MESSAGES) != b.cache_key(MESSAGES)
+    assert a.cache_key(MESSAGES) != a.cache_key(other)
+
+
+def test_repeated_call_is_served_from_cache(tmp_path):
+    stub = ConfiguredStub(model="m")
+    client = caching(stub, tmp_path)
+
+    async def twice():
+        return await client.create(MESSAGES), await client.create(MESSAGES)
+
+    first, second = asyncio.run(twice())
+    assert stub.calls == 1
+    assert not first.cached and second.cached
+    assert second.content == first.content
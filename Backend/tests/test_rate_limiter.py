@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+
+from rate_limiter import LocalLimiterState, RateLimiter, SqliteLimiterState, rate_limit_caller, take
+
+
+def test_requests_over_the_bucket_wait_for_refill():
+    state = {}
+    now = 1000.0
+    assert [take(state, 60, 0, 1, now) for _ in range(60)] == [0] * 60
+    # 60 rpm: the 61st request waits about a second
+    assert 0.9 < take(state, 60, 0, 1, now) <= 1.0
+
+
+def test_concurrency_limit_and_release():
+    async def scenario():
+        limiter = RateLimiter("m", max_concurrency=2)
+        acquired = [asyncio.ensure_future(limiter.acquire(1)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        first = [a.done() for a in acquired]
+        limiter.release(success=True)
+        await asyncio.sleep(0.01)
+        return first, [a.done() for a in acquired]
+
+    first, after = asyncio.run(scenario())
+    assert first == [True, True, False]
+    assert after == [True, True, True]
+
+
+def test_callers_are_granted_in_turn():
+    async def scenario():
+        limiter = RateLimiter("m", max_concurrency=1)
+        order = []
+
+        async def call(caller, i):
+            with rate_limit_caller(caller):
+                await limiter.acquire(1)
+            order.append(caller)
+            await asyncio.sleep(0)
+            limiter.release()
+
+        await asyncio.gather(*(call("flood", i) for i in range(3)), call("other", 0))
+        return order
+
+    # "other" arrived last but doesn't wait behind every call of "flood"
+    assert asyncio.run(scenario()).index("other") <= 1
+
+
+def test_backoff_holds_callers_until_the_cool_down_ends():
+    async def scenario():
+        limiter = RateLimiter("m", max_concurrency=4, state=LocalLimiterState())
+        await limiter.acquire(1)
+        start = time.monotonic()
+        limiter.backoff(0.2)
+        await limiter.acquire(1)
+        return time.monotonic() - start, limiter.stats()["concurrency_limit"]
+
+    waited, limit = asyncio.run(scenario())
+    assert waited >= 0.19
+    assert limit == 2
+
+
+def test_sqlite_state_is_shared_and_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    threads = []
+
+    class Recording(SqliteLimiterState):
+        def _update(self, model, fn):
+            threads.append(threading.current_thread())
+            return super()._update(model, fn)
+
+    async def scenario():
+        # Two workers, one quota of 2 requests per minute
+        workers = [RateLimiter("m", rpm=2, state=Recording(path)) for _ in range(2)]
+        await workers[0].acquire(1)
+        await workers[1].acquire(1)
+        third = asyncio.ensure_future(workers[0].acquire(1))
+        await asyncio.sleep(0.1)
+        waiting = not third.done()
+        third.cancel()
+        await asyncio.gather(third, return_exceptions=True)
+        return waiting
+
+    # The third request waits on the quota the other worker used up
+    assert asyncio.run(scenario())
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,39 @@
+import pytest
+
+from report_catalog import ReportCatalog, fts_query
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ReportCatalog(path=str(tmp_path / "catalog.sqlite3"), report_folder=str(tmp_path / "reports"))
+    catalog.add("a.md", "A Microsoft-Samsung XR/VR headset for Korea's market.", 1000, "Microsoft", "Samsung")
+    catalog.add("b.md", "A smart TV bundle for the US market.", 2000, "Google", "Meta")
+    return catalog
+
+
+def test_terms_are_quoted():
+    assert fts_query('XR/VR  Korea\'s say "hi" AND') == '"XR/VR" "Korea\'s" "say" """hi""" "AND"'
+    assert fts_query("   ") == ""
+
+
+@pytest.mark.parametrize("q, found", [
+    ("XR/VR", ["a.md"]),
+    ("Korea's", ["a.md"]),
+    ("Microsoft-Samsung", ["a.md"]),
+    ("market AND", []),
+    ("market", ["b.md", "a.md"]),
+    ('"headset', ["a.md"]),
+    ("NEAR(", []),
+    ("*", []),
+])
+def test_punctuation_in_queries_is_searched_as_text(catalog, q, found):
+    assert [item["filename"] for item in catalog.search(q=q)["items"]] == found
+
+
+def test_blank_query_lists_everything(catalog):
+    assert [item["filename"] for item in catalog.search(q="  ")["items"]] == ["b.md", "a.md"]
+
+
+def test_snippet_marks_the_match(catalog):
+    [item] = catalog.search(q="XR/VR")["items"]
+    assert "[XR/VR]" in item["snippet"]
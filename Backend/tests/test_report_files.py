@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+import os
+import time
+
+import pytest
+from starlette.requests import Request
+
+import report_files
+from report_files import build_variants, serve_report
+
+
+def call(path, headers=None, compress=True):
+    """Serve `path` for a GET with `headers`; returns (status, response headers, body)."""
+    scope = {
+        "type": "http", "method": "GET", "path": "/download-report/report.md", "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    sent = []
+
+    async def receive():
+        # The client stays connected for the whole response
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        response = await serve_report(Request(scope, receive), path, "text/markdown", "report.md", compress=compress)
+        await response(scope, receive, send)
+
+    asyncio.run(run())
+    start = sent[0]
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = tmp_path / "report.md"
+    path.write_text("# Report\n\n" + "Microsoft and Samsung XR plan. " * 200)
+    return str(path)
+
+
+def test_plain_download_sets_validators(report):
+    status, headers, body = call(report)
+    assert status == 200
+    assert body == open(report, "rb").read()
+    assert headers["etag"].startswith('"') and "last-modified" in headers
+    assert "content-encoding" not in headers
+
+
+def test_matching_etag_is_not_modified(report):
+    _, headers, _ = call(report)
+    status, _, body = call(report, {"If-None-Match": headers["etag"]})
+    assert status == 304 and body == b""
+    status, _, _ = call(report, {"If-None-Match": '"something-else"'})
+    assert status == 200
+
+
+def test_if_modified_since(report):
+    _, headers, _ = call(report)
+    assert call(report, {"If-Modified-Since": headers["last-modified"]})[0] == 304
+    assert call(report, {"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})[0] == 200
+
+
+def test_etag_changes_when_the_file_changes(report):
+    _, before, _ = call(report)
+    time.sleep(0.01)
+    with open(report, "a") as f:
+        f.write("edited")
+    _, after, _ = call(report)
+    assert before["etag"] != after["etag"]
+
+
+def test_gzip_variant_is_built_and_served(report):
+    status, headers, body = call(report, {"Accept-Encoding": "gzip"})
+    assert status == 200
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(body) == open(report, "rb").read()
+    assert os.path.exists(report + ".gz")
+    # Each encoding has its own validator, so caches never mix them up
+    assert headers["etag"] != call(report)[1]["etag"]
+
+
+def test_refused_encoding_falls_back_to_identity(report):
+    _, headers, _ = call(report, {"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in headers
+
+
+def test_range_is_served_from_identity_bytes(report):
+    build_variants(report)
+    status, headers, body = call(report, {"Range": "bytes=2-7", "Accept-Encoding": "gzip, br"})
+    assert status == 206
+    assert body == open(report, "rb").read()[2:8]
+    assert headers["content-range"].startswith("bytes 2-7/")
+    assert "content-encoding" not in headers
+
+
+def test_stale_variant_is_rebuilt(report):
+    build_variants(report)
+    stale = os.stat(report).st_mtime - 10
+    os.utime(report + ".gz", (stale, stale))
+    with open(report, "a") as f:
+        f.write("new section")
+    _, _, body = call(report, {"Accept-Encoding": "gzip"})
+    assert gzip.decompress(body).endswith(b"new section")
+
+
+def test_variants_are_built_off_the_event_loop(report, monkeypatch):
+    on_loop = []
+
+    def build(path):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        build_variants(path)
+
+    monkeypatch.setattr(report_files, "build_variants", build)
+    call(report, {"Accept-Encoding": "gzip"})
+    assert on_loop == [False]
+
+
+def test_concurrent_builds_publish_whole_variants(report):
+    async def scenario():
+        await asyncio.gather(*(asyncio.to_thread(build_variants, report) for _ in range(8)))
+
+    asyncio.run(scenario())
+    with open(report, "rb") as f, gzip.open(report + ".gz") as gz:
+        assert gz.read() == f.read()
+    assert not [name for name in os.listdir(os.path.dirname(report)) if name.endswith(".tmp")]
@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import pytest
+
+import save_report
+from report_catalog import ReportCatalog
+
+
+@pytest.fixture
+def reports(tmp_path, monkeypatch):
+    folder = tmp_path / "reports"
+    folder.mkdir()
+    catalog = ReportCatalog(path=str(tmp_path / "catalog.sqlite3"), report_folder=str(folder))
+    monkeypatch.setattr(save_report, "get_catalog", lambda: catalog)
+    (tmp_path / "secret.md").write_text("outside the folder")
+    return folder, catalog
+
+
+def test_saved_report_resolves(reports):
+    folder, catalog = reports
+    filename = save_report.save_pipeline_report({"research_output": "x"}, report_folder=str(folder), company1="A", company2="B")
+    assert catalog.get(filename) is not None
+    assert save_report.get_report_path(filename, str(folder)) == os.path.join(str(folder), filename)
+
+
+def test_uncatalogued_report_resolves_before_backfill(reports):
+    # Reports from before the catalog existed are only indexed by the startup backfill
+    folder, catalog = reports
+    (folder / "pipeline_report_20250101_000000.md").write_text("# old report")
+    assert catalog.get("pipeline_report_20250101_000000.md") is None
+    assert save_report.get_report_path("pipeline_report_20250101_000000.md", str(folder)) is not None
+
+
+@pytest.mark.parametrize("name", ["../secret.md", "..", ".hidden.md", "", "missing.md", "main.py", "sub/../../secret.md"])
+def test_unsafe_or_unknown_names_are_rejected(reports, name):
+    folder, _ = reports
+    (folder / ".hidden.md").write_text("hidden")
+    (folder / "main.py").write_text("print()")
+    assert save_report.get_report_path(name, str(folder)) is None
+
+
+def test_symlink_out_of_the_folder_is_rejected(reports, tmp_path):
+    folder, _ = reports
+    os.symlink(tmp_path / "secret.md", folder / "link.md")
+    assert save_report.get_report_path("link.md", str(folder)) is None
+
+
+def test_pdf_needs_its_markdown_report(reports):
+    folder, _ = reports
+    (folder / "orphan.pdf").write_bytes(b"%PDF")
+    assert save_report.get_pdf_path("orphan.pdf", str(folder)) is None
+    (folder / "orphan.md").write_text("# report")
+    assert save_report.get_pdf_path("orphan.pdf", str(folder)) == os.path.join(str(folder), "orphan.pdf")
+    assert save_report.get_pdf_path("orphan.md", str(folder)) is None
+
+
+def test_report_saved_on_the_event_loop_is_indexed_in_a_thread(reports):
+    folder, catalog = reports
+
+    async def scenario():
+        filename = save_report.save_pipeline_report({"research_output": "x"}, report_folder=str(folder), company1="A", company2="B")
+        # Resolvable at once from the folder, catalogued once the worker thread is done
+        resolved = save_report.get_report_path(filename, str(folder)) is not None
+        for _ in range(100):
+            if catalog.get(filename) is not None:
+                break
+            await asyncio.sleep(0.01)
+        return resolved, catalog.get(filename)
+
+    resolved, item = asyncio.run(scenario())
+    assert resolved
+    assert (item["company1"], item["company2"]) == ("A", "B")
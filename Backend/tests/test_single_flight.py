@@ -0,0 +1,125 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from single_flight import SingleFlight, request_key
+
+
+def test_identical_calls_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+
+        async def fn():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return {"status": "success"}
+
+        results = await asyncio.gather(*(flights.run(("run-pipeline", 1), fn) for _ in range(3)))
+        return runs, results, flights.stats()
+
+    runs, results, stats = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert results[0] == {"status": "success"}
+    assert results[1] == results[2] == {"status": "success", "coalesced": True}
+    assert stats == {"inflight": 0}
+
+
+def test_new_call_after_finish_runs_again():
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+
+        async def fn():
+            runs.append(1)
+            return len(runs)
+
+        return await flights.run(("k",), fn), await flights.run(("k",), fn)
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_error_reaches_every_caller():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flights.run(("k",), fn) for _ in range(2)), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(scenario())] == ["boom", "boom"]
+
+
+def test_one_caller_leaving_keeps_the_run():
+    async def scenario():
+        flights = SingleFlight()
+        abandoned = []
+
+        async def fn():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flights.run(("k",), fn, on_abandoned=lambda: abandoned.append(1)))
+        second = asyncio.ensure_future(flights.run(("k",), fn))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, abandoned
+
+    assert asyncio.run(scenario()) == ("done", [])
+
+
+def test_last_caller_leaving_abandons_the_run():
+    async def scenario():
+        flights = SingleFlight()
+        abandoned = []
+
+        async def fn():
+            await asyncio.sleep(1)
+
+        callers = [asyncio.ensure_future(flights.run(("k",), fn, on_abandoned=lambda: abandoned.append(1))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        return abandoned, flights.stats()
+
+    abandoned, stats = asyncio.run(scenario())
+    assert abandoned == [1]
+    # A new identical request starts afresh instead of joining the abandoned run
+    assert stats == {"inflight": 0}
+
+
+def test_caller_cancelled_as_the_run_finishes():
+    # The run's done-callback forgets the flight before the cancelled caller's cleanup runs
+    async def scenario():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+        abandoned = []
+
+        async def fn():
+            await gate.wait()
+            return "done"
+
+        caller = asyncio.ensure_future(flights.run(("k",), fn, on_abandoned=lambda: abandoned.append(1)))
+        await asyncio.sleep(0)
+        gate.set()
+        while flights.stats()["inflight"]:
+            await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        return abandoned
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_request_key_keeps_company_order():
+    def agent_input(company1, company2):
+        return SimpleNamespace(companyName1=company1, companyName2=company2, textInstruction="Korea ", task=None,
+                               bypassCache=False, forceRefresh=False)
+
+    assert request_key("run-pipeline", agent_input("MS", "samsung")) == request_key("run-pipeline", agent_input("Microsoft", "Samsung"))
+    assert request_key("run-pipeline", agent_input("Samsung", "Microsoft")) != request_key("run-pipeline", agent_input("Microsoft", "Samsung"))
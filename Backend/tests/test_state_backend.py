@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+import state_backend
+from state_backend import InProcessStateBackend, SqliteStateBackend, StateBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InProcessStateBackend()
+    return SqliteStateBackend(str(tmp_path / "state.sqlite3"))
+
+
+def test_backend_must_implement_every_operation():
+    class Partial(StateBackend):
+        async def get(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_entries_expire_after_ttl(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_backend.time, "time", lambda: now[0])
+
+    async def scenario():
+        await backend.set("ns", "short", {"v": 1}, ttl=10)
+        await backend.set("ns", "forever", [1, 2])
+        first = await backend.get("ns", "short"), await backend.get("ns", "forever")
+        now[0] += 11
+        return first, (await backend.get("ns", "short"), await backend.get("ns", "forever"))
+
+    assert asyncio.run(scenario()) == (({"v": 1}, [1, 2]), (None, [1, 2]))
+
+
+def test_max_entries_drops_the_entry_closest_to_expiry(backend):
+    async def scenario():
+        await backend.set("ns", "a", 1, ttl=300)
+        await backend.set("ns", "b", 2, ttl=100)
+        await backend.set("ns", "c", 3, ttl=200)
+        # Replacing an entry doesn't count against the limit, and its new expiry is the one that matters
+        await backend.set("ns", "b", 4, ttl=400, max_entries=3)
+        await backend.set("ns", "d", 5, ttl=500, max_entries=3)
+        await backend.set("other", "x", 6, max_entries=1)
+        return [await backend.get("ns", key) for key in "abcd"], await backend.get("other", "x")
+
+    assert asyncio.run(scenario()) == ([1, 4, None, 5], 6)
+
+
+def test_clear_and_delete_stay_in_their_namespace(backend):
+    async def scenario():
+        await backend.set("ns", "a", 1)
+        await backend.set("ns", "b", 2)
+        await backend.set("other", "a", 3)
+        await backend.delete("ns", "a")
+        deleted = await backend.get("ns", "a"), await backend.get("ns", "b")
+        await backend.clear("ns")
+        return deleted, await backend.get("ns", "b"), await backend.get("other", "a")
+
+    assert asyncio.run(scenario()) == ((None, 2), None, 3)
+
+
+def test_lock_lease_lapses_and_only_the_owner_releases(backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_backend.time, "time", lambda: now[0])
+
+    async def scenario():
+        taken = await backend.acquire("job", "w1", ttl=10)
+        blocked = await backend.acquire("job", "w2", ttl=10)
+        await backend.release("job", "w2")
+        still_held = await backend.acquire("job", "w2", ttl=10)
+        now[0] += 11
+        lapsed = await backend.acquire("job", "w2", ttl=10)
+        return taken, blocked, still_held, lapsed
+
+    assert asyncio.run(scenario()) == (True, False, False, True)
+
+
+def test_lock_is_renewed_while_held(backend):
+    async def scenario():
+        order = []
+
+        async def holder():
+            async with backend.lock("stage", ttl=0.3, poll=0.02):
+                order.append("first in")
+                # Outlive the lease several times over; renewal keeps the second caller out
+                await asyncio.sleep(1)
+                order.append("first out")
+
+        async def waiter():
+            await asyncio.sleep(0.05)
+            async with backend.lock("stage", ttl=0.3, poll=0.02):
+                order.append("second in")
+
+        await asyncio.gather(holder(), waiter())
+        return order
+
+    assert asyncio.run(scenario()) == ["first in", "first out", "second in"]